@@ -263,15 +263,20 @@ with tab3:
     
     with st.expander("🗄️ Vector Database Architecture"):
         st.markdown("""
-        **ChromaDB Configuration:**
+        **ChromaDB Configuration (default backend):**
         - Index Type: HNSW (Hierarchical Navigable Small World)
-        - Distance Metric: Cosine Similarity
-        - Index Parameters:
+        - Distance Metric: Squared L2 on normalized embeddings (same ranking as cosine)
+        - Index Parameters (Chroma defaults, set via `index_params` when the collection is created):
             - M: 16 (bi-directional links)
-            - ef_construction: 200
-            - ef_search: 10
+            - construction_ef: 100
+            - search_ef: 10
         - Query Complexity: O(log n)
-        - Storage: Persistent SQLite + Parquet
+        - Storage: Persistent SQLite
+
+        **NumPy Backend (`RAG_VECTOR_BACKEND=numpy`):**
+        - Index Type: exact (flat) or IVF-flat (`RAG_INDEX_TYPE=ivf`)
+        - IVF Parameters: nlist = 4·√n centroids, nprobe = 8 (overridable per query)
+        - Storage: Memory-mapped float32 matrix
         """)
     
     with st.expander("📄 Document Processing Pipeline"):
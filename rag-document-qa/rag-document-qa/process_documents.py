@@ -3,22 +3,27 @@ Process documents and create vector store
 """
 import os
 import sys
-sys.path.append("src")
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from core.document_processor import DocumentProcessor
-from core.vector_store import VectorStore
+from src.core.document_processor import DocumentProcessor
+from src.core.vector_store import VectorStore
+from src.core.indexer import IncrementalIndexer
 
 def main():
-    # Process documents
+    # Only new or changed PDFs are extracted and embedded; removed ones are dropped
     print("Processing documents...")
-    processor = DocumentProcessor()
-    documents = processor.process_documents("./data/raw")
+    processor = DocumentProcessor(
+        num_workers=int(os.getenv("INGEST_WORKERS", "0")),
+        pdf_engines=[name for name in os.getenv("PDF_ENGINES", "auto").split(",") if name],
+        page_timeout=float(os.getenv("PDF_PAGE_TIMEOUT", "30")),
+        file_timeout=float(os.getenv("PDF_FILE_TIMEOUT", "300"))
+    )
+    vector_store = VectorStore()
+    vector_store.load_vector_store()
+    stats = IncrementalIndexer(vector_store, processor).sync("./data/raw")
     
-    if documents:
-        # Create vector store
-        print("\nCreating vector store...")
-        vector_store = VectorStore()
-        vector_store.create_vector_store(documents)
+    if stats["chunks_added"] or stats["unchanged_files"]:
+        print(f"\nIndexed {stats['chunks_added']} new document chunks")
         
         # Test search
         print("\nTesting search...")
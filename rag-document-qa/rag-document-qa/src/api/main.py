@@ -1,26 +1,184 @@
 """
 FastAPI backend for RAG system
 """
-from fastapi import FastAPI, HTTPException
+import time
+_import_start = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
+from functools import partial
+import asyncio
+import contextvars
+import importlib
+import json
 import sys
 import os
+import threading
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
-from src.core.vector_store import VectorStore
-from src.core.rag_chain import RAGChain
+from src.core.metrics import REGISTRY, collect_timings, server_timing_header
+
+# Seconds spent in each startup stage, reported once the system is ready
+startup_timings: Dict[str, float] = {"import fastapi/pydantic": time.perf_counter() - _import_start}
+
+# Heavy dependencies are imported by the background loader, each timed separately
+HEAVY_IMPORTS = ["langchain", "chromadb", "langchain_community.vectorstores", "langchain_openai"]
+
+# Embedding, vector search and LLM calls block, so they run on a bounded
+# thread pool instead of the event loop
+MAX_CONCURRENCY = int(os.getenv("RAG_MAX_CONCURRENCY", "8"))
+executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="rag-worker")
+
+MAX_BATCH_QUESTIONS = int(os.getenv("RAG_MAX_BATCH_QUESTIONS", "1000"))
+
+# Search endpoints only return this much of each chunk, so only this much is read from the store
+SNIPPET_CHARS = 500
+
+REQUESTS = REGISTRY.counter("rag_http_requests_total", "HTTP requests served", ("route", "method", "status"))
+REQUEST_SECONDS = REGISTRY.histogram("rag_http_request_seconds", "HTTP request latency until the response starts",
+                                     ("route", "method"))
+DOCUMENTS = REGISTRY.gauge("rag_documents", "Chunks in the vector store")
+SOURCES = REGISTRY.gauge("rag_sources", "Source documents in the vector store")
+CACHE_HITS = REGISTRY.gauge("rag_cache_hits", "Cache hits since startup", ("cache",))
+CACHE_MISSES = REGISTRY.gauge("rag_cache_misses", "Cache misses since startup", ("cache",))
+
+# RAG components are created in the background; until then the API is live but not ready
+rag_chain = None
+startup_state = {"status": "starting", "error": None}
+
+@contextmanager
+def startup_stage(name: str):
+    """Record how long a startup stage takes"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = time.perf_counter() - start
+
+def load_rag_system():
+    """Import dependencies, load the model and vector store, and warm up the encoder"""
+    global rag_chain
+    try:
+        for module in HEAVY_IMPORTS:
+            with startup_stage(f"import {module}"):
+                importlib.import_module(module)
+        with startup_stage("import src.core"):
+            from src.core.vector_store import VectorStore
+            from src.core.rag_chain import RAGChain
+            from src.core.reranker import CrossEncoderReranker
+            from src.core.answer_cache import SemanticAnswerCache
+        
+        print("Initializing RAG system...")
+        with startup_stage("load embedding model"):
+            vector_store = VectorStore(
+                query_batch_size=int(os.getenv("RAG_QUERY_BATCH_SIZE", "32")),
+                query_batch_wait_ms=float(os.getenv("RAG_QUERY_BATCH_WAIT_MS", "2"))
+            )
+        reranker = None
+        if os.getenv("RAG_RERANK_MODEL"):
+            with startup_stage("load reranker model"):
+                reranker = CrossEncoderReranker(model_name=os.getenv("RAG_RERANK_MODEL"))
+                reranker.model  # Load weights now rather than on the first query
+        answer_cache = None
+        if int(os.getenv("RAG_ANSWER_CACHE_SIZE", "10000")) > 0:
+            with startup_stage("open answer cache"):
+                answer_cache = SemanticAnswerCache(
+                    cache_dir=os.getenv("RAG_ANSWER_CACHE_DIR", "./data/answer_cache"),
+                    threshold=float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", "0.95")),
+                    max_entries=int(os.getenv("RAG_ANSWER_CACHE_SIZE", "10000"))
+                )
+        with startup_stage("open vector store and chain"):
+            chain = RAGChain(
+                vector_store=vector_store,
+                reranker=reranker,
+                rerank_candidates=int(os.getenv("RAG_RERANK_CANDIDATES", "20")),
+                context_tokens=int(os.getenv("RAG_CONTEXT_TOKENS", "1500")),
+                answer_cache=answer_cache
+            )
+        with startup_stage("warm-up encode"):
+            # The first encode pays for lazy weight loading and kernel selection
+            vector_store.base_embeddings.embed_query("warm-up")
+        
+        rag_chain = chain
+        startup_state["status"] = "ready"
+    except Exception as e:
+        startup_state["status"] = "failed"
+        startup_state["error"] = str(e)
+        print(f"RAG system failed to start: {str(e)}")
+    
+    print("Startup timings:")
+    for name, seconds in startup_timings.items():
+        print(f"  {name:<40} {seconds:8.3f}s")
+    print(f"  {'total':<40} {sum(startup_timings.values()):8.3f}s")
+
+def get_rag_chain():
+    """Return the RAG chain, or fail with 503 while it is still loading"""
+    if rag_chain is None:
+        raise HTTPException(status_code=503, detail=f"RAG system is {startup_state['status']}")
+    return rag_chain
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load in the background so the server accepts connections (and liveness probes) right away
+    threading.Thread(target=load_rag_system, name="rag-loader", daemon=True).start()
+    yield
+    executor.shutdown(wait=False)
+    if rag_chain is not None:
+        rag_chain.vector_store.close()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="RAG Document Q&A API",
     description="API for document question answering using RAG",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+class TimingMiddleware:
+    """Add a Server-Timing header with the stages a request went through and record request metrics
+    
+    The stage durations are gathered in a context variable that the worker
+    pool inherits (see run_blocking), so timing costs a dict update per stage
+    and never waits on anything.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        start = time.perf_counter()
+        status = {"code": 500}
+        
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                elapsed = time.perf_counter() - start
+                header = server_timing_header(timings, total_ms=elapsed * 1000)
+                message = dict(message, headers=list(message.get("headers", [])) + [
+                    (b"server-timing", header.encode("latin-1"))
+                ])
+                # Routes are matched by now; label by template so ids in paths don't explode the series
+                route = getattr(scope.get("route"), "path", "unmatched")
+                REQUEST_SECONDS.observe(elapsed, route=route, method=scope["method"])
+                REQUESTS.inc(route=route, method=scope["method"], status=str(message["status"]))
+            await send(message)
+        
+        with collect_timings() as timings:
+            await self.app(scope, receive, send_with_timing)
+
+app.add_middleware(TimingMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -31,27 +189,127 @@ app.add_middleware(
 )
 
 # Request/Response models
+class SearchFilters(BaseModel):
+    sources: Optional[List[str]] = None  # Source file names, e.g. ["bert_paper.pdf"]
+    page_from: Optional[int] = None  # Chunks overlapping this page range (inclusive)
+    page_to: Optional[int] = None
+    ingested_after: Optional[datetime] = None  # ISO 8601; times without a zone are UTC
+    ingested_before: Optional[datetime] = None
+
 class QueryRequest(BaseModel):
     question: str
     num_results: Optional[int] = 5
+    nprobe: Optional[int] = None  # IVF lists scanned (numpy backend); higher trades latency for recall
+    exact: Optional[bool] = None  # Bypass the ANN index
+    mode: Optional[str] = None  # "dense", "hybrid" or "lexical" (defaults to RAG_SEARCH_MODE, else "dense")
+    filters: Optional[SearchFilters] = None  # Applied before ranking
 
 class QueryResponse(BaseModel):
     question: str
     answer: str
     sources: List[Dict[str, str]]
+    timings: Optional[Dict[str, float]] = None  # Milliseconds per stage (retrieval, rerank, generation)
+    tokens_saved: Optional[int] = None  # Prompt tokens removed by context compression
+    cached: bool = False  # Answer reused from a similar earlier question
+
+class BatchQueryRequest(BaseModel):
+    questions: List[str]
+    num_results: Optional[int] = 5
+    nprobe: Optional[int] = None
+    exact: Optional[bool] = None
+    filters: Optional[SearchFilters] = None
+
+class BatchSearchResult(BaseModel):
+    question: str
+    sources: List[Dict[str, str]]
+
+class BatchSearchResponse(BaseModel):
+    results: List[BatchSearchResult]
 
 class HealthResponse(BaseModel):
     status: str
     vector_store_loaded: bool
     document_count: Optional[int] = None
+    source_count: Optional[int] = None
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the worker pool and await its result"""
+    loop = asyncio.get_running_loop()
+    # Carry the request's context over so spans in the worker land in its timings
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, partial(context.run, func, *args, **kwargs))
 
-# Initialize RAG components
-print("Initializing RAG system...")
-rag_chain = RAGChain()
+def _timestamp(value: Optional[datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+
+def metadata_filter(request):
+    """Metadata filter given in a request, or None; invalid bounds are a 400"""
+    from src.core.metadata_filter import MetadataFilter
+    
+    filters = request.filters
+    if filters is None:
+        return None
+    try:
+        return MetadataFilter(
+            sources=filters.sources,
+            page_from=filters.page_from,
+            page_to=filters.page_to,
+            ingested_after=_timestamp(filters.ingested_after),
+            ingested_before=_timestamp(filters.ingested_before)
+        ) or None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def search_params(request) -> Optional[Dict]:
+    """Per-query ANN parameters given in a search request"""
+    params = {name: getattr(request, name) for name in ("nprobe", "exact") if getattr(request, name) is not None}
+    return params or None
+
+def format_pages(metadata: Dict) -> str:
+    """Page citation for a chunk ("4" or "4-5"); empty for chunks indexed before page tracking"""
+    start, end = metadata.get("page_start"), metadata.get("page_end")
+    if start is None:
+        return ""
+    return str(start) if end in (None, start) else f"{start}-{end}"
+
+def format_source(doc, max_chars: int = 200) -> Dict[str, str]:
+    """Source entry returned to clients for a retrieved chunk"""
+    return {
+        "source": doc.metadata.get("source", "Unknown"),
+        "content": doc.page_content[:max_chars] + "...",
+        "chunk_index": str(doc.metadata.get("chunk_index", -1)),
+        "pages": format_pages(doc.metadata)
+    }
+
+def format_search_source(doc, score, score_type: str) -> Dict[str, str]:
+    """Source entry returned by the search endpoints"""
+    return {
+        "source": doc.metadata.get("source", "Unknown"),
+        "content": doc.page_content[:SNIPPET_CHARS] + "...",
+        "score": str(float(score)),  # Convert score to string
+        "score_type": score_type,  # "l2_distance" (lower is better), "rrf" or "bm25" (higher is better)
+        "pages": format_pages(doc.metadata)
+    }
+
+@app.get("/live")
+async def liveness():
+    """Liveness probe - the process is up and serving requests"""
+    return {"status": "alive"}
+
+@app.get("/ready")
+async def readiness():
+    """Readiness probe - the model and vector store are loaded"""
+    if rag_chain is None:
+        return JSONResponse(status_code=503, content=startup_state)
+    return {"status": "ready", "startup_timings": startup_timings}
 
 @app.get("/", response_model=HealthResponse)
 async def root():
     """Health check endpoint"""
+    if rag_chain is None:
+        return HealthResponse(status=startup_state["status"], vector_store_loaded=False)
     vector_store_loaded = rag_chain.vector_store.vector_store is not None
     return HealthResponse(
         status="healthy",
@@ -61,78 +319,109 @@ async def root():
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Detailed health check"""
+    if rag_chain is None:
+        return HealthResponse(status=startup_state["status"], vector_store_loaded=False)
     vector_store_loaded = rag_chain.vector_store.vector_store is not None
-    doc_count = None
-    
-    if vector_store_loaded:
-        try:
-            # Get approximate document count
-            test_results = rag_chain.vector_store.similarity_search("test", k=1)
-            doc_count = 425  # We know this from the processing
-        except:
-            doc_count = None
+    catalog = rag_chain.vector_store.catalog
     
+    # Answered from the in-memory catalog; the collection is never queried
     return HealthResponse(
         status="healthy",
         vector_store_loaded=vector_store_loaded,
-        document_count=doc_count
+        document_count=catalog.total_chunks if vector_store_loaded else None,
+        source_count=len(catalog) if vector_store_loaded else None
     )
 
 @app.post("/query", response_model=QueryResponse)
 async def query_documents(request: QueryRequest):
     """Query the document database"""
+    chain = get_rag_chain()
+    filter = metadata_filter(request)
     try:
         # Get response from RAG chain
-        response = rag_chain.query(request.question)
+        response = await run_blocking(chain.query, request.question, filter=filter)
         
         # Format sources
-        sources = []
-        for doc in response.get("source_documents", [])[:3]:
-            sources.append({
-                "source": doc.metadata.get("source", "Unknown"),
-                "content": doc.page_content[:200] + "...",
-                "chunk_index": str(doc.metadata.get("chunk_index", -1))
-            })
+        sources = [format_source(doc) for doc in response.get("source_documents", [])[:3]]
         
         return QueryResponse(
             question=request.question,
             answer=response["result"],
-            sources=sources
+            sources=sources,
+            timings=response.get("timings"),
+            tokens_saved=(response.get("context") or {}).get("tokens_saved"),
+            cached=response.get("cached", False)
         )
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/query/stream")
+async def query_documents_stream(request: QueryRequest):
+    """Query the document database, streaming sources and then answer tokens as Server-Sent Events"""
+    events = get_rag_chain().stream_query(request.question, filter=metadata_filter(request))
+    
+    async def event_stream():
+        try:
+            while True:
+                # Each step may embed, search or wait on the LLM, so it runs on the worker pool
+                item = await run_blocking(next, events, None)
+                if item is None:
+                    break
+                event, payload = item
+                if event == "sources":
+                    payload = [format_source(doc) for doc in payload[:3]]
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        except Exception as e:
+            # The response has already started, so a failure is reported in the stream
+            yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+        finally:
+            # Release the chain's generator (and its LLM stream) when the client goes away early
+            try:
+                events.close()
+            except ValueError:
+                pass  # Still running a step on the worker pool; it is closed once collected
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/search")
 async def search_documents(request: QueryRequest):
     """Search documents without OpenAI - just returns relevant chunks"""
+    from src.core.vector_store import SCORE_TYPES
+    
+    chain = get_rag_chain()
+    filter = metadata_filter(request)
     try:
         # Directly use vector store for search
-        vector_store = rag_chain.vector_store
+        vector_store = chain.vector_store
         
         if not vector_store.vector_store:
             raise HTTPException(status_code=503, detail="Vector store not loaded")
         
         # Get relevant chunks with scores
-        results = vector_store.similarity_search_with_score(
-            request.question, 
-            k=request.num_results
+        mode = request.mode or vector_store.search_mode
+        results = await run_blocking(
+            vector_store.search,
+            request.question,
+            k=request.num_results,
+            mode=mode,
+            search_params=search_params(request),
+            content_chars=SNIPPET_CHARS,
+            filter=filter
         )
         
         # Format sources
-        sources = []
-        for doc, score in results:
-            sources.append({
-                "source": doc.metadata.get("source", "Unknown"),
-                "content": doc.page_content[:500] + "...",
-                "score": str(float(score))  # Convert score to string
-            })
+        sources = [format_search_source(doc, score, SCORE_TYPES[mode]) for doc, score in results]
         
         # Create response without OpenAI
         if results:
             # Use the best result to create a simple answer
             best_doc, best_score = results[0]
-            answer = f"Based on the search results from '{best_doc.metadata.get('source', 'Unknown')}':\n\n{best_doc.page_content[:500]}..."
+            answer = f"Based on the search results from '{best_doc.metadata.get('source', 'Unknown')}':\n\n{best_doc.page_content[:SNIPPET_CHARS]}..."
         else:
             answer = "No relevant information found in the documents."
         
@@ -142,19 +431,86 @@ async def search_documents(request: QueryRequest):
             sources=sources
         )
     
+    except HTTPException:
+        # Already carries its status (e.g. 503 when the store isn't loaded)
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/search/batch", response_model=BatchSearchResponse)
+async def search_documents_batch(request: BatchQueryRequest):
+    """Search many questions in one call - embeds and looks them up together"""
+    if len(request.questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_QUESTIONS} questions per batch"
+        )
+    
+    vector_store = get_rag_chain().vector_store
+    if not vector_store.vector_store:
+        raise HTTPException(status_code=503, detail="Vector store not loaded")
+    filter = metadata_filter(request)
+    
+    try:
+        batch_results = await run_blocking(
+            vector_store.batch_similarity_search,
+            request.questions,
+            k=request.num_results,
+            search_params=search_params(request),
+            content_chars=SNIPPET_CHARS,
+            filter=filter
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return BatchSearchResponse(results=[
+        BatchSearchResult(
+            question=question,
+            sources=[format_search_source(doc, score, "l2_distance") for doc, score in results]
+        )
+        for question, results in zip(request.questions, batch_results)
+    ])
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Query embedding, search result, reranker score and answer cache counters"""
+    chain = get_rag_chain()
+    stats = chain.vector_store.cache_stats()
+    stats["reranker"] = chain.reranker.stats() if chain.reranker else None
+    stats["answer_cache"] = chain.answer_cache.stats() if chain.answer_cache else None
+    return stats
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Stage and request latency histograms, counters and cache gauges in the Prometheus text format"""
+    if rag_chain is not None:
+        DOCUMENTS.set(rag_chain.vector_store.catalog.total_chunks)
+        SOURCES.set(len(rag_chain.vector_store.catalog))
+        caches = {
+            "query_embeddings": rag_chain.vector_store.query_cache.stats(),
+            "results": rag_chain.vector_store.result_cache.stats(),
+            "reranker": rag_chain.reranker.score_cache.stats() if rag_chain.reranker else None,
+            "answer": rag_chain.answer_cache.stats() if rag_chain.answer_cache else None
+        }
+        for name, stats in caches.items():
+            if stats is not None:
+                CACHE_HITS.set(stats["hits"], cache=name)
+                CACHE_MISSES.set(stats["misses"], cache=name)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/documents")
-async def list_documents():
-    """List processed documents"""
+async def list_documents(offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
+    """List processed documents, a page at a time, in source name order"""
+    catalog = get_rag_chain().vector_store.catalog
     return {
-        "documents": [
-            "attention_is_all_you_need.pdf",
-            "bert_paper.pdf",
-            "gpt_paper.pdf"
-        ],
-        "total_chunks": 425
+        "documents": catalog.page(offset, limit),
+        **catalog.stats(),
+        "offset": offset,
+        "limit": limit
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,171 @@
+"""
+Approximate nearest-neighbour search with an inverted-file (IVF-flat) index
+"""
+import os
+from typing import Optional
+
+import numpy as np
+
+
+def nearest_centroids(centroids: np.ndarray, vectors: np.ndarray, count: int = 1, block: int = 8192) -> np.ndarray:
+    """Indices of the `count` nearest centroids for each vector, closest first"""
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    nearest = []
+    for start in range(0, len(vectors), block):
+        chunk = np.asarray(vectors[start:start + block], dtype=np.float32)
+        # |c|^2 - 2 c.x ranks centroids by L2 distance to x
+        distances = centroid_norms[None, :] - 2.0 * (chunk @ centroids.T)
+        if count == 1:
+            nearest.append(np.argmin(distances, axis=1)[:, None])
+        else:
+            top = np.argpartition(distances, count - 1, axis=1)[:, :count]
+            nearest.append(np.take_along_axis(
+                top, np.argsort(np.take_along_axis(distances, top, axis=1), axis=1), axis=1
+            ))
+    return np.concatenate(nearest) if nearest else np.zeros((0, count), dtype=np.int64)
+
+
+def kmeans(sample: np.ndarray, n_clusters: int, iterations: int = 10,
+           rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """Lloyd's k-means on a float32 sample; returns the (n_clusters, dim) centroids"""
+    rng = rng or np.random.default_rng(0)
+    centroids = sample[rng.choice(len(sample), size=n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        labels = nearest_centroids(centroids, sample)[:, 0]
+        counts = np.bincount(labels, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty clusters from random sample points
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), size=len(empty), replace=False)]
+    return centroids
+
+
+class IVFIndex:
+    """IVF-flat index: a k-means coarse quantizer over the stored vectors
+
+    Every row is assigned to its nearest centroid. A search scans only the rows
+    of the ``nprobe`` centroids closest to the query and ranks them exactly,
+    so ``nprobe`` trades recall for latency per query. Assignments are kept
+    per row, which lets new rows join the index without retraining.
+    """
+
+    def __init__(self, nlist: Optional[int] = None, nprobe: int = 8):
+        """
+        Initialize index
+
+        Args:
+            nlist: Number of centroids (defaults to 4 * sqrt(rows), recomputed at every build)
+            nprobe: Default number of centroids scanned per query
+        """
+        self.nlist = nlist
+        # Centroids of the current build; differs from nlist when that was left to the row count
+        self.lists = 0
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.built_rows = 0
+        self._order: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+
+    @property
+    def is_built(self) -> bool:
+        return self.centroids is not None
+
+    def build(self, vectors: np.ndarray, alive: np.ndarray, iterations: int = 10,
+              samples_per_centroid: int = 64, seed: int = 0):
+        """
+        Train centroids with k-means on a sample of live rows and assign every row
+
+        Args:
+            vectors: (rows, dim) float32 matrix, typically memory-mapped
+            alive: Boolean mask of live rows
+            iterations: k-means iterations
+            samples_per_centroid: Training rows sampled per centroid
+            seed: Random seed for sampling and initialization
+        """
+        live_rows = np.flatnonzero(alive)
+        if len(live_rows) == 0:
+            return
+        rng = np.random.default_rng(seed)
+        nlist = self.nlist or int(4 * np.sqrt(len(live_rows)))
+        nlist = max(1, min(nlist, len(live_rows)))
+
+        sample_rows = np.sort(rng.choice(
+            live_rows, size=min(len(live_rows), nlist * samples_per_centroid), replace=False
+        ))
+        sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+        self.centroids = kmeans(sample, nlist, iterations=iterations, rng=rng)
+
+        self.lists = nlist
+        self.assignments = nearest_centroids(self.centroids, vectors)[:, 0].astype(np.int32)
+        self.built_rows = len(live_rows)
+        self._invalidate()
+
+    def add(self, vectors: np.ndarray):
+        """Assign appended rows to their nearest existing centroid"""
+        if not self.is_built or len(vectors) == 0:
+            return
+        self.assignments = np.concatenate([
+            self.assignments, nearest_centroids(self.centroids, vectors)[:, 0].astype(np.int32)
+        ])
+        self._invalidate()
+
+    def keep(self, rows: np.ndarray):
+        """Follow a compaction that kept only the given rows, in order"""
+        if self.is_built:
+            self.assignments = self.assignments[rows]
+            self._invalidate()
+
+    def _invalidate(self):
+        self._order = None
+        self._offsets = None
+
+    def _lists(self):
+        """Rows grouped by centroid, rebuilt lazily after writes"""
+        if self._order is None:
+            order = np.argsort(self.assignments, kind="stable")
+            offsets = np.searchsorted(self.assignments[order], np.arange(self.lists + 1))
+            self._order, self._offsets = order, offsets
+        return self._order, self._offsets
+
+    def view(self) -> tuple:
+        """Immutable snapshot (centroids, order, offsets) that stays valid across later writes"""
+        order, offsets = self._lists()
+        return self.centroids, order, offsets
+
+    def candidates(self, view: tuple, queries: np.ndarray, nprobe: Optional[int] = None) -> list:
+        """For each query, the rows in the inverted lists of its closest centroids"""
+        centroids, order, offsets = view
+        nprobe = max(1, min(nprobe or self.nprobe, len(centroids)))
+        probed = nearest_centroids(centroids, queries, count=nprobe)
+        return [
+            np.concatenate([order[offsets[c]:offsets[c + 1]] for c in query_probes])
+            for query_probes in probed
+        ]
+
+    def save(self, path: str):
+        """Persist centroids and assignments"""
+        if not self.is_built:
+            return
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, assignments=self.assignments,
+                 built_rows=self.built_rows)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str, rows: int) -> bool:
+        """Load a persisted index; returns False if it is missing or out of date"""
+        if not os.path.exists(path):
+            return False
+        data = np.load(path)
+        if len(data["assignments"]) != rows:
+            return False
+        self.centroids = data["centroids"]
+        self.assignments = data["assignments"]
+        self.built_rows = int(data["built_rows"])
+        self.lists = len(self.centroids)
+        self._invalidate()
+        return True
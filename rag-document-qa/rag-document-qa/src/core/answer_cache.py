@@ -0,0 +1,187 @@
+"""
+Persistent answer cache that matches paraphrased questions by embedding similarity
+"""
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain.schema import Document
+
+
+class SemanticAnswerCache:
+    """Answers of earlier questions, reused for new questions with a close enough embedding
+
+    Entries live in SQLite (question, normalized embedding, answer, sources)
+    and their embeddings are also held as one in-memory matrix, so a lookup
+    is a single matrix-vector product. Every entry belongs to the index
+    version it was answered from; when the version changes the whole cache
+    is dropped. Beyond ``max_entries`` the least recently used are evicted.
+
+    The matrix is allocated once with ``max_entries`` rows; a new entry
+    takes the next free row or the row of the entry it evicts, so an insert
+    never copies or re-reads the other entries.
+    """
+
+    def __init__(self, cache_dir: str, threshold: float = 0.95, max_entries: int = 10000):
+        """
+        Initialize answer cache
+
+        Args:
+            cache_dir: Directory holding the SQLite database
+            threshold: Minimum cosine similarity for a cached question to match
+            max_entries: Maximum number of cached answers
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "answers.sqlite3"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answers (id INTEGER PRIMARY KEY, question TEXT, embedding BLOB, "
+            "answer TEXT, sources TEXT, last_used INTEGER)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        self._db.commit()
+
+        meta = dict(self._db.execute("SELECT name, value FROM meta"))
+        self.index_version: Optional[int] = meta.get("index_version")
+        self._tick = meta.get("tick", 0)
+        self._load_matrix()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _load_matrix(self):
+        """Read every cached embedding into memory (once, at startup)"""
+        self._ids: List[int] = []  # Matrix row -> entry id
+        self._slots: Dict[int, int] = {}  # Entry id -> matrix row
+        self._matrix: Optional[np.ndarray] = None
+        overflow = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - max(self.max_entries, 0)
+        if overflow > 0:
+            # max_entries was lowered since the entries were written
+            self._evict(overflow)
+            self._db.commit()
+        for entry_id, blob in self._db.execute("SELECT id, embedding FROM answers").fetchall():
+            self._store(entry_id, np.frombuffer(blob, dtype=np.float32), len(self._ids))
+
+    def _store(self, entry_id: int, vector: np.ndarray, slot: int):
+        """Put an entry's embedding in a matrix row (the next free one, or an evicted entry's)"""
+        if self._matrix is None:
+            self._matrix = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+        if slot == len(self._ids):
+            self._ids.append(entry_id)
+        else:
+            self._ids[slot] = entry_id
+        self._slots[entry_id] = slot
+        self._matrix[slot] = vector
+
+    def _evict(self, count: int) -> List[int]:
+        """Delete the least recently used entries; returns the matrix rows they held"""
+        evicted = [entry_id for entry_id, in self._db.execute(
+            "SELECT id FROM answers ORDER BY last_used LIMIT ?", (count,)
+        )]
+        self._db.executemany("DELETE FROM answers WHERE id = ?", [(entry_id,) for entry_id in evicted])
+        return [self._slots.pop(entry_id) for entry_id in evicted if entry_id in self._slots]
+
+    def _check_version(self, index_version: int):
+        """Drop every entry if they were answered from another index version"""
+        if index_version == self.index_version:
+            return
+        self._db.execute("DELETE FROM answers")
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES ('index_version', ?)", (index_version,))
+        self._db.commit()
+        self.index_version = index_version
+        self._ids, self._slots = [], {}
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, embedding: List[float], index_version: int) -> Optional[Dict[str, Any]]:
+        """
+        Look up the closest cached question
+
+        Args:
+            embedding: Embedding of the incoming question
+            index_version: Current persisted index version
+
+        Returns:
+            {"question", "answer", "source_documents", "similarity"} on a hit, else None
+        """
+        with self._lock:
+            self._check_version(index_version)
+            if not self._ids:
+                self.misses += 1
+                return None
+            similarities = self._matrix[:len(self._ids)] @ self._normalize(embedding)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            entry_id = self._ids[best]
+            question, answer, sources = self._db.execute(
+                "SELECT question, answer, sources FROM answers WHERE id = ?", (entry_id,)
+            ).fetchone()
+            self._tick += 1
+            self._db.execute("UPDATE answers SET last_used = ? WHERE id = ?", (self._tick, entry_id))
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('tick', ?)", (self._tick,))
+            self._db.commit()
+            self.hits += 1
+
+        return {
+            "question": question,
+            "answer": answer,
+            "source_documents": [Document(**source) for source in json.loads(sources)],
+            "similarity": float(similarities[best])
+        }
+
+    def put(self, question: str, embedding: List[float], answer: str,
+            source_documents: List[Document], index_version: int):
+        """Cache an answer, evicting the least recently used entries if full"""
+        if self.max_entries <= 0:
+            return
+        sources = json.dumps([
+            {"page_content": doc.page_content, "metadata": doc.metadata} for doc in source_documents
+        ])
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._check_version(index_version)
+            # Evicted before inserting, so the new entry can't be the one that goes
+            slot = self._evict(1)[0] if len(self._ids) >= self.max_entries else len(self._ids)
+            self._tick += 1
+            cursor = self._db.execute(
+                "INSERT INTO answers (question, embedding, answer, sources, last_used) VALUES (?, ?, ?, ?, ?)",
+                (question, vector.tobytes(), answer, sources, self._tick)
+            )
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('tick', ?)", (self._tick,))
+            self._db.commit()
+            self._store(cursor.lastrowid, vector, slot)
+
+    def clear(self):
+        """Remove every cached answer"""
+        with self._lock:
+            self._db.execute("DELETE FROM answers")
+            self._db.commit()
+            self._ids, self._slots = [], {}
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._ids),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
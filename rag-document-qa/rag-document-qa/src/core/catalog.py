@@ -0,0 +1,173 @@
+"""
+Catalog of indexed source documents, kept in memory and persisted with the vector store
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+CATALOG_FILENAME = "catalog.json"
+
+# Catalog key of chunks whose metadata names no source
+UNKNOWN_SOURCE = "Unknown"
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+class DocumentCatalog:
+    """Per-source chunk counts, file sizes, content hashes and ingest times
+
+    Every write to the vector store applies its chunk deltas here, so totals
+    and listings are answered from memory without touching the collection.
+    Sources are also kept in a sorted list, so a page of the listing costs
+    the page size rather than a sort of every source.
+    """
+
+    def __init__(self, path: str, backend: str = "chroma"):
+        """
+        Initialize catalog
+
+        Args:
+            path: JSON file the catalog is persisted to
+            backend: Vector store backend whose contents the catalog describes
+        """
+        self.path = path
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.sources: Dict[str, Dict] = {}
+        self._order: List[str] = []
+        self.total_chunks = 0
+        self.total_bytes = 0
+        self._dirty = False
+        self.loaded = self.load()
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    def load(self) -> bool:
+        """Load the catalog from disk; returns False if it is missing or for another backend"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("backend") != self.backend:
+            return False
+        self.sources = data["sources"]
+        self._order = sorted(self.sources)
+        self.total_chunks = sum(entry["chunks"] for entry in self.sources.values())
+        self.total_bytes = sum(entry.get("bytes") or 0 for entry in self.sources.values())
+        return True
+
+    def save(self):
+        """Atomically write the catalog if it changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "backend": self.backend, "sources": self.sources}, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def _entry(self, source: str) -> Dict:
+        entry = self.sources.get(source)
+        if entry is None:
+            entry = self.sources[source] = {"chunks": 0, "bytes": None, "sha256": None, "ingested_at": None}
+            bisect.insort(self._order, source)
+        return entry
+
+    def _drop(self, source: str):
+        entry = self.sources.pop(source)
+        self.total_chunks -= entry["chunks"]
+        self.total_bytes -= entry.get("bytes") or 0
+        del self._order[bisect.bisect_left(self._order, source)]
+
+    def apply(self, added: Dict[Optional[str], int], removed: Optional[Dict[Optional[str], int]] = None):
+        """
+        Apply chunk count changes per source
+
+        Args:
+            added: Chunks written per source; their sources get a fresh ingest time
+            removed: Chunks deleted (or overwritten) per source
+
+        Sources left without chunks are dropped.
+        """
+        with self._lock:
+            ingested_at = _now()
+            for source, count in (removed or {}).items():
+                source = source or UNKNOWN_SOURCE
+                entry = self.sources.get(source)
+                if entry is None or not count:
+                    continue
+                entry["chunks"] -= count
+                self.total_chunks -= count
+                self._dirty = True
+            for source, count in added.items():
+                if not count:
+                    continue
+                entry = self._entry(source or UNKNOWN_SOURCE)
+                entry["chunks"] += count
+                entry["ingested_at"] = ingested_at
+                self.total_chunks += count
+                self._dirty = True
+            for source in {source or UNKNOWN_SOURCE for source in (removed or {})}:
+                if source in self.sources and self.sources[source]["chunks"] <= 0:
+                    self._drop(source)
+
+    def remove_source(self, source: str):
+        """Forget a source and all of its chunks"""
+        with self._lock:
+            if source in self.sources:
+                self._drop(source)
+                self._dirty = True
+
+    def describe(self, source: str, sha256: Optional[str] = None, size: Optional[int] = None):
+        """Record the content hash and file size of an indexed source"""
+        with self._lock:
+            entry = self.sources.get(source)
+            if entry is None or (entry["sha256"], entry["bytes"]) == (sha256, size):
+                return
+            self.total_bytes += (size or 0) - (entry["bytes"] or 0)
+            entry["sha256"], entry["bytes"] = sha256, size
+            self._dirty = True
+
+    def rebuild(self, counts: Dict[Optional[str], int]):
+        """Reset chunk counts to the given per-source counts, keeping what is known about surviving sources"""
+        merged: Dict[str, int] = {}
+        for source, count in counts.items():
+            merged[source or UNKNOWN_SOURCE] = merged.get(source or UNKNOWN_SOURCE, 0) + count
+        with self._lock:
+            previous = self.sources
+            self.sources = {
+                source: dict(previous.get(source) or {"bytes": None, "sha256": None, "ingested_at": None},
+                             chunks=count)
+                for source, count in merged.items() if count
+            }
+            self._order = sorted(self.sources)
+            self.total_chunks = sum(entry["chunks"] for entry in self.sources.values())
+            self.total_bytes = sum(entry.get("bytes") or 0 for entry in self.sources.values())
+            self._dirty = True
+
+    def get(self, source: str) -> Optional[Dict]:
+        """Catalog entry of one source"""
+        entry = self.sources.get(source)
+        return dict(entry, source=source) if entry else None
+
+    def page(self, offset: int = 0, limit: int = 100) -> List[Dict]:
+        """Entries of `limit` sources starting at `offset`, in source name order"""
+        with self._lock:
+            names = self._order[offset:offset + limit]
+            return [dict(self.sources[name], source=name) for name in names]
+
+    def stats(self) -> Dict[str, int]:
+        """Collection totals"""
+        return {
+            "total_documents": len(self.sources),
+            "total_chunks": self.total_chunks,
+            "total_bytes": self.total_bytes
+        }
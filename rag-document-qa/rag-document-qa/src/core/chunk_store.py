@@ -0,0 +1,267 @@
+"""
+Append-only, memory-mapped storage for chunk texts and metadata
+"""
+import json
+import mmap
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from langchain.schema import Document
+
+
+# Columns of the row index
+TEXT_OFFSET, TEXT_LENGTH, META_OFFSET, META_LENGTH = range(4)
+
+# UTF-8 needs at most 4 bytes per character
+MAX_UTF8_BYTES = 4
+
+
+def generation_path(directory: str, name: str, generation: int) -> str:
+    """Path of a file that compaction rewrites; generation 0 keeps the plain name (vectors.f32, vectors.2.f32, ...)"""
+    if not generation:
+        return os.path.join(directory, name)
+    stem, extension = name.split(".", 1)
+    return os.path.join(directory, f"{stem}.{generation}.{extension}")
+
+
+def remove_other_generations(directory: str, name: str, generation: int):
+    """Delete copies of a file from other generations: superseded ones or those of an interrupted compaction"""
+    stem, extension = name.split(".", 1)
+    pattern = re.compile(rf"{re.escape(stem)}(\.\d+)?\.{re.escape(extension)}")
+    current = os.path.basename(generation_path(directory, name, generation))
+    for file_name in os.listdir(directory):
+        if file_name != current and pattern.fullmatch(file_name):
+            try:
+                os.remove(os.path.join(directory, file_name))
+            except OSError:
+                pass  # Still mapped by a reader on some platforms; the next load retries
+
+
+class ChunkView:
+    """Read-only snapshot of the chunk store for lock-free reads
+
+    Rows are decoded straight from the memory map on access, so only the
+    chunks a request actually returns ever become Python strings.
+    """
+
+    __slots__ = ("_buffer", "_index")
+
+    def __init__(self, buffer: memoryview, index: np.ndarray):
+        self._buffer = buffer
+        self._index = index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def text(self, row: int, max_chars: Optional[int] = None) -> str:
+        """Chunk text, or only its first max_chars characters (decoding just the bytes they can span)"""
+        offset, length = int(self._index[row, TEXT_OFFSET]), int(self._index[row, TEXT_LENGTH])
+        if max_chars is None or max_chars * MAX_UTF8_BYTES >= length:
+            return str(self._buffer[offset:offset + length], "utf-8")
+        # The cut may land inside a multi-byte character, whose bytes are dropped
+        prefix = str(self._buffer[offset:offset + max_chars * MAX_UTF8_BYTES], "utf-8", "ignore")
+        return prefix[:max_chars]
+
+    def metadata(self, row: int) -> Dict:
+        offset, length = int(self._index[row, META_OFFSET]), int(self._index[row, META_LENGTH])
+        return json.loads(str(self._buffer[offset:offset + length], "utf-8"))
+
+    def document(self, row: int, max_chars: Optional[int] = None) -> Document:
+        return Document(page_content=self.text(row, max_chars), metadata=self.metadata(row))
+
+
+class ChunkStore:
+    """Chunk texts and metadata in one append-only file, addressed by row
+
+    ``chunks.bin`` holds UTF-8 text and compact JSON metadata back to back;
+    ``chunks.idx.npy`` holds four int64s per row (text and metadata offset
+    and length), so a million rows cost 32 MB of RAM instead of the Python
+    strings and dicts. Metadata updates append a new copy and repoint the
+    row. The data file is memory-mapped and re-mapped after each append;
+    views taken earlier keep their own mapping, so readers never see a
+    half-written generation. Compaction writes the live rows as a new
+    generation (``chunks.<n>.bin``, ``chunks.<n>.idx.npy``) next to the old
+    one, which the owner deletes once its records name the new generation.
+
+    The row index is kept in a buffer whose capacity doubles when full, so
+    appends write their rows in place rather than copying the whole index.
+    Views hold a slice up to the row count they were taken at, which later
+    appends never write into. Metadata updates repoint rows in place too,
+    unless a view has been handed out since the buffer was last copied.
+    """
+
+    FILES = ("chunks.bin", "chunks.idx.npy")
+
+    def __init__(self, directory: str, generation: int = 0):
+        """
+        Initialize store
+
+        Args:
+            directory: Directory holding chunks.bin and chunks.idx.npy
+            generation: Compaction generation to open
+        """
+        self.directory = directory
+        self._set_generation(generation)
+        self._lock = threading.Lock()
+        self._set_index(np.zeros((0, 4), dtype=np.int64))
+        if os.path.exists(self._index_path):
+            self._set_index(np.load(self._index_path))
+        self._truncate_data()
+        self._view = self._map()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def index(self) -> np.ndarray:
+        """Row index (text and metadata offset and length per row)"""
+        return self._rows[:self._size]
+
+    def _set_generation(self, generation: int):
+        self.generation = generation
+        self._data_path, self._index_path = (
+            generation_path(self.directory, name, generation) for name in self.FILES
+        )
+
+    def remove_other_generations(self):
+        """Delete the files of every generation but the current one"""
+        for name in self.FILES:
+            remove_other_generations(self.directory, name, self.generation)
+
+    def _set_index(self, index: np.ndarray):
+        """Replace the row index with a new array, which becomes the buffer"""
+        self._rows = index
+        self._size = len(index)
+        self._shared = False  # Whether a view handed out reads this buffer
+
+    def _reserve(self, rows: int):
+        """Make room for `rows` more rows, doubling the capacity when needed"""
+        needed = self._size + rows
+        if needed <= len(self._rows):
+            return
+        grown = np.zeros((max(needed, 2 * len(self._rows)), 4), dtype=np.int64)
+        grown[:self._size] = self._rows[:self._size]
+        self._rows = grown
+        self._shared = False
+
+    def _data_end(self) -> int:
+        if not len(self.index):
+            return 0
+        return int(max(
+            (self.index[:, TEXT_OFFSET] + self.index[:, TEXT_LENGTH]).max(),
+            (self.index[:, META_OFFSET] + self.index[:, META_LENGTH]).max()
+        ))
+
+    def _truncate_data(self):
+        """Drop bytes appended after the last persist"""
+        end = self._data_end()
+        if not os.path.exists(self._data_path):
+            open(self._data_path, "wb").close()
+        if os.path.getsize(self._data_path) > end:
+            with open(self._data_path, "r+b") as f:
+                f.truncate(end)
+
+    def _map(self) -> ChunkView:
+        """View over the data file at its current length"""
+        if os.path.getsize(self._data_path) == 0:
+            return ChunkView(memoryview(b""), self.index)
+        with open(self._data_path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return ChunkView(memoryview(buffer), self.index)
+
+    @staticmethod
+    def _encode_metadata(metadata: Optional[Dict]) -> bytes:
+        return json.dumps(metadata or {}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def view(self) -> ChunkView:
+        """Snapshot for reading; unaffected by later appends, updates or compaction"""
+        with self._lock:
+            self._shared = True
+            return self._view
+
+    def documents(self, rows: Iterable[int], max_chars: Optional[int] = None) -> List[Document]:
+        """Documents for the given rows, read without handing out a view"""
+        with self._lock:
+            return [self._view.document(row, max_chars) for row in rows]
+
+    def append(self, texts: Iterable[str], metadatas: Iterable[Optional[Dict]]):
+        """Append rows"""
+        with self._lock:
+            offset = os.path.getsize(self._data_path)
+            rows = []
+            parts: List[bytes] = []
+            for text, metadata in zip(texts, metadatas):
+                text_bytes, meta_bytes = text.encode("utf-8"), self._encode_metadata(metadata)
+                rows.append((offset, len(text_bytes), offset + len(text_bytes), len(meta_bytes)))
+                parts.extend((text_bytes, meta_bytes))
+                offset += len(text_bytes) + len(meta_bytes)
+            if not rows:
+                return
+            with open(self._data_path, "ab") as f:
+                f.write(b"".join(parts))
+            self._reserve(len(rows))
+            self._rows[self._size:self._size + len(rows)] = rows
+            self._size += len(rows)
+            self._view = self._map()
+
+    def update_metadata(self, rows: List[int], metadatas: List[Dict]):
+        """Replace the metadata of existing rows"""
+        with self._lock:
+            offset = os.path.getsize(self._data_path)
+            pointers = []
+            parts = []
+            for metadata in metadatas:
+                meta_bytes = self._encode_metadata(metadata)
+                pointers.append((offset, len(meta_bytes)))
+                parts.append(meta_bytes)
+                offset += len(meta_bytes)
+            if not parts:
+                return
+            with open(self._data_path, "ab") as f:
+                f.write(b"".join(parts))
+            if self._shared:
+                # Views handed out keep pointing at the old metadata
+                self._set_index(self._rows.copy())
+            self._rows[list(rows), META_OFFSET:META_LENGTH + 1] = pointers
+            self._view = self._map()
+
+    def truncate(self, rows: int):
+        """Forget rows past `rows`, e.g. ones added after the owner last persisted"""
+        with self._lock:
+            if rows < self._size:
+                if self._shared:
+                    # Copied, since appends would otherwise overwrite rows earlier views still read
+                    self._set_index(self.index[:rows].copy())
+                self._size = rows
+                self._view = self._map()
+
+    def compact(self, keep: np.ndarray, generation: int):
+        """Write only the given rows, in order, as a new generation and switch to it; the old files stay"""
+        with self._lock:
+            view = self._view
+            index = np.zeros((len(keep), 4), dtype=np.int64)
+            offset = 0
+            with open(generation_path(self.directory, self.FILES[0], generation), "wb") as f:
+                for i, row in enumerate(keep):
+                    text_offset, text_length, meta_offset, meta_length = (int(v) for v in self.index[row])
+                    f.write(view._buffer[text_offset:text_offset + text_length])
+                    f.write(view._buffer[meta_offset:meta_offset + meta_length])
+                    index[i] = (offset, text_length, offset + text_length, meta_length)
+                    offset += text_length + meta_length
+            self._set_generation(generation)
+            self._set_index(index)
+            self._view = self._map()
+            self._save_index()
+
+    def _save_index(self):
+        tmp_path = f"{self._index_path}.tmp.npy"
+        np.save(tmp_path, self.index)
+        os.replace(tmp_path, self._index_path)
+
+    def persist(self):
+        """Write the row index; the data file is already on disk"""
+        with self._lock:
+            self._save_index()
@@ -0,0 +1,141 @@
+"""
+Token-budgeted prompt context built from retrieved chunks
+"""
+import math
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from src.core.lexical_index import tokenize
+
+try:
+    import tiktoken
+except ImportError:  # Token counts are estimated without tiktoken
+    tiktoken = None
+
+
+# Page markers only appear in chunks indexed before pages were tracked as metadata
+PAGE_MARKER = re.compile(r"\s*--- Page \d+ ---\s*")
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[])")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for English text"""
+    return math.ceil(len(text) / 4)
+
+
+def token_counter(model_name: str = "gpt-3.5-turbo") -> Callable[[str], int]:
+    """Token counting function for the model's tokenizer"""
+    if tiktoken is None:
+        return estimate_tokens
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads its vocabulary on first use, which fails offline
+        print(f"Tokenizer unavailable, estimating token counts: {str(e)}")
+        return estimate_tokens
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def strip_overlap(previous: str, current: str, min_overlap: int = 20, max_overlap: int = 500) -> str:
+    """Drop the prefix of `current` that repeats the end of `previous` (splitter overlap)"""
+    for size in range(min(len(previous), len(current), max_overlap), min_overlap - 1, -1):
+        if previous.endswith(current[:size]):
+            return current[size:].lstrip()
+    return current
+
+
+class ContextBuilder:
+    """Compresses retrieved chunks to fit a token budget before prompt stuffing
+
+    1. Page markers are stripped and text repeated between adjacent chunks of
+       the same source (the splitter's overlap) is removed.
+    2. Chunks are split into sentences, each scored by its overlap with the
+       question's terms plus a bonus for the chunk's retrieval rank.
+    3. Sentences are taken greedily by score until the budget is spent, then
+       put back in document order so each chunk still reads coherently.
+    """
+
+    def __init__(self, max_tokens: int = 1500, model_name: str = "gpt-3.5-turbo",
+                 count_tokens: Optional[Callable[[str], int]] = None):
+        """
+        Initialize builder
+
+        Args:
+            max_tokens: Token budget for the whole context
+            model_name: Model whose tokenizer is used for counting
+            count_tokens: Custom token counting function
+        """
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens or token_counter(model_name)
+
+    def _deduplicate(self, docs: List[Document]) -> List[str]:
+        """Texts without page markers or overlap with the previous chunk of the same source"""
+        texts = [PAGE_MARKER.sub(" ", doc.page_content).strip() for doc in docs]
+        by_position = {
+            (doc.metadata.get("source"), doc.metadata.get("chunk_index")): i for i, doc in enumerate(docs)
+        }
+        cleaned = list(texts)
+        for i, doc in enumerate(docs):
+            index = doc.metadata.get("chunk_index")
+            if index is None:
+                continue
+            previous = by_position.get((doc.metadata.get("source"), index - 1))
+            if previous is not None:
+                cleaned[i] = strip_overlap(texts[previous], texts[i])
+        return cleaned
+
+    def build(self, question: str, docs: List[Document]) -> Tuple[List[Document], Dict[str, int]]:
+        """
+        Select the most relevant sentences of the ranked docs within the budget
+
+        Args:
+            question: User question
+            docs: Retrieved chunks, best first
+
+        Returns:
+            Compressed documents (same metadata, best first) and token counts:
+            original_tokens, context_tokens and tokens_saved
+        """
+        original_tokens = sum(self.count_tokens(doc.page_content) for doc in docs)
+        question_terms = set(tokenize(question))
+
+        candidates = []
+        for rank, text in enumerate(self._deduplicate(docs)):
+            for position, sentence in enumerate(SENTENCE_BOUNDARY.split(text)):
+                sentence = sentence.strip()
+                if not sentence:
+                    continue
+                terms = tokenize(sentence)
+                overlap = len(question_terms.intersection(terms))
+                score = overlap / math.sqrt(len(terms) + 1) + 1.0 / (rank + 2)
+                candidates.append((score, rank, position, sentence))
+
+        selected: Dict[int, List[Tuple[int, str]]] = {}
+        used = 0
+        for score, rank, position, sentence in sorted(candidates, key=lambda c: (-c[0], c[1], c[2])):
+            tokens = self.count_tokens(sentence) + 1
+            if used + tokens > self.max_tokens:
+                continue
+            selected.setdefault(rank, []).append((position, sentence))
+            used += tokens
+
+        compressed = []
+        for rank in sorted(selected):
+            sentences = sorted(selected[rank])
+            parts = [sentences[0][1]]
+            for (previous, _), (position, sentence) in zip(sentences, sentences[1:]):
+                # Mark skipped sentences so the model doesn't read across a gap
+                parts.append(("... " if position != previous + 1 else "") + sentence)
+            compressed.append(Document(page_content=" ".join(parts), metadata=dict(docs[rank].metadata)))
+
+        context_tokens = sum(self.count_tokens(doc.page_content) for doc in compressed)
+        return compressed, {
+            "original_tokens": original_tokens,
+            "context_tokens": context_tokens,
+            "tokens_saved": max(0, original_tokens - context_tokens)
+        }
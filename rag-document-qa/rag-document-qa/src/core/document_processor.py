@@ -1,76 +1,253 @@
 """
 Document processing module for PDF text extraction and chunking
 """
+import bisect
+import hashlib
 import os
-from typing import List, Dict
-from pypdf import PdfReader
+import re
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, List, Dict, Iterator, Optional, Sequence, Tuple
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 from tqdm import tqdm
 
+from src.core.metrics import collect_timings, record_stage, span
+from src.core.pdf_extraction import PdfExtractor
+
+
+# Pages are joined with a form feed so the splitter can treat page breaks as the strongest boundary
+PAGE_BREAK = "\f"
+
+# A line break followed by a short numbered heading line ("3 Method", "2.1. Results", "IV. Discussion")
+SECTION_HEADING = r"\n(?=(?:\d+(?:\.\d+)*\.?|[IVX]+\.)[ \t]+[A-Z][^\n]{0,80}\n)"
+
+
+# One processor per pool worker, so its extraction process and loaded PDF engines serve every file it gets
+_worker_processors: Dict[tuple, "DocumentProcessor"] = {}
+
+
+def _process_pdf_worker(pdf_path: str, chunk_size: int, chunk_overlap: int, extractor_options: Dict[str, Any],
+                        strict: bool = False) -> Tuple[Optional[List[Document]], Dict[str, Any], Dict[str, float]]:
+    """Extract and split a single PDF inside a worker process; returns the chunks, extraction stats and stage timings"""
+    key = (chunk_size, chunk_overlap, repr(sorted(extractor_options.items())))
+    if key not in _worker_processors:
+        _worker_processors[key] = DocumentProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                                    **extractor_options)
+    processor = _worker_processors[key]
+    # Metrics recorded here stay in the worker, so the timings travel back with the chunks
+    with collect_timings() as timings:
+        documents = processor._process_file(pdf_path, strict)
+    return documents, processor.extractor.take_stats(), timings
+
 
 class DocumentProcessor:
     """Handles PDF processing and text chunking"""
     
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, num_workers: int = 1,
+                 pdf_engines: Optional[Sequence[str]] = None,
+                 page_timeout: Optional[float] = 30.0,
+                 file_timeout: Optional[float] = 300.0):
+        """
+        Initialize document processor
+        
+        Args:
+            chunk_size: Maximum characters per chunk
+            chunk_overlap: Characters shared between adjacent chunks
+            num_workers: Worker processes used for ingestion (1 = in-process, 0 = one per CPU)
+            pdf_engines: PDF engines to try in order (None for every installed engine, fastest first)
+            page_timeout: Seconds allowed to extract one page (None for no limit)
+            file_timeout: Seconds allowed to extract one file (None for no limit)
+        """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.num_workers = num_workers
+        self.extractor = PdfExtractor(engines=pdf_engines, page_timeout=page_timeout, file_timeout=file_timeout)
+        self.extractor_options = {
+            "pdf_engines": self.extractor.engine_names,
+            "page_timeout": page_timeout,
+            "file_timeout": file_timeout
+        }
+        # Boundaries in order of preference: page, section heading, paragraph, line, word
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
             length_function=len,
-            separators=["\n\n", "\n", " ", ""]
+            separators=[re.escape(PAGE_BREAK), SECTION_HEADING, r"\n\n", r"\n", " ", ""],
+            is_separator_regex=True
         )
     
+    def iter_pages(self, pdf_path: str) -> Iterator[Tuple[int, str]]:
+        """Yield (page_number, text) for each non-empty page of a PDF"""
+        return self.extractor.iter_pages(pdf_path)
+    
+    def extract_pages(self, pdf_path: str, strict: bool = False) -> Tuple[str, List[int], List[int]]:
+        """
+        Extract the text of a PDF with its page layout
+        
+        Args:
+            pdf_path: PDF to read
+            strict: Raise when the file can't be read instead of treating it as empty
+        
+        Returns:
+            The page texts joined by PAGE_BREAK, the offset where each page starts
+            and the matching page numbers (empty pages are skipped)
+        """
+        parts, starts, page_numbers = [], [], []
+        offset = 0
+        try:
+            for page_num, page_text in self.iter_pages(pdf_path):
+                starts.append(offset)
+                page_numbers.append(page_num)
+                parts.append(page_text)
+                offset += len(page_text) + len(PAGE_BREAK)
+        except Exception as e:
+            if strict:
+                raise
+            print(f"Error reading {pdf_path}: {str(e)}")
+            return "", [], []
+        return PAGE_BREAK.join(parts), starts, page_numbers
+    
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         """Extract text from PDF file"""
-        try:
-            reader = PdfReader(pdf_path)
-            text = ""
-            
-            for page_num, page in enumerate(reader.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    text += f"\n--- Page {page_num + 1} ---\n{page_text}"
+        return self.extract_pages(pdf_path)[0].replace(PAGE_BREAK, "\n\n")
+    
+    @staticmethod
+    def chunk_id(source: str, text: str, occurrence: int = 1) -> str:
+        """Content hash identifying a chunk; stable as long as its source and text are"""
+        digest = hashlib.sha256(f"{source}\x00{occurrence}\x00{text}".encode("utf-8"))
+        return digest.hexdigest()[:32]
+    
+    def process_pdf(self, pdf_path: str, strict: bool = False) -> List[Document]:
+        """Extract and chunk a single PDF, recording the pages each chunk spans (strict: raise if it can't be read)"""
+        documents = []
+        pdf_file = os.path.basename(pdf_path)
+        with span("extract"):
+            text, page_starts, page_numbers = self.extract_pages(pdf_path, strict)
+        
+        if text:
+            # Create chunks
+            with span("split"):
+                chunks = self.text_splitter.split_text(text)
+            occurrences = Counter()
+            search_from = 0
             
-            return text
+            # Create Document objects with metadata
+            for i, chunk in enumerate(chunks):
+                # Chunks come back in order, so each is found at or after the previous one's start
+                start = text.find(chunk, search_from)
+                if start < 0:
+                    start = search_from
+                search_from = start + 1
+                first_page = bisect.bisect_right(page_starts, start) - 1
+                last_page = bisect.bisect_right(page_starts, start + len(chunk) - 1) - 1
+                
+                chunk = chunk.replace(PAGE_BREAK, "\n\n")
+                occurrences[chunk] += 1
+                doc = Document(
+                    page_content=chunk,
+                    metadata={
+                        "source": pdf_file,
+                        "chunk_index": i,
+                        "total_chunks": len(chunks),
+                        "chunk_id": self.chunk_id(pdf_file, chunk, occurrences[chunk]),
+                        "page_start": page_numbers[first_page],
+                        "page_end": page_numbers[last_page]
+                    }
+                )
+                documents.append(doc)
+        
+        return documents
+    
+    def _resolve_workers(self, num_workers: Optional[int], num_files: int) -> int:
+        """Resolve the worker count for a run"""
+        workers = self.num_workers if num_workers is None else num_workers
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        return max(1, min(workers, num_files))
+    
+    def _process_file(self, pdf_path: str, strict: bool) -> Optional[List[Document]]:
+        """Chunks of one file; in strict mode None when it can't be read, so callers can tell it from an empty file"""
+        if not strict:
+            return self.process_pdf(pdf_path)
+        try:
+            return self.process_pdf(pdf_path, strict=True)
         except Exception as e:
             print(f"Error reading {pdf_path}: {str(e)}")
-            return ""
+            return None
     
-    def process_documents(self, pdf_directory: str) -> List[Document]:
-        """Process all PDFs in directory"""
-        documents = []
-        pdf_files = [f for f in os.listdir(pdf_directory) if f.endswith('.pdf')]
+    def iter_file_documents(self, pdf_paths: List[str], num_workers: Optional[int] = None,
+                            strict: bool = False) -> Iterator[Optional[List[Document]]]:
+        """
+        Yield the chunks of each file in order, keeping at most 2 * workers files in flight
+        
+        Args:
+            pdf_paths: Files to process
+            num_workers: Override for the configured worker count
+            strict: Yield None for a file that can't be read instead of an empty list
+        """
+        workers = self._resolve_workers(num_workers, len(pdf_paths))
+        if workers == 1:
+            for pdf_path in pdf_paths:
+                yield self._process_file(pdf_path, strict)
+            return
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            remaining = iter(pdf_paths)
+
+            def submit(path):
+                return executor.submit(
+                    _process_pdf_worker, path, self.chunk_size, self.chunk_overlap, self.extractor_options, strict
+                )
+
+            pending = deque(submit(path) for path in islice(remaining, workers * 2))
+            
+            while pending:
+                # Results are consumed in submission order, keeping output deterministic
+                file_documents, extraction_stats, timings = pending.popleft().result()
+                self.extractor.merge_stats(extraction_stats)
+                for stage, duration_ms in timings.items():
+                    record_stage(stage, duration_ms / 1000)
+                next_path = next(remaining, None)
+                if next_path is not None:
+                    pending.append(submit(next_path))
+                yield file_documents
+    
+    def iter_documents(self, pdf_directory: str, num_workers: Optional[int] = None) -> Iterator[Document]:
+        """
+        Stream document chunks for all PDFs in directory
+        
+        Args:
+            pdf_directory: Directory containing PDF files
+            num_workers: Override for the configured worker count
+        
+        Files are processed in sorted filename order, so the chunks are identical
+        whether they were produced in-process or by a process pool. Only the chunks
+        of the files currently in flight are held in memory.
+        """
+        pdf_files = sorted(f for f in os.listdir(pdf_directory) if f.endswith('.pdf'))
         
         if not pdf_files:
             print(f"No PDF files found in {pdf_directory}")
-            return documents
+            return
         
-        print(f"Processing {len(pdf_files)} PDF files...")
+        pdf_paths = [os.path.join(pdf_directory, pdf_file) for pdf_file in pdf_files]
+        workers = self._resolve_workers(num_workers, len(pdf_paths))
+        print(f"Processing {len(pdf_files)} PDF files with {workers} worker(s)...")
         
-        for pdf_file in tqdm(pdf_files, desc="Processing PDFs"):
-            pdf_path = os.path.join(pdf_directory, pdf_file)
-            text = self.extract_text_from_pdf(pdf_path)
-            
-            if text:
-                # Create chunks
-                chunks = self.text_splitter.split_text(text)
-                
-                # Create Document objects with metadata
-                for i, chunk in enumerate(chunks):
-                    doc = Document(
-                        page_content=chunk,
-                        metadata={
-                            "source": pdf_file,
-                            "chunk_index": i,
-                            "total_chunks": len(chunks)
-                        }
-                    )
-                    documents.append(doc)
+        total = 0
+        file_results = self.iter_file_documents(pdf_paths, num_workers=workers)
+        for file_documents in tqdm(file_results, total=len(pdf_paths), desc="Processing PDFs"):
+            total += len(file_documents)
+            yield from file_documents
         
-        print(f"Created {len(documents)} document chunks")
-        return documents
+        print(f"Created {total} document chunks")
+        self.extractor.report()
+    
+    def process_documents(self, pdf_directory: str, num_workers: Optional[int] = None) -> List[Document]:
+        """Process all PDFs in directory into a list of chunks"""
+        return list(self.iter_documents(pdf_directory, num_workers=num_workers))
 
 
 # Test function
@@ -0,0 +1,245 @@
+"""
+Persistent embedding cache keyed by model, normalization flag and text hash
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+
+class VectorFile:
+    """Memory-mapped file of fixed-width float32 rows for one embedding dimension"""
+
+    def __init__(self, path: str, dim: int, capacity: int, used_rows: Iterable[int]):
+        """
+        Initialize vector file
+
+        Args:
+            path: File holding the rows
+            dim: Floats per row
+            capacity: Maximum number of rows
+            used_rows: Rows the index points at; every other row below the highest is free
+        """
+        self.path = path
+        self.dim = dim
+        self.capacity = capacity
+        if not os.path.exists(path):
+            open(path, "wb").close()
+        rows = os.path.getsize(path) // (dim * 4)
+        self.mmap: Optional[np.memmap] = np.memmap(path, dtype=np.float32, mode="r+", shape=(rows, dim)) if rows else None
+
+        used = set(used_rows)
+        self.next_row = max(used) + 1 if used else 0
+        self.free_rows = [row for row in range(self.next_row) if row not in used]
+
+    def grow(self, min_rows: int, growth_rows: int):
+        """Extend the file so it holds at least min_rows rows"""
+        current = self.mmap.shape[0] if self.mmap is not None else 0
+        if current >= min_rows:
+            return
+        rows = min(max(min_rows, current + growth_rows), self.capacity)
+        if self.mmap is not None:
+            self.mmap.flush()
+        with open(self.path, "r+b") as f:
+            f.truncate(rows * self.dim * 4)
+        self.mmap = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+
+
+class EmbeddingCache:
+    """Disk-backed float32 vector cache with LRU eviction by size
+
+    Vectors live in memory-mapped ``vectors.<dim>.f32`` files of fixed-width
+    rows, one per embedding dimension, so switching to a model with another
+    output size starts a new file instead of clashing with the old rows. A
+    small SQLite index maps each key to its dimension and row. When a file
+    reaches ``max_bytes`` its least recently used entries are evicted and
+    their rows are reused, so no file grows past the budget.
+    """
+
+    GROWTH_ROWS = 4096
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1 << 30, evict_fraction: float = 0.1):
+        """
+        Initialize embedding cache
+
+        Args:
+            cache_dir: Directory holding the vector files and index
+            max_bytes: Upper bound on the size of each vector file
+            evict_fraction: Share of a file's entries dropped when it is full
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.evict_fraction = evict_fraction
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite3"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, row INTEGER, last_used INTEGER, dim INTEGER)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        meta = dict(self._db.execute("SELECT name, value FROM meta"))
+        if "dim" not in {column[1] for column in self._db.execute("PRAGMA table_info(entries)")}:
+            self._migrate_single_file(meta.get("dim"))
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_dim_last_used ON entries (dim, last_used)")
+        self._db.commit()
+
+        self._tick = meta.get("tick", 0)
+        self._files: Dict[int, VectorFile] = {}
+
+    def _migrate_single_file(self, dim: Optional[int]):
+        """Caches written before vectors were split by dimension kept them all in vectors.f32"""
+        self._db.execute("ALTER TABLE entries ADD COLUMN dim INTEGER")
+        self._db.execute("DROP INDEX IF EXISTS entries_last_used")
+        legacy_path = os.path.join(self.cache_dir, "vectors.f32")
+        if dim and os.path.exists(legacy_path):
+            self._db.execute("UPDATE entries SET dim = ?", (dim,))
+            os.replace(legacy_path, self._vectors_path(dim))
+        else:
+            self._db.execute("DELETE FROM entries")
+        self._db.execute("DELETE FROM meta WHERE name = 'dim'")
+
+    def _vectors_path(self, dim: int) -> str:
+        return os.path.join(self.cache_dir, f"vectors.{dim}.f32")
+
+    def capacity(self, dim: int) -> int:
+        """Maximum number of vectors of this dimension that fit in the byte budget"""
+        return max(1, self.max_bytes // (dim * 4))
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _file(self, dim: int) -> VectorFile:
+        """Vector file for a dimension, opened on first use"""
+        if dim not in self._files:
+            used = (row for (row,) in self._db.execute("SELECT row FROM entries WHERE dim = ?", (dim,)))
+            self._files[dim] = VectorFile(self._vectors_path(dim), dim, self.capacity(dim), used)
+        return self._files[dim]
+
+    def _evict(self, vectors: VectorFile, needed: int):
+        """Drop least recently used entries of one file until needed rows are free"""
+        count = max(needed - len(vectors.free_rows), int(vectors.capacity * self.evict_fraction), 1)
+        victims = self._db.execute(
+            "SELECT key, row FROM entries WHERE dim = ? ORDER BY last_used LIMIT ?", (vectors.dim, count)
+        ).fetchall()
+        self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in victims])
+        vectors.free_rows.extend(row for _, row in victims)
+
+    def _allocate(self, vectors: VectorFile, count: int) -> List[int]:
+        """Reserve rows for new vectors, evicting if the budget is exhausted"""
+        fresh = min(count, vectors.capacity - vectors.next_row)
+        if fresh < count - len(vectors.free_rows):
+            self._evict(vectors, count - fresh)
+
+        rows = list(range(vectors.next_row, vectors.next_row + fresh))
+        vectors.next_row += fresh
+        for _ in range(count - fresh):
+            rows.append(vectors.free_rows.pop())
+        vectors.grow(vectors.next_row, self.GROWTH_ROWS)
+        return rows
+
+    def _lookup(self, keys: List[bytes]) -> Dict[bytes, tuple]:
+        """(dim, row) of every stored key"""
+        found = {}
+        # SQLite caps the number of bound parameters per statement
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            found.update(
+                (key, (dim, row)) for key, dim, row in self._db.execute(
+                    f"SELECT key, dim, row FROM entries WHERE key IN ({placeholders})", batch
+                )
+            )
+        return found
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Look up vectors for keys; missing keys are absent from the result"""
+        if not keys:
+            return {}
+        with self._lock:
+            found = self._lookup(keys)
+            if not found:
+                return {}
+
+            self._tick += 1
+            self._db.executemany(
+                "UPDATE entries SET last_used = ? WHERE key = ?", [(self._tick, key) for key in found]
+            )
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('tick', ?)", (self._tick,))
+            self._db.commit()
+            return {key: np.array(self._file(dim).mmap[row]) for key, (dim, row) in found.items()}
+
+    def put_many(self, keys: List[bytes], vectors: List[List[float]]):
+        """Store vectors for keys"""
+        if not keys:
+            return
+        with self._lock:
+            matrix = np.asarray(vectors, dtype=np.float32)
+            if matrix.ndim != 2 or not matrix.shape[1]:
+                return
+            # A key stored meanwhile (e.g. by a concurrent embed of the same text) keeps its row;
+            # re-inserting it would point the key at a new row and strand the old one
+            existing = self._lookup(list(set(keys)))
+            positions = {key: i for i, key in enumerate(keys) if key not in existing}
+            if not positions:
+                return
+            keys, matrix = list(positions), matrix[list(positions.values())]
+            file = self._file(matrix.shape[1])
+            if len(keys) > file.capacity:
+                keys, matrix = keys[-file.capacity:], matrix[-file.capacity:]
+
+            rows = self._allocate(file, len(keys))
+            file.mmap[rows] = matrix
+            file.mmap.flush()
+
+            self._tick += 1
+            self._db.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                [(key, row, self._tick, file.dim) for key, row in zip(keys, rows)]
+            )
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('tick', ?)", (self._tick,))
+            self._db.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves document vectors from an EmbeddingCache"""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, namespace: str):
+        """
+        Initialize cached embeddings
+
+        Args:
+            embeddings: Underlying embedding model
+            cache: Persistent vector cache
+            namespace: Model identity (name and normalization) mixed into every key
+        """
+        self.embeddings = embeddings
+        self.cache = cache
+        self.namespace = namespace
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.namespace}\x00{text}".encode("utf-8")).digest()[:16]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents, encoding only texts that are not cached yet"""
+        keys = [self._key(text) for text in texts]
+        cached = self.cache.get_many(list(set(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            self.cache.put_many(list(missing), vectors)
+            cached.update(zip(missing, (np.asarray(v, dtype=np.float32) for v in vectors)))
+
+        return [cached[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Queries are not cached on disk"""
+        return self.embeddings.embed_query(text)
@@ -0,0 +1,211 @@
+"""
+Incremental indexing module that only re-embeds new or changed documents
+"""
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+from tqdm import tqdm
+
+from src.core.document_processor import DocumentProcessor
+from src.core.vector_store import VectorStore
+
+
+MANIFEST_FILENAME = "index_manifest.json"
+
+
+class IndexManifest:
+    """Per-file content hashes and chunk ids of everything in the vector store"""
+
+    def __init__(self, path: str, backend: str = "chroma"):
+        """
+        Initialize manifest
+
+        Args:
+            path: JSON file the manifest is persisted to
+            backend: Vector store backend the manifest describes
+        """
+        self.path = path
+        self.backend = backend
+        self.files: Dict[str, Dict] = {}
+        self.load()
+
+    def load(self):
+        """Load manifest from disk if it exists"""
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # A manifest written for another backend says nothing about this one's contents
+            if data.get("backend", "chroma") == self.backend:
+                self.files = data.get("files", {})
+
+    def save(self):
+        """Atomically write manifest to disk"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "backend": self.backend, "files": self.files}, f)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def hash_file(path: str, block_size: int = 1 << 20) -> str:
+        """SHA-256 of a file's contents"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def file_hash(self, source: str, path: str) -> str:
+        """Content hash of a file, reusing the stored hash when size and mtime are unchanged"""
+        stat = os.stat(path)
+        entry = self.files.get(source)
+        if entry and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            return entry["sha256"]
+        return self.hash_file(path)
+
+
+class IncrementalIndexer:
+    """Keeps a vector store in sync with a directory of PDFs"""
+
+    def __init__(self,
+                 vector_store: VectorStore,
+                 document_processor: Optional[DocumentProcessor] = None):
+        """
+        Initialize indexer
+
+        Args:
+            vector_store: Store to keep in sync; the manifest lives in its persist directory
+            document_processor: Processor used to extract and chunk changed files
+        """
+        self.vector_store = vector_store
+        self.document_processor = document_processor or DocumentProcessor()
+        self.manifest = IndexManifest(
+            os.path.join(vector_store.persist_directory, MANIFEST_FILENAME),
+            backend=vector_store.backend
+        )
+
+    def sync(self, pdf_directory: str, num_workers: Optional[int] = None) -> Dict[str, int]:
+        """
+        Index new and changed PDFs and drop chunks of removed ones
+
+        Args:
+            pdf_directory: Directory containing PDF files
+            num_workers: Override for the processor's worker count
+
+        Returns:
+            Counts of added/updated/removed/unchanged/failed files and added/deleted chunks
+
+        A changed file that can't be read keeps its previous chunks and manifest
+        entry, so a temporary failure doesn't drop it from the index and the
+        next sync retries it.
+        """
+        stats = {
+            "added_files": 0, "updated_files": 0, "removed_files": 0, "unchanged_files": 0,
+            "failed_files": 0, "chunks_added": 0, "chunks_deleted": 0
+        }
+        pdf_files = sorted(f for f in os.listdir(pdf_directory) if f.endswith('.pdf'))
+
+        # Work out what changed from content hashes
+        current = {}
+        for pdf_file in pdf_files:
+            pdf_path = os.path.join(pdf_directory, pdf_file)
+            current[pdf_file] = (pdf_path, self.manifest.file_hash(pdf_file, pdf_path))
+
+        changed = [
+            pdf_file for pdf_file, (_, sha256) in current.items()
+            if self.manifest.files.get(pdf_file, {}).get("sha256") != sha256
+        ]
+        removed = [source for source in self.manifest.files if source not in current]
+        stats["unchanged_files"] = len(current) - len(changed)
+
+        for source in removed:
+            chunk_ids = self.manifest.files.pop(source)["chunks"]
+            self.vector_store.delete_documents(chunk_ids)
+            stats["chunks_deleted"] += len(chunk_ids)
+            stats["removed_files"] += 1
+
+        print(f"Index sync: {len(changed)} new/changed, {len(removed)} removed, "
+              f"{stats['unchanged_files']} unchanged")
+
+        if changed:
+            pdf_paths = [current[pdf_file][0] for pdf_file in changed]
+            file_results = self.document_processor.iter_file_documents(pdf_paths, num_workers=num_workers, strict=True)
+
+            for pdf_file, documents in tqdm(zip(changed, file_results), total=len(changed), desc="Indexing PDFs"):
+                if documents is None:
+                    print(f"Keeping the indexed version of {pdf_file} until it can be read")
+                    stats["failed_files"] += 1
+                    continue
+                added, deleted = self._sync_file(pdf_file, documents)
+                stats["chunks_added"] += added
+                stats["chunks_deleted"] += deleted
+                stats["updated_files" if pdf_file in self.manifest.files else "added_files"] += 1
+
+                pdf_path, sha256 = current[pdf_file]
+                stat = os.stat(pdf_path)
+                self.manifest.files[pdf_file] = {
+                    "sha256": sha256,
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "chunks": [doc.metadata["chunk_id"] for doc in documents]
+                }
+                self.vector_store.catalog.describe(pdf_file, sha256=sha256, size=stat.st_size)
+
+        # Hashes may have been refreshed for files whose mtime moved without a content change
+        for pdf_file, (pdf_path, sha256) in current.items():
+            entry = self.manifest.files.get(pdf_file)
+            if entry and pdf_file not in changed:
+                stat = os.stat(pdf_path)
+                entry["size"], entry["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+                # Also fills in catalogs that were rebuilt from chunk counts alone
+                self.vector_store.catalog.describe(pdf_file, sha256=sha256, size=stat.st_size)
+
+        if changed or removed:
+            self.vector_store.persist()
+        self.vector_store.catalog.save()
+        self.manifest.save()
+
+        print(f"Index sync done: +{stats['chunks_added']} / -{stats['chunks_deleted']} chunks")
+        if stats["failed_files"]:
+            print(f"{stats['failed_files']} file(s) could not be read and will be retried on the next sync")
+        if changed:
+            self.document_processor.extractor.report()
+        return stats
+
+    def _sync_file(self, source: str, documents: List) -> tuple:
+        """Apply the chunk-level diff for one file; returns (chunks added, chunks deleted)"""
+        entry = self.manifest.files.get(source)
+        if entry is None:
+            # Unknown to the manifest: clear anything a previous full rebuild left behind
+            # (the catalog knows every source in the store, so new files skip the delete)
+            if self.vector_store.catalog.get(source) is not None:
+                self.vector_store.delete_source(source)
+            old_ids = set()
+        else:
+            old_ids = set(entry["chunks"])
+
+        new_ids = {doc.metadata["chunk_id"] for doc in documents}
+        stale = [chunk_id for chunk_id in old_ids if chunk_id not in new_ids]
+        self.vector_store.delete_documents(stale)
+
+        # Only chunks with unseen text are embedded; kept chunks whose metadata changed
+        # (position, or pages when a blank page is added before them) are rewritten in place
+        kept = [doc for doc in documents if doc.metadata["chunk_id"] in old_ids]
+        stored = {
+            doc.metadata.get("chunk_id"): doc.metadata
+            for doc in self.vector_store.get_documents([doc.metadata["chunk_id"] for doc in kept], content_chars=0)
+        }
+        to_add = [doc for doc in documents if doc.metadata["chunk_id"] not in stored]
+        moved = [
+            doc for doc in kept
+            if doc.metadata["chunk_id"] in stored
+            and any(stored[doc.metadata["chunk_id"]].get(field) != value for field, value in doc.metadata.items())
+        ]
+
+        self.vector_store.add_documents_stream(to_add, persist=False)
+        self.vector_store.update_metadatas(
+            [doc.metadata["chunk_id"] for doc in moved],
+            [doc.metadata for doc in moved]
+        )
+        return len(to_add), len(stale)
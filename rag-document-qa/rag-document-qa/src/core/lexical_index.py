@@ -0,0 +1,346 @@
+"""
+BM25 inverted index over chunk texts for exact-term retrieval
+"""
+import json
+import math
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.core.metadata_filter import FieldIndex, MetadataFilter
+
+
+# Model names (gpt-3, t5-11b), identifiers (d_model) and numbers (1e-4, 0.1) stay whole
+TOKEN_PATTERN = re.compile(r"\w+(?:[-.]\w+)*")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+""".split())
+
+QUESTION_WORDS = frozenset("""
+what how why when where which who whom whose explain describe compare does do did is are can could should
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms; compound tokens are also indexed by their parts"""
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        if "-" in token or "." in token:
+            terms.extend(part for part in re.split(r"[-.]", token) if part and part not in STOPWORDS)
+    return terms
+
+
+def is_keyword_query(query: str, max_terms: int = 4) -> bool:
+    """Heuristic for queries that name things rather than ask about them
+
+    Quoted phrases and short queries without question words that contain an
+    identifier-like token (digits, underscores, hyphens, acronyms or
+    non-ASCII symbols) are better served by exact term matching.
+    """
+    if '"' in query:
+        return True
+    tokens = TOKEN_PATTERN.findall(query)
+    if not tokens or len(tokens) > max_terms or query.rstrip().endswith("?"):
+        return False
+    if any(token.lower() in QUESTION_WORDS for token in tokens):
+        return False
+    return any(
+        re.search(r"[\d_\-.]", token) or (token.isupper() and len(token) > 1) or not token.isascii()
+        for token in tokens
+    )
+
+
+class BM25Index:
+    """Okapi BM25 over chunks, keyed by chunk id
+
+    Documents get dense integer slots. Each term's postings are two numpy
+    arrays (slots and term frequencies, slots ascending); terms of newly
+    added chunks are collected in lists and merged into the arrays the
+    first time the term is searched. Ids and sources are saved as JSON and
+    the postings and lengths as flat arrays in ``.postings.npz``, read
+    once at load. Removed documents are tombstoned, no longer count toward
+    document frequencies, and their slots are reclaimed when the index is
+    saved with many dead entries. Per-slot source, page and ingest-time
+    columns (saved next to the JSON) let a search skip slots that don't
+    match a metadata filter.
+    """
+
+    COMPACT_FRACTION = 0.25
+
+    def __init__(self, path: str, backend: str = "chroma", k1: float = 1.5, b: float = 0.75):
+        """
+        Initialize index
+
+        Args:
+            path: JSON file the index is persisted to
+            backend: Vector store backend whose chunks the index mirrors
+            k1: Term frequency saturation
+            b: Document length normalization
+        """
+        self.path = path
+        self.fields_path = f"{os.path.splitext(path)[0]}.fields.npz"
+        self.postings_path = f"{os.path.splitext(path)[0]}.postings.npz"
+        self.backend = backend
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._reset()
+        self.loaded = self.load()
+
+    def _reset(self):
+        self.ids: List[Optional[str]] = []
+        self.sources: List[Optional[str]] = []
+        self.fields = FieldIndex()
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._pending: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._slots: Dict[str, int] = {}
+        self._total_length = 0
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Terms per slot"""
+        return self._lengths[:len(self.ids)]
+
+    def load(self) -> bool:
+        """Load the index from disk; returns False if it is missing or for another backend"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("backend") != self.backend:
+            return False
+        fields = FieldIndex.load(self.fields_path)
+        if fields is None or len(fields) != len(data["ids"]):
+            # Written before metadata filtering (or torn by a crash): rebuild from the store
+            return False
+        if "postings" in data:
+            # Written before postings were stored as arrays
+            lengths = np.asarray(data["lengths"], dtype=np.int32)
+            postings = {}
+            for term, posting in data["postings"].items():
+                slots = np.fromiter((int(slot) for slot in posting), dtype=np.int32, count=len(posting))
+                tfs = np.fromiter(posting.values(), dtype=np.int32, count=len(posting))
+                order = np.argsort(slots, kind="stable")
+                postings[term] = (slots[order], tfs[order])
+        else:
+            if not os.path.exists(self.postings_path):
+                return False
+            with np.load(self.postings_path) as arrays:
+                lengths, terms = arrays["lengths"], arrays["terms"].tolist()
+                offsets, slots, tfs = arrays["offsets"], arrays["slots"], arrays["tfs"]
+            if len(lengths) != len(data["ids"]) or len(offsets) != len(terms) + 1:
+                return False
+            postings = {
+                term: (slots[offsets[i]:offsets[i + 1]], tfs[offsets[i]:offsets[i + 1]])
+                for i, term in enumerate(terms)
+            }
+        self._reset()
+        self.fields = fields
+        self.ids = data["ids"]
+        self.sources = data["sources"]
+        self.postings = postings
+        self._lengths = lengths
+        self._alive = np.asarray([chunk_id is not None for chunk_id in self.ids], dtype=bool)
+        self._slots = {chunk_id: slot for slot, chunk_id in enumerate(self.ids) if chunk_id is not None}
+        self._total_length = int(lengths[self._alive].sum()) if len(lengths) else 0
+        return True
+
+    def save(self):
+        """Atomically write the index (if it changed), compacting first if many slots are dead"""
+        with self._lock:
+            if not self._dirty and os.path.exists(self.path):
+                return
+            dead = len(self.ids) - len(self._slots)
+            if dead and dead >= self.COMPACT_FRACTION * len(self.ids):
+                self._compact()
+            for term in list(self._pending):
+                self._posting(term)
+            terms = list(self.postings)
+            sizes = [len(self.postings[term][0]) for term in terms]
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            np.cumsum(sizes, out=offsets[1:])
+            empty = np.zeros(0, dtype=np.int32)
+            tmp_postings = f"{self.postings_path}.tmp.npz"
+            np.savez(
+                tmp_postings,
+                terms=np.asarray(terms, dtype=str),
+                offsets=offsets,
+                slots=np.concatenate([self.postings[term][0] for term in terms]) if terms else empty,
+                tfs=np.concatenate([self.postings[term][1] for term in terms]) if terms else empty,
+                lengths=self.lengths
+            )
+            os.replace(tmp_postings, self.postings_path)
+            self.fields.save(self.fields_path)
+            # The JSON goes last: load() checks the other files against its ids
+            data = {"version": 2, "backend": self.backend, "ids": self.ids, "sources": self.sources}
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def _posting(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(slots, term frequencies) of a term, merging in slots added since it was last read"""
+        pending = self._pending.pop(term, None)
+        if pending is not None:
+            added = (np.asarray(pending[0], dtype=np.int32), np.asarray(pending[1], dtype=np.int32))
+            current = self.postings.get(term)
+            # Added slots come after every existing one, so the merged posting stays sorted
+            self.postings[term] = added if current is None else (
+                np.concatenate([current[0], added[0]]), np.concatenate([current[1], added[1]])
+            )
+        return self.postings.get(term)
+
+    def _compact(self):
+        """Renumber live slots and drop tombstoned postings"""
+        for term in list(self._pending):
+            self._posting(term)
+        live = np.flatnonzero(self._alive[:len(self.ids)])
+        remap = np.full(len(self.ids), -1, dtype=np.int32)
+        remap[live] = np.arange(len(live), dtype=np.int32)
+        self.ids = [self.ids[slot] for slot in live.tolist()]
+        self.sources = [self.sources[slot] for slot in live.tolist()]
+        self._lengths = self._lengths[live]
+        self._alive = np.ones(len(live), dtype=bool)
+        self.fields.keep(live.astype(np.int64))
+        postings = {}
+        for term, (slots, tfs) in self.postings.items():
+            new_slots = remap[slots]
+            keep = new_slots >= 0
+            if keep.any():
+                postings[term] = (new_slots[keep], tfs[keep])
+        self.postings = postings
+        self._slots = {chunk_id: slot for slot, chunk_id in enumerate(self.ids)}
+
+    def _reserve(self, slots: int):
+        """Make room for `slots` slots, doubling the per-slot arrays when they are full"""
+        if slots <= len(self._lengths):
+            return
+        capacity = max(slots, 2 * len(self._lengths), 1024)
+        size = len(self.ids)
+        lengths, alive = np.zeros(capacity, dtype=np.int32), np.zeros(capacity, dtype=bool)
+        lengths[:size], alive[:size] = self._lengths[:size], self._alive[:size]
+        self._lengths, self._alive = lengths, alive
+
+    def add(self, chunk_ids: List[str], texts: List[str], metadatas: Optional[List[Optional[Dict]]] = None):
+        """Index chunks; an existing chunk id is replaced"""
+        metadatas = metadatas or [None] * len(chunk_ids)
+        sources = [(metadata or {}).get("source") for metadata in metadatas]
+        with self._lock:
+            self._dirty = True
+            self.fields.append(metadatas)
+            self._reserve(len(self.ids) + len(chunk_ids))
+            for chunk_id, text, source in zip(chunk_ids, texts, sources):
+                self._remove(chunk_id)
+                terms = tokenize(text)
+                slot = len(self.ids)
+                self.ids.append(chunk_id)
+                self.sources.append(source)
+                self._lengths[slot] = len(terms)
+                self._alive[slot] = True
+                self._slots[chunk_id] = slot
+                self._total_length += len(terms)
+                counts: Dict[str, int] = {}
+                for term in terms:
+                    counts[term] = counts.get(term, 0) + 1
+                for term, tf in counts.items():
+                    pending = self._pending.setdefault(term, ([], []))
+                    pending[0].append(slot)
+                    pending[1].append(tf)
+
+    def _remove(self, chunk_id: str):
+        slot = self._slots.pop(chunk_id, None)
+        if slot is not None:
+            self.ids[slot] = None
+            self._alive[slot] = False
+            self._total_length -= int(self._lengths[slot])
+            self._dirty = True
+
+    def update_metadatas(self, chunk_ids: List[str], metadatas: List[Dict]):
+        """Refresh the filterable fields of indexed chunks"""
+        with self._lock:
+            found = [(self._slots.get(chunk_id), metadata) for chunk_id, metadata in zip(chunk_ids, metadatas)]
+            found = [(slot, metadata) for slot, metadata in found if slot is not None]
+            if found:
+                self._dirty = True
+            self.fields.update([slot for slot, _ in found], [metadata for _, metadata in found])
+
+    def remove(self, chunk_ids: List[str]):
+        """Tombstone chunks by id"""
+        with self._lock:
+            for chunk_id in chunk_ids:
+                self._remove(chunk_id)
+
+    def remove_source(self, source: str):
+        """Tombstone every chunk of a source file, found through the source's posting list"""
+        with self._lock:
+            for slot in self.fields.rows(MetadataFilter(sources=[source])).tolist():
+                if self.ids[slot] is not None:
+                    self._remove(self.ids[slot])
+
+    def source_counts(self, chunk_ids: Optional[List[str]] = None) -> Dict[Optional[str], int]:
+        """Live chunks per source, among the given ids or over the whole index"""
+        with self._lock:
+            if chunk_ids is None:
+                slots = list(self._slots.values())
+            else:
+                slots = [self._slots[chunk_id] for chunk_id in chunk_ids if chunk_id in self._slots]
+            counts: Dict[Optional[str], int] = {}
+            for slot in slots:
+                counts[self.sources[slot]] = counts.get(self.sources[slot], 0) + 1
+            return counts
+
+    def clear(self):
+        """Drop every document"""
+        with self._lock:
+            self._reset()
+            self._dirty = True
+
+    def search(self, query: str, k: int = 5,
+               filter: Optional[MetadataFilter] = None) -> List[Tuple[str, float]]:
+        """Top-k (chunk id, BM25 score) pairs, best first, among chunks matching the filter"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            live = len(self._slots)
+            if not terms or not live:
+                return []
+            size = len(self.ids)
+            alive = self._alive[:size]
+            norm = self.k1 * (1.0 - self.b + self.b * self.lengths / max(self._total_length / live, 1.0))
+            allowed = None
+            if filter:
+                allowed = np.zeros(size, dtype=bool)
+                allowed[self.fields.rows(filter)] = True
+            scores = np.zeros(size, dtype=np.float32)
+            for term in terms:
+                posting = self._posting(term)
+                if posting is None:
+                    continue
+                slots, tfs = posting
+                keep = alive[slots]
+                df = int(np.count_nonzero(keep))
+                if not df:
+                    continue
+                if allowed is not None:
+                    # idf still counts every live chunk with the term, so scores match unfiltered ones
+                    keep &= allowed[slots]
+                slots, tfs = slots[keep], tfs[keep].astype(np.float32)
+                idf = math.log(1.0 + (live - df + 0.5) / (df + 0.5))
+                scores[slots] += idf * tfs * (self.k1 + 1.0) / (tfs + norm[slots])
+
+            matched = np.flatnonzero(scores > 0)
+            top = matched[np.argsort(-scores[matched], kind="stable")[:k]]
+            return [(self.ids[slot], float(scores[slot])) for slot in top.tolist()]
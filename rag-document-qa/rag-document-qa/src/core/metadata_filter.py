@@ -0,0 +1,315 @@
+"""
+Metadata filters on source, page range and ingest time, and the per-row columns that evaluate them
+"""
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+# Column value of chunks without a page or ingest time; they never match a filter on that field
+MISSING = -1
+
+
+def _field(metadata: Dict[str, Any], name: str) -> int:
+    value = metadata.get(name)
+    return MISSING if value is None else int(value)
+
+
+class MetadataFilter:
+    """Restricts a search to chunks of some sources, pages and ingest times
+
+    A chunk matches when its source is one of ``sources``, its page range
+    overlaps ``page_from``..``page_to`` and its ``ingested_at`` (Unix
+    seconds) lies in ``ingested_after``..``ingested_before``. Unset bounds
+    don't constrain; all bounds are inclusive.
+    """
+
+    __slots__ = ("sources", "page_from", "page_to", "ingested_after", "ingested_before")
+
+    def __init__(self,
+                 sources: Optional[Sequence[str]] = None,
+                 page_from: Optional[int] = None,
+                 page_to: Optional[int] = None,
+                 ingested_after: Optional[float] = None,
+                 ingested_before: Optional[float] = None):
+        """
+        Initialize filter
+
+        Args:
+            sources: Source file names to search in
+            page_from: First page of interest (1-based)
+            page_to: Last page of interest
+            ingested_after: Only chunks indexed at or after this Unix time
+            ingested_before: Only chunks indexed at or before this Unix time
+        """
+        if page_from is not None and page_from < 1:
+            raise ValueError("page_from must be at least 1")
+        if page_from is not None and page_to is not None and page_from > page_to:
+            raise ValueError("page_from must not be after page_to")
+        if ingested_after is not None and ingested_before is not None and ingested_after > ingested_before:
+            raise ValueError("ingested_after must not be after ingested_before")
+        self.sources = tuple(sorted(set(sources))) if sources else None
+        self.page_from = page_from
+        self.page_to = page_to
+        self.ingested_after = ingested_after
+        self.ingested_before = ingested_before
+
+    def __bool__(self) -> bool:
+        return any(getattr(self, name) is not None for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__ if getattr(self, name) is not None)
+        return f"MetadataFilter({fields})"
+
+    def key(self) -> tuple:
+        """Hashable form for cache keys"""
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def matches(self, metadata: Dict[str, Any]) -> bool:
+        """Whether one chunk's metadata passes the filter"""
+        if self.sources is not None and metadata.get("source") not in self.sources:
+            return False
+        page_start, page_end = metadata.get("page_start"), metadata.get("page_end")
+        if self.page_from is not None and (page_end is None or page_end < self.page_from):
+            return False
+        if self.page_to is not None and (page_start is None or page_start > self.page_to):
+            return False
+        ingested_at = metadata.get("ingested_at")
+        if self.ingested_after is not None and (ingested_at is None or ingested_at < self.ingested_after):
+            return False
+        if self.ingested_before is not None and (ingested_at is None or ingested_at > self.ingested_before):
+            return False
+        return True
+
+    def to_chroma_where(self) -> Optional[Dict[str, Any]]:
+        """Equivalent Chroma ``where`` clause, evaluated by Chroma before its nearest-neighbour search"""
+        clauses: List[Dict[str, Any]] = []
+        if self.sources is not None:
+            clauses.append({"source": {"$in": list(self.sources)}})
+        if self.page_from is not None:
+            clauses.append({"page_end": {"$gte": self.page_from}})
+        if self.page_to is not None:
+            clauses.append({"page_start": {"$lte": self.page_to}})
+        if self.ingested_after is not None:
+            clauses.append({"ingested_at": {"$gte": self.ingested_after}})
+        if self.ingested_before is not None:
+            clauses.append({"ingested_at": {"$lte": self.ingested_before}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class FieldIndex:
+    """Filterable metadata of every row, as columns plus per-source posting lists
+
+    Sources are stored as integer codes and each source keeps the list of
+    its rows (like the lists of an IVF index), so a source filter touches
+    only that source's rows and the range predicates are evaluated on those
+    rows alone. Without a source filter the predicates run vectorized over
+    the columns. Rows are addressed the same way as in the owner (slots or
+    matrix rows); deleted rows are the owner's business.
+
+    Columns live in buffers that double in capacity and postings are
+    extended batch by batch, so appending costs the size of the batch, not
+    of the index. Owners read and write the index under their own lock.
+    """
+
+    COLUMNS = (("source_codes", np.int32), ("page_start", np.int32), ("page_end", np.int32), ("ingested_at", np.int64))
+
+    def __init__(self):
+        self.source_names: List[str] = []
+        self._codes: Dict[str, int] = {}
+        self._size = 0
+        self._buffers: Dict[str, np.ndarray] = {name: np.zeros(0, dtype=dtype) for name, dtype in self.COLUMNS}
+        # Source code -> sorted row arrays, concatenated on lookup; None until built from the columns
+        self._postings: Optional[Dict[int, List[np.ndarray]]] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def source_codes(self) -> np.ndarray:
+        return self._buffers["source_codes"][:self._size]
+
+    @property
+    def page_start(self) -> np.ndarray:
+        return self._buffers["page_start"][:self._size]
+
+    @property
+    def page_end(self) -> np.ndarray:
+        return self._buffers["page_end"][:self._size]
+
+    @property
+    def ingested_at(self) -> np.ndarray:
+        return self._buffers["ingested_at"][:self._size]
+
+    def _code(self, source: Optional[str]) -> int:
+        if source is None:
+            return MISSING
+        code = self._codes.get(source)
+        if code is None:
+            code = self._codes[source] = len(self.source_names)
+            self.source_names.append(source)
+        return code
+
+    def _columns(self, metadatas: Iterable[Optional[Dict]]) -> tuple:
+        codes, starts, ends, times = [], [], [], []
+        for metadata in metadatas:
+            metadata = metadata or {}
+            codes.append(self._code(metadata.get("source")))
+            starts.append(_field(metadata, "page_start"))
+            ends.append(_field(metadata, "page_end"))
+            times.append(_field(metadata, "ingested_at"))
+        return (np.asarray(codes, dtype=np.int32), np.asarray(starts, dtype=np.int32),
+                np.asarray(ends, dtype=np.int32), np.asarray(times, dtype=np.int64))
+
+    def _reserve(self, rows: int):
+        """Make room for `rows` rows, doubling the buffers when they are full"""
+        capacity = len(self._buffers["source_codes"])
+        if rows <= capacity:
+            return
+        capacity = max(rows, 2 * capacity, 1024)
+        for name, dtype in self.COLUMNS:
+            grown = np.empty(capacity, dtype=dtype)
+            grown[:self._size] = self._buffers[name][:self._size]
+            self._buffers[name] = grown
+
+    def append(self, metadatas: Iterable[Optional[Dict]]):
+        """Add rows at the end"""
+        columns = self._columns(metadatas)
+        start, count = self._size, len(columns[0])
+        if not count:
+            return
+        self._reserve(start + count)
+        for (name, _), values in zip(self.COLUMNS, columns):
+            self._buffers[name][start:start + count] = values
+        self._size += count
+        if self._postings is not None:
+            # New rows come after every existing one, so each posting stays sorted
+            codes = columns[0]
+            for code in np.unique(codes).tolist():
+                self._postings.setdefault(code, []).append(start + np.flatnonzero(codes == code))
+
+    def update(self, rows: List[int], metadatas: List[Dict]):
+        """Replace the fields of existing rows"""
+        if not rows:
+            return
+        columns = self._columns(metadatas)
+        if not np.array_equal(self.source_codes[rows], columns[0]):
+            # A row changed source: regroup the postings on the next filtered lookup
+            self._postings = None
+        for (name, _), values in zip(self.COLUMNS, columns):
+            self._buffers[name][rows] = values
+
+    def keep(self, rows: np.ndarray):
+        """Follow a compaction that kept only the given rows, in order"""
+        for name, _ in self.COLUMNS:
+            self._buffers[name] = self._buffers[name][:self._size][rows]
+        self._size = len(rows)
+        self._postings = None
+
+    def truncate(self, rows: int):
+        """Forget rows past `rows`"""
+        if rows < len(self):
+            self.keep(np.arange(rows))
+
+    def _posting(self, code: int) -> np.ndarray:
+        """Sorted rows of one source code, grouping every source's rows from the columns if needed"""
+        if self._postings is None:
+            codes = self.source_codes
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(-1, len(self.source_names) + 1))
+            self._postings = {
+                code: [order[bounds[code + 1]:bounds[code + 2]]]
+                for code in range(-1, len(self.source_names)) if bounds[code + 2] > bounds[code + 1]
+            }
+        parts = self._postings.get(code)
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        if len(parts) > 1:
+            parts[:] = [np.concatenate(parts)]
+        return parts[0]
+
+    def _source_rows(self, sources: Sequence[str], limit: int) -> np.ndarray:
+        """Sorted rows below `limit` of the given sources, from their posting lists"""
+        postings = [self._posting(self._codes[source]) for source in sources if source in self._codes]
+        if not postings:
+            return np.zeros(0, dtype=np.int64)
+        rows = postings[0] if len(postings) == 1 else np.sort(np.concatenate(postings))
+        return rows[:np.searchsorted(rows, limit)]
+
+    def _range_mask(self, metadata_filter: MetadataFilter, rows) -> Optional[np.ndarray]:
+        """Page and ingest-time predicates over `rows` (index array or slice); None if there are none"""
+        conditions = []
+        if metadata_filter.page_from is not None:
+            conditions.append(self.page_end[rows] >= metadata_filter.page_from)
+        if metadata_filter.page_to is not None:
+            page_start = self.page_start[rows]
+            conditions.append((page_start != MISSING) & (page_start <= metadata_filter.page_to))
+        if metadata_filter.ingested_after is not None or metadata_filter.ingested_before is not None:
+            ingested_at = self.ingested_at[rows]
+            conditions.append(ingested_at != MISSING)
+            if metadata_filter.ingested_after is not None:
+                conditions.append(ingested_at >= metadata_filter.ingested_after)
+            if metadata_filter.ingested_before is not None:
+                conditions.append(ingested_at <= metadata_filter.ingested_before)
+        if not conditions:
+            return None
+        keep = conditions[0]
+        for condition in conditions[1:]:
+            keep &= condition
+        return keep
+
+    def mask(self, metadata_filter: MetadataFilter, limit: Optional[int] = None) -> np.ndarray:
+        """
+        Boolean mask of the rows matching the filter
+
+        Args:
+            metadata_filter: Conditions to apply
+            limit: Mask length; rows from here on are ignored (the owner's snapshot size)
+        """
+        limit = len(self) if limit is None else min(limit, len(self))
+        if metadata_filter.sources is None:
+            keep = self._range_mask(metadata_filter, slice(0, limit))
+            return np.ones(limit, dtype=bool) if keep is None else keep
+        mask = np.zeros(limit, dtype=bool)
+        mask[self.rows(metadata_filter, limit)] = True
+        return mask
+
+    def rows(self, metadata_filter: MetadataFilter, limit: Optional[int] = None) -> np.ndarray:
+        """Sorted rows matching the filter (see mask)"""
+        limit = len(self) if limit is None else min(limit, len(self))
+        if metadata_filter.sources is None:
+            return np.flatnonzero(self.mask(metadata_filter, limit))
+        # Only the listed sources' rows are read, so a source filter costs its own size
+        rows = self._source_rows(metadata_filter.sources, limit)
+        keep = self._range_mask(metadata_filter, rows)
+        return rows if keep is None else rows[keep]
+
+    def save(self, path: str):
+        """Persist the columns"""
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, source_names=np.asarray(self.source_names, dtype=str),
+                 **{name: getattr(self, name) for name, _ in self.COLUMNS})
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["FieldIndex"]:
+        """Load persisted columns, or None if there are none"""
+        if not os.path.exists(path):
+            return None
+        data = np.load(path)
+        index = cls()
+        index.source_names = data["source_names"].tolist()
+        index._codes = {source: code for code, source in enumerate(index.source_names)}
+        index._buffers = {name: data[name].astype(dtype) for name, dtype in index.COLUMNS}
+        index._size = len(index._buffers["source_codes"])
+        index._postings = None
+        return index
+
+    @classmethod
+    def from_metadatas(cls, metadatas: Iterable[Optional[Dict]]) -> "FieldIndex":
+        index = cls()
+        index.append(metadatas)
+        return index
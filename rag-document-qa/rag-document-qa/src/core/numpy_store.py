@@ -0,0 +1,566 @@
+"""
+In-process vector store over a memory-mapped NumPy matrix, with exact or IVF search
+"""
+import json
+import os
+import threading
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+from langchain.schema.vectorstore import VectorStore as LangchainVectorStore
+
+from src.core.ann_index import IVFIndex
+from src.core.chunk_store import ChunkStore, ChunkView, generation_path, remove_other_generations
+from src.core.metadata_filter import FieldIndex, MetadataFilter
+from src.core.quantization import load_quantizer, make_quantizer, save_quantizer
+
+
+# Files compaction rewrites as a new generation (besides the chunk store's)
+GENERATION_FILES = ("vectors.f32", "codes.u8")
+
+# Constructor arguments that configure indexing and compression
+INDEX_KWARGS = ("index_type", "nlist", "nprobe", "ivf_min_rows",
+                "quantization", "pq_subvectors", "rerank_factor", "quantize_min_rows")
+
+
+class NumpyVectorStore(LangchainVectorStore):
+    """Nearest-neighbour search with vectorized dot products
+
+    Embeddings are appended to a contiguous float32 file that is memory-mapped
+    for search; ids are kept alongside it in ``records.json`` and chunk texts
+    and metadata in a memory-mapped ChunkStore, read only for the rows a
+    search returns. Deleted or replaced rows are masked out and reclaimed
+    when the store is persisted. Scores are squared L2 distances, the same
+    metric the Chroma backend returns, so results are interchangeable.
+
+    With ``index_type="ivf"`` an IVF-flat index (``ivf.npz``) is built once
+    the collection reaches ``ivf_min_rows`` and searches only rank the rows
+    of the ``nprobe`` closest centroids; smaller collections stay exact.
+
+    With ``quantization="sq8"`` or ``"pq"`` searches scan compact in-memory
+    codes (``codes.u8``) instead of the float matrix, then rescore the best
+    ``k * rerank_factor`` candidates exactly from the memory-mapped floats,
+    so only those rows are read from disk.
+
+    Compaction writes the vector, code and chunk files under a new
+    generation name (``vectors.<n>.f32``, ``codes.<n>.u8``,
+    ``chunks.<n>.bin``) and ``records.json`` names the generation in use,
+    so rewriting the records is the one step that switches generations: a
+    crash before it leaves the old files in use, and the new ones are
+    deleted at the next load.
+
+    Source, page and ingest-time columns (``fields.npz``) let filtered
+    searches rank only the matching rows, so a narrow filter makes a search
+    cheaper rather than forcing a larger k to be post-filtered.
+    """
+
+    COMPACT_FRACTION = 0.25
+    INDEX_TYPES = ("flat", "ivf")
+
+    def __init__(self,
+                 persist_directory: str,
+                 embedding_function: Embeddings,
+                 collection_name: str = "rag_documents",
+                 index_type: str = "flat",
+                 nlist: Optional[int] = None,
+                 nprobe: int = 8,
+                 ivf_min_rows: int = 4096,
+                 quantization: Optional[str] = None,
+                 pq_subvectors: Optional[int] = None,
+                 rerank_factor: int = 4,
+                 quantize_min_rows: int = 4096):
+        """
+        Initialize store
+
+        Args:
+            persist_directory: Directory the store lives in
+            embedding_function: Embeddings used for texts and queries
+            collection_name: Name of the subdirectory holding this collection
+            index_type: "flat" for exact search, "ivf" for an IVF-flat index
+            nlist: IVF centroids (defaults to 4 * sqrt(rows))
+            nprobe: IVF centroids scanned per query unless overridden per search
+            ivf_min_rows: Live rows needed before the IVF index is built
+            quantization: None (float32 only), "sq8" (int8 per dimension) or "pq" (product quantization)
+            pq_subvectors: PQ bytes per vector; must divide the dimension (defaults to dim / 4)
+            rerank_factor: Quantized candidates rescored exactly, as a multiple of k
+            quantize_min_rows: Live rows needed before the quantizer is trained
+        """
+        if index_type not in self.INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}', expected one of {self.INDEX_TYPES}")
+        self.embedding_function = embedding_function
+        self.directory = os.path.join(persist_directory, f"{collection_name}.numpy")
+        os.makedirs(self.directory, exist_ok=True)
+        self._set_generation(0)
+        self._records_path = os.path.join(self.directory, "records.json")
+        self._ivf_path = os.path.join(self.directory, "ivf.npz")
+        self._fields_path = os.path.join(self.directory, "fields.npz")
+        self._lock = threading.Lock()
+        self.ivf = IVFIndex(nlist=nlist, nprobe=nprobe) if index_type == "ivf" else None
+        self.ivf_min_rows = ivf_min_rows
+        if quantization:
+            make_quantizer(quantization)  # Validate the kind up front
+        self.quantization = quantization
+        self.pq_subvectors = pq_subvectors
+        self.rerank_factor = rerank_factor
+        self.quantize_min_rows = quantize_min_rows
+        self.quantizer = None
+        self.codes: Optional[np.ndarray] = None
+        self._quantizer_path = os.path.join(self.directory, "quantizer.npz")
+
+        self.dim: Optional[int] = None
+        self.ids: List[str] = []
+        self.chunks: Optional[ChunkStore] = None
+        self.fields = FieldIndex()
+        self.alive = np.zeros(0, dtype=bool)
+        self.norms = np.zeros(0, dtype=np.float32)
+        self.vectors: Optional[np.memmap] = None
+        self._rows: Dict[str, int] = {}
+        self._buffers: Dict[str, np.ndarray] = {}
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _extend(self, name: str, current: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """`current` followed by `rows`, written into a buffer whose capacity doubles when full
+
+        The result is a prefix view of the buffer, so the next append writes
+        in place; earlier views (e.g. search snapshots) end before the rows
+        it writes. An array replaced elsewhere (load, compaction, training)
+        is no longer a view of the buffer and starts a new one.
+        """
+        buffer = self._buffers.get(name)
+        size, needed = len(current), len(current) + len(rows)
+        if buffer is None or current.base is not buffer or len(buffer) < needed:
+            buffer = np.empty((max(needed, 2 * size),) + current.shape[1:], dtype=current.dtype)
+            buffer[:size] = current
+            self._buffers[name] = buffer
+        buffer[size:needed] = rows
+        return buffer[:needed]
+
+    def _load(self):
+        """Load records and map the vector file"""
+        if not os.path.exists(self._records_path):
+            self.chunks = ChunkStore(self.directory)
+            return
+        with open(self._records_path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        self.dim = records["dim"]
+        self.ids = records["ids"]
+        self._set_generation(records.get("generation", 0))
+        self.chunks = ChunkStore(self.directory, self.generation)
+        self._remove_other_generations()
+        if "texts" in records:
+            # Stores written before the chunk store kept texts and metadata in records.json
+            self.chunks.truncate(0)
+            self.chunks.append(records["texts"], records["metadatas"])
+            self.chunks.persist()
+        self.chunks.truncate(len(self.ids))
+        fields = FieldIndex.load(self._fields_path)
+        if fields is None or len(fields) < len(self.ids):
+            # Stores written before metadata filtering: read the columns from the chunk metadata once
+            chunks = self.chunks.view()
+            fields = FieldIndex.from_metadatas(chunks.metadata(row) for row in range(len(self.ids)))
+        fields.truncate(len(self.ids))
+        self.fields = fields
+        self.alive = np.ones(len(self.ids), dtype=bool)
+        self.alive[records["deleted"]] = False
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self.ids) if self.alive[row]}
+        # Drop rows appended after the last persist so later appends stay aligned
+        expected_bytes = len(self.ids) * (self.dim or 0) * 4
+        if os.path.exists(self._vectors_path) and os.path.getsize(self._vectors_path) > expected_bytes:
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(expected_bytes)
+        self._map_vectors()
+        self.norms = np.einsum("ij,ij->i", self.vectors, self.vectors) if len(self.ids) else self.norms
+        if self.ivf and not self.ivf.load(self._ivf_path, len(self.ids)):
+            self._maybe_build_index()
+        if self.quantization:
+            self._load_codes()
+
+    def _load_codes(self):
+        """Load the quantizer and codes, retraining if they don't match the records"""
+        quantizer = load_quantizer(self._quantizer_path, self.quantization, self.pq_subvectors)
+        if quantizer is not None and os.path.exists(self._codes_path):
+            expected_bytes = len(self.ids) * quantizer.code_size
+            if os.path.getsize(self._codes_path) >= expected_bytes:
+                with open(self._codes_path, "r+b") as f:
+                    f.truncate(expected_bytes)
+                self.quantizer = quantizer
+                self.codes = np.fromfile(self._codes_path, dtype=np.uint8).reshape(len(self.ids), quantizer.code_size)
+                return
+        self._maybe_train_quantizer()
+
+    def _set_generation(self, generation: int):
+        """Point the files compaction rewrites at a generation"""
+        self.generation = generation
+        self._vectors_path, self._codes_path = (
+            generation_path(self.directory, name, generation) for name in GENERATION_FILES
+        )
+
+    def _remove_other_generations(self):
+        for name in GENERATION_FILES:
+            remove_other_generations(self.directory, name, self.generation)
+        self.chunks.remove_other_generations()
+
+    def _map_vectors(self):
+        """(Re)map the vector file at its current length"""
+        rows = len(self.ids)
+        self.vectors = (
+            np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+            if rows else None
+        )
+
+    def persist(self):
+        """Write records to disk, compacting first if many rows are dead"""
+        with self._lock:
+            dead = len(self.ids) - len(self._rows)
+            generation = self.generation
+            if dead and dead >= self.COMPACT_FRACTION * len(self.ids):
+                self._compact()
+            self._maybe_build_index()
+            self._maybe_train_quantizer()
+            self.chunks.persist()
+            self.fields.save(self._fields_path)
+            records = {
+                "dim": self.dim,
+                "generation": self.generation,
+                "ids": self.ids,
+                "deleted": np.flatnonzero(~self.alive).tolist()
+            }
+            tmp_path = f"{self._records_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(records, f)
+            # The records now name the new generation, so the old one's files can go
+            os.replace(tmp_path, self._records_path)
+            if self.generation != generation:
+                self._remove_other_generations()
+            if self.ivf:
+                self.ivf.save(self._ivf_path)
+
+    def _maybe_build_index(self):
+        """(Re)train the IVF index once it is large enough, and again whenever it doubles"""
+        if not self.ivf or self.vectors is None:
+            return
+        live = len(self._rows)
+        if live >= self.ivf_min_rows and (not self.ivf.is_built or live >= 2 * self.ivf.built_rows):
+            self.ivf.build(self.vectors, self.alive)
+
+    def _maybe_train_quantizer(self, sample_size: int = 65536, block: int = 65536):
+        """Train the quantizer once the collection is large enough and encode every row"""
+        if not self.quantization or self.quantizer is not None or self.vectors is None:
+            return
+        live_rows = np.flatnonzero(self.alive)
+        if len(live_rows) < self.quantize_min_rows or len(live_rows) == 0:
+            return
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(live_rows, size=min(sample_size, len(live_rows)), replace=False))
+        quantizer = make_quantizer(self.quantization, self.pq_subvectors)
+        quantizer.train(np.asarray(self.vectors[sample_rows], dtype=np.float32))
+
+        codes = np.concatenate([
+            quantizer.encode(self.vectors[start:start + block]) for start in range(0, len(self.ids), block)
+        ])
+        codes.tofile(self._codes_path)
+        save_quantizer(quantizer, self._quantizer_path)
+        self.quantizer, self.codes = quantizer, codes
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Bytes of per-row search state held in RAM (the float matrix counts only when it is scanned)"""
+        usage = {"norms": self.norms.nbytes, "alive": self.alive.nbytes, "chunk_index": self.chunks.index.nbytes}
+        if self.codes is not None:
+            usage["codes"] = self.codes.nbytes
+        elif self.vectors is not None:
+            usage["vectors"] = self.vectors.nbytes
+        if self.ivf and self.ivf.is_built:
+            usage["ivf"] = self.ivf.assignments.nbytes + self.ivf.centroids.nbytes
+        usage["total"] = sum(usage.values())
+        return usage
+
+    def build_index(self, nlist: Optional[int] = None):
+        """Force a retrain of the IVF index, e.g. with a different number of centroids"""
+        if not self.ivf:
+            raise ValueError("Store was opened with index_type='flat'")
+        with self._lock:
+            if nlist:
+                self.ivf.nlist = nlist
+            if self.vectors is not None:
+                self.ivf.build(self.vectors, self.alive)
+
+    def _compact(self):
+        """Write the live rows as the next generation; it takes over once persist() rewrites the records"""
+        keep = np.flatnonzero(self.alive)
+        generation = self.generation + 1
+        vectors_path, codes_path = (generation_path(self.directory, name, generation) for name in GENERATION_FILES)
+        if len(keep):
+            np.ascontiguousarray(self.vectors[keep]).tofile(vectors_path)
+        else:
+            open(vectors_path, "wb").close()
+        if self.codes is not None:
+            self.codes = np.ascontiguousarray(self.codes[keep])
+            self.codes.tofile(codes_path)
+        self.vectors = None
+        self._set_generation(generation)
+
+        self.ids = [self.ids[row] for row in keep]
+        self.chunks.compact(keep, generation)
+        self.fields.keep(keep)
+        self.norms = self.norms[keep]
+        self.alive = np.ones(len(keep), dtype=bool)
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        if self.ivf:
+            self.ivf.keep(keep)
+        self._map_vectors()
+
+    def add_embeddings(self, texts: List[str], embeddings: List[List[float]],
+                       metadatas: Optional[List[Dict]] = None,
+                       ids: Optional[List[str]] = None) -> List[str]:
+        """Append precomputed embeddings; existing ids are replaced"""
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+            for chunk_id in ids:
+                row = self._rows.pop(chunk_id, None)
+                if row is not None:
+                    self.alive[row] = False
+
+            with open(self._vectors_path, "ab") as f:
+                matrix.tofile(f)
+            start = len(self.ids)
+            self.ids.extend(ids)
+            self.chunks.append(texts, metadatas)
+            self.fields.append(metadatas)
+            self.alive = self._extend("alive", self.alive, np.ones(len(ids), dtype=bool))
+            self.norms = self._extend("norms", self.norms, np.einsum("ij,ij->i", matrix, matrix))
+            self._rows.update((chunk_id, start + i) for i, chunk_id in enumerate(ids))
+            self._map_vectors()
+            if self.ivf:
+                self.ivf.add(matrix)
+            if self.quantizer is not None:
+                codes = self.quantizer.encode(matrix)
+                with open(self._codes_path, "ab") as f:
+                    codes.tofile(f)
+                self.codes = self._extend("codes", self.codes, codes)
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[Dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """Embed and add texts"""
+        texts = list(texts)
+        if not texts:
+            return []
+        embeddings = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(texts, embeddings, metadatas=metadatas, ids=ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Delete rows by id"""
+        with self._lock:
+            for chunk_id in ids or []:
+                row = self._rows.pop(chunk_id, None)
+                if row is not None:
+                    self.alive[row] = False
+        return True
+
+    def delete_where(self, **where: Any):
+        """Delete rows whose metadata matches every given field; a source is looked up in its posting list"""
+        with self._lock:
+            others = dict(where)
+            if where.get("source") is not None:
+                rows = self.fields.rows(MetadataFilter(sources=[others.pop("source")]), limit=len(self.ids))
+            else:
+                rows = np.flatnonzero(self.alive)
+            for row in rows.tolist():
+                if not self.alive[row]:
+                    continue
+                if others:
+                    metadata = self.chunks.documents([row], 0)[0].metadata
+                    if not all(metadata.get(field) == value for field, value in others.items()):
+                        continue
+                del self._rows[self.ids[row]]
+                self.alive[row] = False
+
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict]):
+        """Replace the metadata of existing rows"""
+        with self._lock:
+            found = [(self._rows.get(chunk_id), metadata) for chunk_id, metadata in zip(ids, metadatas)]
+            found = [(row, metadata) for row, metadata in found if row is not None]
+            self.chunks.update_metadata([row for row, _ in found], [metadata for _, metadata in found])
+            self.fields.update([row for row, _ in found], [metadata for _, metadata in found])
+
+    def get_by_ids(self, ids: List[str], content_chars: Optional[int] = None) -> List[Document]:
+        """Documents for the given ids, in order; unknown ids are skipped"""
+        with self._lock:
+            rows = [self._rows[chunk_id] for chunk_id in ids if chunk_id in self._rows]
+            # Read in place rather than through a view, so later metadata updates needn't copy the row index
+            return self.chunks.documents(rows, content_chars)
+
+    def iter_records(self, batch_size: int = 1000):
+        """Yield (ids, texts, metadatas) batches of live rows"""
+        with self._lock:
+            live = list(self._rows.items())
+            chunks = self.chunks.view()
+        for start in range(0, len(live), batch_size):
+            batch = live[start:start + batch_size]
+            yield ([chunk_id for chunk_id, _ in batch],
+                   [chunks.text(row) for _, row in batch],
+                   [chunks.metadata(row) for _, row in batch])
+
+    def _top_k(self, distances: np.ndarray, k: int) -> np.ndarray:
+        """Row indices of the k smallest distances, sorted"""
+        k = min(k, len(distances))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        candidates = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+        return candidates[np.argsort(distances[candidates], kind="stable")]
+
+    def search_by_vectors(self, embeddings: List[List[float]], k: int = 4, batch_size: int = 64,
+                          nprobe: Optional[int] = None, exact: bool = False,
+                          content_chars: Optional[int] = None,
+                          filter: Optional[MetadataFilter] = None) -> List[List[Tuple[Document, float]]]:
+        """
+        Top-k for several query vectors
+
+        Args:
+            embeddings: Query vectors
+            k: Results per query
+            batch_size: Queries per matrix product in exact search
+            nprobe: IVF centroids scanned per query (higher is slower with better recall)
+            exact: Rank every row even when an IVF index is built
+            content_chars: Only read this many characters of each result's text (for snippets)
+            filter: Only rank rows whose metadata matches
+
+        Returns:
+            One list of (document, squared L2 distance) tuples per query
+        """
+        # Snapshot under the lock so a concurrent write or compaction can't mix generations
+        with self._lock:
+            vectors, norms, alive = self.vectors, self.norms, self.alive.copy()
+            chunks = self.chunks.view()
+            ivf_view = self.ivf.view() if self.ivf and self.ivf.is_built and not exact else None
+            quantizer, codes = (None, None) if exact else (self.quantizer, self.codes)
+            matching = self.fields.mask(filter, limit=len(norms)) if filter else None
+        if matching is not None:
+            # Rows failing the filter are treated like deleted ones from here on
+            alive &= matching
+        if vectors is None or not alive.any():
+            return [[] for _ in embeddings]
+        allowed = np.flatnonzero(alive) if matching is not None else None
+
+        queries = np.asarray(embeddings, dtype=np.float32)
+        if ivf_view is not None or quantizer is not None:
+            return [
+                self._search_candidates(query, k, rows, vectors, norms, alive,
+                                        chunks, content_chars, quantizer, codes)
+                for query, rows in zip(queries, self._candidate_rows(queries, ivf_view, nprobe, allowed, alive, k))
+            ]
+
+        # A narrow filter ranks only its rows; a broad one just masks the full scan rather than copying most of the matrix
+        scan = allowed if allowed is not None and 2 * len(allowed) <= len(norms) else None
+        matrix, scan_norms, scan_alive = (vectors, norms, alive) if scan is None else (vectors[scan], norms[scan], alive[scan])
+
+        # Bound the (queries x rows) distance block to ~64 MB
+        batch_size = max(1, min(batch_size, (1 << 24) // len(scan_norms)))
+        results = []
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+            # Squared L2: |x|^2 - 2 x.q + |q|^2
+            distances = scan_norms[None, :] - 2.0 * (batch @ matrix.T)
+            distances += np.einsum("ij,ij->i", batch, batch)[:, None]
+            distances[:, ~scan_alive] = np.inf
+            for row_distances in distances:
+                positions = self._top_k(row_distances, k)
+                rows = positions if scan is None else scan[positions]
+                results.append([
+                    (chunks.document(row, content_chars), float(row_distances[position]))
+                    for row, position in zip(rows, positions) if np.isfinite(row_distances[position])
+                ])
+        return results
+
+    def _candidate_rows(self, queries: np.ndarray, ivf_view: Optional[tuple], nprobe: Optional[int],
+                        allowed: Optional[np.ndarray], alive: np.ndarray, k: int) -> list:
+        """Rows to rank for each query: its IVF lists, the filter's rows, or None for every row"""
+        if ivf_view is None:
+            return [allowed] * len(queries)
+        if allowed is not None:
+            nlist = len(ivf_view[0])
+            probed = max(1, min(nprobe or self.ivf.nprobe, nlist))
+            # A filter matching fewer rows than the probed lists hold is cheaper (and exact) to rank in full
+            if len(allowed) * nlist <= len(ivf_view[1]) * probed:
+                return [allowed] * len(queries)
+        candidates = self.ivf.candidates(ivf_view, queries, nprobe)
+        if allowed is None:
+            return candidates
+        narrowed = []
+        for rows in candidates:
+            rows = rows[rows < len(alive)]
+            rows = rows[alive[rows]]
+            # Too few probed rows pass the filter: rank every matching row instead
+            narrowed.append(rows if len(rows) >= k else allowed)
+        return narrowed
+
+    def _search_candidates(self, query: np.ndarray, k: int, rows: Optional[np.ndarray],
+                           vectors: np.ndarray, norms: np.ndarray, alive: np.ndarray,
+                           chunks: ChunkView, content_chars: Optional[int],
+                           quantizer, codes: Optional[np.ndarray]) -> List[Tuple[Document, float]]:
+        """Rank IVF candidates (rows) or every row, via quantized codes when available, then exactly"""
+        if rows is not None:
+            # Rows past the snapshot are ignored
+            rows = rows[rows < len(norms)]
+            rows = rows[alive[rows]]
+        if quantizer is not None:
+            if rows is None:
+                approx = quantizer.distances(query, codes, norms)
+                approx[~alive] = np.inf
+                shortlist = self._top_k(approx, k * self.rerank_factor)
+                rows = shortlist[np.isfinite(approx[shortlist])]
+            else:
+                approx = quantizer.distances(query, codes[rows], norms[rows])
+                rows = rows[self._top_k(approx, k * self.rerank_factor)]
+        # Sorted rows read the memory map front to back
+        rows = np.sort(rows)
+        distances = norms[rows] - 2.0 * (vectors[rows] @ query) + float(query @ query)
+        return [
+            (chunks.document(rows[i], content_chars), float(distances[i]))
+            for i in self._top_k(distances, k)
+        ]
+
+    def similarity_search_by_vector_with_relevance_scores(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """Top-k documents with squared L2 distances for a query vector (accepts nprobe/exact/content_chars/filter)"""
+        return self.search_by_vectors([embedding], k=k, **kwargs)[0]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_relevance_scores(embedding, k=k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_relevance_scores(
+            self.embedding_function.embed_query(query), k=k, **kwargs
+        )
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings,
+                   metadatas: Optional[List[Dict]] = None, persist_directory: str = "./data/chromadb",
+                   collection_name: str = "rag_documents", **kwargs: Any) -> "NumpyVectorStore":
+        index_kwargs = {key: kwargs[key] for key in INDEX_KWARGS if key in kwargs}
+        store = cls(persist_directory, embedding, collection_name=collection_name, **index_kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=kwargs.get("ids"))
+        store.persist()
+        return store
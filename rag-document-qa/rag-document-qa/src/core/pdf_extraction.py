@@ -0,0 +1,453 @@
+"""
+Pluggable PDF text extraction with per-page and per-file time limits
+"""
+import importlib.util
+import multiprocessing
+import time
+from multiprocessing.connection import Connection
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+class ExtractionTimeout(Exception):
+    """A page or file took longer than its time limit"""
+
+
+class PdfEngine:
+    """Opens a PDF and extracts the text of one page at a time"""
+
+    name = ""
+    module = ""
+
+    @classmethod
+    def available(cls) -> bool:
+        return importlib.util.find_spec(cls.module) is not None
+
+    def open(self, path: str) -> Any:
+        raise NotImplementedError
+
+    def page_count(self, document: Any) -> int:
+        raise NotImplementedError
+
+    def page_text(self, document: Any, index: int) -> str:
+        raise NotImplementedError
+
+    def close(self, document: Any):
+        pass
+
+
+class PypdfEngine(PdfEngine):
+    """Pure-Python pypdf (always installed, slowest of the native engines)"""
+
+    name = "pypdf"
+    module = "pypdf"
+
+    def open(self, path: str) -> Any:
+        from pypdf import PdfReader
+        return PdfReader(path)
+
+    def page_count(self, document: Any) -> int:
+        return len(document.pages)
+
+    def page_text(self, document: Any, index: int) -> str:
+        return document.pages[index].extract_text() or ""
+
+
+class PdfiumEngine(PdfEngine):
+    """Chrome's PDFium through pypdfium2"""
+
+    name = "pdfium"
+    module = "pypdfium2"
+
+    def open(self, path: str) -> Any:
+        import pypdfium2
+        return pypdfium2.PdfDocument(path)
+
+    def page_count(self, document: Any) -> int:
+        return len(document)
+
+    def page_text(self, document: Any, index: int) -> str:
+        page = document[index]
+        try:
+            textpage = page.get_textpage()
+            try:
+                return textpage.get_text_range()
+            finally:
+                textpage.close()
+        finally:
+            page.close()
+
+    def close(self, document: Any):
+        document.close()
+
+
+class PyMuPDFEngine(PdfEngine):
+    """MuPDF through PyMuPDF"""
+
+    name = "pymupdf"
+    module = "fitz"
+
+    def open(self, path: str) -> Any:
+        import fitz
+        return fitz.open(path)
+
+    def page_count(self, document: Any) -> int:
+        return document.page_count
+
+    def page_text(self, document: Any, index: int) -> str:
+        return document.load_page(index).get_text()
+
+    def close(self, document: Any):
+        document.close()
+
+
+class PdfminerEngine(PdfEngine):
+    """pdfminer.six layout analysis (slow, but tolerant of odd encodings)
+
+    The file is parsed once when opened; pages are laid out on demand and
+    their texts cached, where pdfminer's extract_text would re-parse the
+    whole file for every page.
+    """
+
+    name = "pdfminer"
+    module = "pdfminer"
+
+    def open(self, path: str) -> Any:
+        from pdfminer.pdfinterp import PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+        f = open(path, "rb")
+        try:
+            # Page objects resolve their content lazily, so the file stays open until close()
+            pages = list(PDFPage.get_pages(f))
+        except Exception:
+            f.close()
+            raise
+        return {"file": f, "pages": pages, "resources": PDFResourceManager(caching=True), "texts": {}}
+
+    def page_count(self, document: Any) -> int:
+        return len(document["pages"])
+
+    def page_text(self, document: Any, index: int) -> str:
+        texts = document["texts"]
+        if index not in texts:
+            from io import StringIO
+            from pdfminer.converter import TextConverter
+            from pdfminer.layout import LAParams
+            from pdfminer.pdfinterp import PDFPageInterpreter
+            output = StringIO()
+            device = TextConverter(document["resources"], output, laparams=LAParams())
+            try:
+                PDFPageInterpreter(document["resources"], device).process_page(document["pages"][index])
+            finally:
+                device.close()
+            texts[index] = output.getvalue()
+        return texts[index]
+
+    def close(self, document: Any):
+        document["file"].close()
+
+
+ENGINES = {engine.name: engine for engine in (PdfiumEngine, PyMuPDFEngine, PypdfEngine, PdfminerEngine)}
+
+
+def _serve(conn: Connection, engine_names: Sequence[str]):
+    """Extraction worker loop: keeps the open documents and answers one engine call at a time"""
+    engines = {name: ENGINES[name]() for name in engine_names}
+    documents: Dict[int, Any] = {}
+    next_handle = 0
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        method, name, target, *args = request
+        try:
+            engine = engines[name]
+            if method == "open":
+                next_handle += 1
+                documents[next_handle] = engine.open(target)
+                result = next_handle
+            elif method == "close":
+                result = engine.close(documents.pop(target))
+            else:
+                result = getattr(engine, method)(documents[target], *args)
+            conn.send(("ok", result))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {str(e)}"))
+
+
+class ExtractionWorker:
+    """Child process that runs engine calls, so a call that overruns its time limit can be killed
+
+    A thread can't be stopped, and a pure-Python engine stuck on a page
+    would hold the GIL and a CPU for the rest of the run. Killing the
+    process ends the call for real; the next call starts a fresh worker.
+    Every document open in the killed worker is lost with it.
+    """
+
+    def __init__(self, engine_names: Sequence[str]):
+        self.engine_names = list(engine_names)
+        self.restarts = 0
+        self._process: Optional[multiprocessing.Process] = None
+        self._conn: Optional[Connection] = None
+
+    def _start(self):
+        context = multiprocessing.get_context()
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_serve, args=(child_conn, self.engine_names),
+                                        name="pdf-extract", daemon=True)
+        self._process.start()
+        child_conn.close()
+
+    def call(self, timeout: Optional[float], method: str, engine: str, target: Any, *args: Any) -> Any:
+        """
+        Run engine.method(document, *args) in the worker ("open" takes a path and returns a handle)
+
+        Raises:
+            ExtractionTimeout: If no result came within `timeout` seconds; the worker is killed
+            RuntimeError: If the engine raised, or the worker died (e.g. a crash in native code)
+        """
+        if self._process is None:
+            self._start()
+        self._conn.send((method, engine, target, *args))
+        if timeout and not self._conn.poll(timeout):
+            self.kill()
+            raise ExtractionTimeout(f"no result after {timeout:.1f}s")
+        try:
+            status, value = self._conn.recv()
+        except EOFError:
+            self.kill()
+            raise RuntimeError("extraction worker exited")
+        if status == "error":
+            raise RuntimeError(value)
+        return value
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None
+
+    def kill(self):
+        """Stop the worker immediately"""
+        if self._process is None:
+            return
+        self._process.kill()
+        self._process.join()
+        self._conn.close()
+        self._process, self._conn = None, None
+        self.restarts += 1
+
+    def close(self):
+        """Ask the worker to exit, killing it if it doesn't"""
+        if self._process is None:
+            return
+        try:
+            self._conn.send(None)
+        except OSError:
+            pass
+        self._conn.close()
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+        self._process, self._conn = None, None
+
+# Fastest first; pypdf is a hard dependency, so "auto" always has an engine
+AUTO_ORDER = ("pdfium", "pymupdf", "pypdf", "pdfminer")
+
+
+def resolve_engines(names: Optional[Sequence[str]] = None) -> List[PdfEngine]:
+    """
+    Engine instances to try in order
+
+    Args:
+        names: Engine names, or None / ["auto"] for every installed engine, fastest first
+    """
+    if not names or list(names) == ["auto"]:
+        return [ENGINES[name]() for name in AUTO_ORDER if ENGINES[name].available()]
+    unknown = [name for name in names if name not in ENGINES]
+    if unknown:
+        raise ValueError(f"Unknown PDF engine(s) {unknown}; expected {sorted(ENGINES)}")
+    engines = [ENGINES[name]() for name in names if ENGINES[name].available()]
+    if not engines:
+        raise ValueError(f"None of the PDF engines {list(names)} is installed")
+    return engines
+
+
+class PdfExtractor:
+    """Extracts page texts with the first engine that works, page by page
+
+    Each page is read by the primary engine within `page_timeout`; a page
+    that fails or times out is retried with the next engines and skipped if
+    none of them can read it. With time limits set, engine calls run in an
+    ExtractionWorker process that is killed when a call overruns, so the
+    stuck page stops using CPU instead of running on in the background; an
+    engine that timed out is not used again for that file. Once a file has
+    used up `file_timeout` its remaining pages are skipped, so one
+    pathological document can't stall a batch. Per-engine counters give
+    the pages/sec each engine achieved.
+    """
+
+    STAT_FIELDS = ("files", "pages", "seconds", "failed_pages", "timeouts")
+
+    def __init__(self, engines: Optional[Sequence[str]] = None,
+                 page_timeout: Optional[float] = 30.0, file_timeout: Optional[float] = 300.0):
+        """
+        Initialize extractor
+
+        Args:
+            engines: Engine names in order of preference (None for every installed engine)
+            page_timeout: Seconds allowed per page (None or 0 for no limit)
+            file_timeout: Seconds allowed per file (None or 0 for no limit)
+        """
+        self.engines = resolve_engines(engines)
+        self.engine_names = [engine.name for engine in self.engines]
+        self.page_timeout = page_timeout
+        self.file_timeout = file_timeout
+        # Only a separate process can be stopped when a call overruns; without limits engines run in-process
+        self.worker = ExtractionWorker(self.engine_names) if page_timeout or file_timeout else None
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self.skipped_pages = 0
+
+    def _record(self, engine: str, **counts: float):
+        entry = self.stats.setdefault(engine, dict.fromkeys(self.STAT_FIELDS, 0))
+        for field, value in counts.items():
+            entry[field] += value
+
+    def merge_stats(self, stats: Dict[str, Any]):
+        """Add counters collected by another extractor (e.g. in a worker process)"""
+        for engine, counts in stats.get("engines", {}).items():
+            self._record(engine, **{field: counts[field] for field in self.STAT_FIELDS})
+        self.skipped_pages += stats.get("skipped_pages", 0)
+
+    def stats_snapshot(self) -> Dict[str, Any]:
+        """Counters per engine plus pages/sec"""
+        engines = {}
+        for engine, counts in self.stats.items():
+            engines[engine] = dict(counts)
+            engines[engine]["pages_per_sec"] = counts["pages"] / counts["seconds"] if counts["seconds"] else 0.0
+        return {"engines": engines, "skipped_pages": self.skipped_pages}
+
+    def take_stats(self) -> Dict[str, Any]:
+        """Counters collected since the last call, then reset (for reporting one file at a time)"""
+        snapshot = self.stats_snapshot()
+        self.stats, self.skipped_pages = {}, 0
+        return snapshot
+
+    def report(self):
+        """Print per-engine throughput"""
+        for engine, counts in self.stats_snapshot()["engines"].items():
+            if not (counts["pages"] or counts["failed_pages"] or counts["timeouts"]):
+                continue  # Only tried as a fallback on a file nothing could open
+            print(f"  {engine:<10} {counts['pages']:>7.0f} pages in {counts['seconds']:8.2f}s "
+                  f"({counts['pages_per_sec']:.1f} pages/sec), {counts['failed_pages']:.0f} failed, "
+                  f"{counts['timeouts']:.0f} timed out")
+        if self.skipped_pages:
+            print(f"  {self.skipped_pages} page(s) could not be extracted by any engine")
+
+    def _remaining(self, deadline: Optional[float]) -> Optional[float]:
+        if deadline is None:
+            return self.page_timeout or None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise ExtractionTimeout("file time limit reached")
+        return min(self.page_timeout, remaining) if self.page_timeout else remaining
+
+    def _call(self, timeout: Optional[float], method: str, engine: PdfEngine, target: Any, *args: Any) -> Any:
+        """Engine call, run in the worker process when time limits are set"""
+        if self.worker is None:
+            return getattr(engine, method)(target, *args)
+        return self.worker.call(timeout, method, engine.name, target, *args)
+
+    def close(self):
+        """Stop the extraction worker process"""
+        if self.worker is not None:
+            self.worker.close()
+
+    def iter_pages(self, pdf_path: str) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (page_number, text) for each non-empty page of a PDF
+
+        Raises:
+            RuntimeError: If no engine can open the file
+        """
+        deadline = time.monotonic() + self.file_timeout if self.file_timeout else None
+        documents: Dict[str, Any] = {}
+        opened = set()  # Engines counted as having opened this file
+        abandoned = set()  # Engines that timed out on this file
+        unusable = set()  # Engines that couldn't open the file
+        page_count = None
+        errors = []
+
+        def document(engine: PdfEngine) -> Any:
+            if engine.name not in documents:
+                start = time.perf_counter()
+                try:
+                    documents[engine.name] = self._call(self._remaining(deadline), "open", engine, pdf_path)
+                except ExtractionTimeout:
+                    raise
+                except Exception:
+                    unusable.add(engine.name)
+                    raise
+                finally:
+                    self._record(engine.name, seconds=time.perf_counter() - start)
+                if engine.name not in opened:
+                    opened.add(engine.name)
+                    self._record(engine.name, files=1)
+            return documents[engine.name]
+
+        def timed_out(engine: PdfEngine):
+            abandoned.add(engine.name)
+            if self.worker is not None and not self.worker.running:
+                # The worker was killed, and every document it had open went with it
+                documents.clear()
+
+        try:
+            # The page count comes from the first engine that can open the file
+            for engine in self.engines:
+                try:
+                    page_count = self._call(self._remaining(deadline), "page_count", engine, document(engine))
+                    break
+                except ExtractionTimeout as e:
+                    timed_out(engine)
+                    self._record(engine.name, timeouts=1)
+                    errors.append(f"{engine.name}: {str(e)}")
+                except Exception as e:
+                    errors.append(f"{engine.name}: {str(e)}")
+            if page_count is None:
+                raise RuntimeError(f"No PDF engine could open {pdf_path} ({'; '.join(errors)})")
+
+            for index in range(page_count):
+                text = None
+                for engine in self.engines:
+                    if engine.name in abandoned or engine.name in unusable:
+                        continue
+                    start = time.perf_counter()
+                    try:
+                        text = self._call(self._remaining(deadline), "page_text", engine, document(engine), index)
+                        self._record(engine.name, pages=1, seconds=time.perf_counter() - start)
+                        break
+                    except ExtractionTimeout as e:
+                        timed_out(engine)
+                        self._record(engine.name, timeouts=1, failed_pages=1,
+                                     seconds=time.perf_counter() - start)
+                        if deadline is not None and time.monotonic() >= deadline:
+                            skipped = page_count - index
+                            self.skipped_pages += skipped
+                            print(f"Time limit reached for {pdf_path}; skipped {skipped} remaining page(s)")
+                            return
+                        print(f"Page {index + 1} of {pdf_path} timed out with {engine.name}: {str(e)}")
+                    except Exception as e:
+                        self._record(engine.name, failed_pages=1, seconds=time.perf_counter() - start)
+                        print(f"Page {index + 1} of {pdf_path} failed with {engine.name}: {str(e)}")
+                if text is None:
+                    self.skipped_pages += 1
+                elif text.strip():
+                    yield index + 1, text
+        finally:
+            for engine in self.engines:
+                if engine.name in documents:
+                    try:
+                        self._call(self.page_timeout or None, "close", engine, documents[engine.name])
+                    except Exception:
+                        pass
@@ -0,0 +1,164 @@
+"""
+Compressed in-memory codes for stored embeddings (int8 scalar and product quantization)
+"""
+import os
+from typing import Optional
+
+import numpy as np
+
+from src.core.ann_index import kmeans
+
+
+class ScalarQuantizer:
+    """int8 scalar quantization: one byte per dimension, 4x smaller than float32
+
+    Each dimension is mapped linearly from its trained [min, max] range onto
+    0..255. Distances are computed asymmetrically - the query stays float -
+    so the only error comes from rounding the stored vectors.
+    """
+
+    kind = "sq8"
+
+    def __init__(self):
+        self.vmin: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    @property
+    def code_size(self) -> int:
+        return len(self.vmin)
+
+    def train(self, sample: np.ndarray):
+        """Fit per-dimension ranges on a float32 sample"""
+        self.vmin = sample.min(axis=0).astype(np.float32)
+        self.scale = np.maximum(sample.max(axis=0) - self.vmin, 1e-12).astype(np.float32) / 255.0
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """Quantize vectors to uint8 codes, clipping values outside the trained range"""
+        codes = np.rint((np.asarray(vectors, dtype=np.float32) - self.vmin) / self.scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def distances(self, query: np.ndarray, codes: np.ndarray, norms: np.ndarray,
+                  block: int = 16384) -> np.ndarray:
+        """Approximate squared L2 from the query to each coded row
+
+        Uses the exact row norms with a decoded dot product:
+        |x|^2 - 2 (q.vmin + (q*scale).code) + |q|^2
+        """
+        scaled_query = query * self.scale
+        offset = float(query @ query) - 2.0 * float(query @ self.vmin)
+        dots = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), block):
+            dots[start:start + block] = codes[start:start + block] @ scaled_query
+        return norms - 2.0 * dots + offset
+
+    def state(self) -> dict:
+        return {"vmin": self.vmin, "scale": self.scale}
+
+    def set_state(self, state: dict):
+        self.vmin, self.scale = state["vmin"], state["scale"]
+
+
+class ProductQuantizer:
+    """Product quantization: each of ``m`` subvectors is replaced by the id of one of 256 centroids
+
+    A 384-dimensional embedding becomes ``m`` bytes (96 by default, 16x
+    smaller than float32). Query distances use a per-query lookup table of
+    subvector-to-centroid distances (asymmetric distance computation).
+    """
+
+    kind = "pq"
+
+    def __init__(self, m: Optional[int] = None, ksub: int = 256):
+        """
+        Initialize quantizer
+
+        Args:
+            m: Number of subvectors; must divide the dimension (defaults to dim / 4)
+            ksub: Centroids per subvector, at most 256 so a code fits in a byte
+        """
+        self.m = m
+        self.ksub = ksub
+        self.codebooks: Optional[np.ndarray] = None
+
+    @property
+    def code_size(self) -> int:
+        return self.m
+
+    def train(self, sample: np.ndarray, iterations: int = 10, seed: int = 0):
+        """Run k-means in every subspace of a float32 sample"""
+        dim = sample.shape[1]
+        self.m = self.m or max(1, dim // 4)
+        if dim % self.m:
+            raise ValueError(f"PQ subvectors ({self.m}) must divide the embedding dimension ({dim})")
+        dsub = dim // self.m
+        ksub = min(self.ksub, len(sample))
+        rng = np.random.default_rng(seed)
+        self.codebooks = np.stack([
+            kmeans(np.ascontiguousarray(sample[:, j * dsub:(j + 1) * dsub]), ksub, iterations=iterations, rng=rng)
+            for j in range(self.m)
+        ])
+
+    def encode(self, vectors: np.ndarray, block: int = 8192) -> np.ndarray:
+        """Nearest centroid id per subvector"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        dsub = self.codebooks.shape[2]
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j, codebook in enumerate(self.codebooks):
+            sub = vectors[:, j * dsub:(j + 1) * dsub]
+            # |c|^2 - 2 c.x per centroid, argmin per row
+            for start in range(0, len(sub), block):
+                distances = np.einsum("ij,ij->i", codebook, codebook)[None, :] - 2.0 * (sub[start:start + block] @ codebook.T)
+                codes[start:start + block, j] = np.argmin(distances, axis=1)
+        return codes
+
+    def distances(self, query: np.ndarray, codes: np.ndarray, norms: np.ndarray,
+                  block: int = 65536) -> np.ndarray:
+        """Approximate squared L2 as a sum of table lookups, one per subvector"""
+        dsub = self.codebooks.shape[2]
+        subqueries = query.reshape(self.m, 1, dsub)
+        table = ((self.codebooks - subqueries) ** 2).sum(axis=2).astype(np.float32)
+        result = np.zeros(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), block):
+            chunk = codes[start:start + block]
+            for j in range(self.m):
+                result[start:start + block] += table[j][chunk[:, j]]
+        return result
+
+    def state(self) -> dict:
+        return {"codebooks": self.codebooks}
+
+    def set_state(self, state: dict):
+        self.codebooks = state["codebooks"]
+        self.m = len(self.codebooks)
+
+
+QUANTIZERS = {"sq8": ScalarQuantizer, "pq": ProductQuantizer}
+
+
+def make_quantizer(kind: str, pq_subvectors: Optional[int] = None):
+    """Create an untrained quantizer of the given kind"""
+    if kind not in QUANTIZERS:
+        raise ValueError(f"Unknown quantization '{kind}', expected one of {tuple(QUANTIZERS)}")
+    return ProductQuantizer(m=pq_subvectors) if kind == "pq" else ScalarQuantizer()
+
+
+def save_quantizer(quantizer, path: str):
+    """Persist a trained quantizer"""
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(tmp_path, kind=quantizer.kind, **quantizer.state())
+    os.replace(tmp_path, path)
+
+
+def load_quantizer(path: str, kind: str, pq_subvectors: Optional[int] = None):
+    """Load a persisted quantizer, or None if it is missing or was trained with other settings"""
+    if not os.path.exists(path):
+        return None
+    data = np.load(path)
+    if str(data["kind"]) != kind:
+        return None
+    quantizer = make_quantizer(kind, pq_subvectors)
+    quantizer.set_state({name: data[name] for name in data.files if name != "kind"})
+    if kind == "pq" and pq_subvectors and quantizer.m != pq_subvectors:
+        # pq_subvectors changed since the codes were written
+        return None
+    return quantizer
@@ -0,0 +1,100 @@
+"""
+Request coalescing for query embeddings under concurrent load
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List
+
+from langchain.schema.embeddings import Embeddings
+
+
+class QueryBatcher:
+    """Collects queries from concurrent callers and embeds them in one batch
+
+    The first query to arrive opens a collection window of ``max_wait_ms``;
+    every query that arrives before it closes (up to ``max_batch_size``) is
+    encoded in the same ``embed_documents`` call. Callers block only until
+    their own batch is done, so the added latency is bounded by the window.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = 32, max_wait_ms: float = 2.0):
+        """
+        Initialize batcher
+
+        Args:
+            embeddings: Embedding model used for the batched calls
+            max_batch_size: Maximum queries encoded together
+            max_wait_ms: How long the first query of a batch waits for company
+        """
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.queries = 0
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+        self._thread.start()
+
+    def embed(self, text: str) -> List[float]:
+        """Embed a single query, sharing the model call with concurrent callers"""
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def close(self):
+        """Stop the background thread once queued queries are served"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for tuning the window and batch size"""
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "mean_batch_size": self.queries / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0
+        }
+
+    def _collect(self, first) -> list:
+        """Gather queries arriving within the window, up to the batch size"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Serve this batch, then let the run loop see the shutdown marker
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+
+            # Identical concurrent questions share one encoding
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(texts, self.embeddings.embed_documents(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.queries += len(batch)
+            for text, future in batch:
+                future.set_result(vectors[text])
@@ -2,27 +2,60 @@
 RAG Chain module that combines retrieval and generation
 """
 import os
-from typing import Dict, List, Optional
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from langchain.chains import RetrievalQA
 from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
-from langchain.callbacks import StreamingStdOutCallbackHandler
+from langchain.schema import Document
+from langchain.schema.language_model import BaseLanguageModel
 
 from dotenv import load_dotenv
 from src.core.vector_store import VectorStore
+from src.core.context_builder import ContextBuilder
+from src.core.answer_cache import SemanticAnswerCache
+from src.core.metadata_filter import MetadataFilter
+from src.core.metrics import record_stage, span
 from src.core.document_processor import DocumentProcessor
+from src.core.indexer import IncrementalIndexer
+from src.core.reranker import CrossEncoderReranker
 
 
 load_dotenv()
 
 
+# Custom prompt template
+PROMPT_TEMPLATE = """You are a helpful AI assistant. Use the following pieces of context to answer the question at the end. 
+If you don't know the answer, just say that you don't know, don't try to make up an answer.
+Always cite which document your answer comes from.
+
+Context:
+{context}
+
+Question: {question}
+
+Answer:"""
+
+PROMPT = PromptTemplate(
+    template=PROMPT_TEMPLATE,
+    input_variables=["context", "question"]
+)
+
+
 class RAGChain:
     """Main RAG chain for question answering"""
     
     def __init__(self, 
                  model_name: str = "gpt-3.5-turbo",
                  temperature: float = 0.7,
-                 max_tokens: int = 500):
+                 max_tokens: int = 500,
+                 vector_store: Optional[VectorStore] = None,
+                 reranker: Optional[CrossEncoderReranker] = None,
+                 rerank_candidates: int = 20,
+                 context_tokens: int = 1500,
+                 answer_cache: Optional[SemanticAnswerCache] = None,
+                 llm: Optional[BaseLanguageModel] = None):
         """
         Initialize RAG chain
         
@@ -30,14 +63,25 @@ class RAGChain:
             model_name: OpenAI model to use
             temperature: Temperature for generation
             max_tokens: Maximum tokens in response
+            vector_store: Preconfigured vector store (a default one is created if omitted)
+            reranker: Cross-encoder applied to a wider candidate set before prompting
+            rerank_candidates: Chunks retrieved for the reranker to choose from
+            context_tokens: Token budget for the retrieved context in the prompt; 0 stuffs whole chunks
+            answer_cache: Reuses LLM answers for paraphrased questions
+            llm: Preconfigured chat model (defaults to OpenAI when OPENAI_API_KEY is set)
         """
         self.model_name = model_name
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        self.context_builder = ContextBuilder(max_tokens=context_tokens, model_name=model_name) if context_tokens else None
+        self.answer_cache = answer_cache
         
         # Initialize components
-        self.vector_store = VectorStore()
+        self.vector_store = vector_store or VectorStore()
         self.document_processor = DocumentProcessor()
+        self.indexer = IncrementalIndexer(self.vector_store, self.document_processor)
         
         # Load or create vector store
         if not self.vector_store.load_vector_store():
@@ -45,7 +89,7 @@ class RAGChain:
         
         # Initialize LLM (we'll use a mock for now if no API key)
         api_key = os.getenv("OPENAI_API_KEY", "dummy_key")
-        self.llm = self._initialize_llm(api_key)
+        self.llm = llm or self._initialize_llm(api_key)
         
         # Create QA chain
         self.qa_chain = None
@@ -63,8 +107,7 @@ class RAGChain:
                 temperature=self.temperature,
                 max_tokens=self.max_tokens,
                 openai_api_key=api_key,
-                streaming=True,
-                callbacks=[StreamingStdOutCallbackHandler()]
+                streaming=True
             )
     
     def _create_qa_chain(self):
@@ -73,23 +116,6 @@ class RAGChain:
             print("Vector store not initialized!")
             return
         
-        # Custom prompt template
-        prompt_template = """You are a helpful AI assistant. Use the following pieces of context to answer the question at the end. 
-If you don't know the answer, just say that you don't know, don't try to make up an answer.
-Always cite which document your answer comes from.
-
-Context:
-{context}
-
-Question: {question}
-
-Answer:"""
-        
-        PROMPT = PromptTemplate(
-            template=prompt_template,
-            input_variables=["context", "question"]
-        )
-        
         if self.llm:
             self.qa_chain = RetrievalQA.from_chain_type(
                 llm=self.llm,
@@ -103,48 +129,174 @@ Answer:"""
             self.qa_chain = None
     
     def process_new_documents(self, pdf_directory: str):
-        """Process new documents and update vector store"""
-        documents = self.document_processor.process_documents(pdf_directory)
-        if documents:
-            self.vector_store.create_vector_store(documents)
+        """Index new or changed documents and drop removed ones; returns chunks added"""
+        stats = self.indexer.sync(pdf_directory)
+        if stats["chunks_added"] or stats["chunks_deleted"]:
             self._create_qa_chain()
-            return len(documents)
-        return 0
+        return stats["chunks_added"]
+    
+    def retrieve(self, question: str, k: Optional[int] = None,
+                 filter: Optional[MetadataFilter] = None) -> Tuple[List[Document], Dict[str, float]]:
+        """
+        Chunks to put in the prompt, reranked when a reranker is configured
+        
+        Args:
+            question: User question
+            k: Chunks to return (defaults to 5 with an LLM, 3 in mock mode)
+            filter: Only retrieve chunks whose metadata matches (source, pages, ingest time)
+        
+        Returns:
+            The documents and per-stage timings in milliseconds
+        """
+        k = k or (5 if self.llm else 3)
+        timings = {}
+        if self.reranker is None:
+            with span("retrieval", timings):
+                docs = [doc for doc, _ in self.vector_store.search(question, k=k, filter=filter)]
+            return docs, timings
+        
+        with span("retrieval", timings):
+            candidates = [
+                doc for doc, _ in self.vector_store.search(question, k=max(k, self.rerank_candidates), filter=filter)
+            ]
+        with span("rerank", timings):
+            docs = [doc for doc, _ in self.reranker.rerank(question, candidates, top_n=k)]
+        return docs, timings
+    
+    def build_context(self, question: str, docs: List[Document],
+                      timings: Dict[str, float]) -> Tuple[List[Document], Optional[Dict[str, int]]]:
+        """Compress retrieved chunks to the context token budget; returns the docs and token counts"""
+        if self.context_builder is None:
+            return docs, None
+        with span("context", timings):
+            context_docs, context_stats = self.context_builder.build(question, docs)
+        return context_docs, context_stats
+    
+    def _lookup_answer(self, question: str, timings: Dict[str, float],
+                       filter: Optional[MetadataFilter] = None) -> Tuple[Optional[Dict], Optional[tuple]]:
+        """
+        Check the semantic answer cache (only unfiltered LLM answers are cached)
+        
+        Returns:
+            The cached entry or None, and the (embedding, data version) to store a new answer under
+        """
+        if self.answer_cache is None or not self.llm or filter:
+            return None, None
+        with span("answer_cache", timings):
+            # The query embedding is cached, so retrieval after a miss doesn't encode again
+            embedding = self.vector_store.embed_query(question)
+            version = self.vector_store.data_version
+            cached = self.answer_cache.get(embedding, version)
+        return cached, (embedding, version)
     
-    def query(self, question: str) -> Dict:
-        """Query the RAG system"""
+    def query(self, question: str, filter: Optional[MetadataFilter] = None) -> Dict:
+        """Query the RAG system, optionally over chunks matching a metadata filter only"""
+        timings = {}
+        cached, cache_key = self._lookup_answer(question, timings, filter)
+        if cached:
+            return {
+                "query": question,
+                "result": cached["answer"],
+                "source_documents": cached["source_documents"],
+                "timings": timings,
+                "context": None,
+                "cached": True
+            }
+        
+        docs, retrieval_timings = self.retrieve(question, filter=filter)
+        timings.update(retrieval_timings)
+        context_docs, context_stats = self.build_context(question, docs, timings)
+        
         if not self.qa_chain:
             # Mock response for testing without OpenAI API
-            similar_docs = self.vector_store.similarity_search(question, k=3)
-            
-            response = {
+            return {
                 "query": question,
-                "result": f"[Mock Response] Based on the documents, here's what I found about '{question}':\n\n",
-                "source_documents": similar_docs
+                "result": self._mock_answer(question, docs),
+                "source_documents": docs,
+                "timings": timings,
+                "context": context_stats,
+                "cached": False
             }
-            
-            if similar_docs:
-                response["result"] += f"From {similar_docs[0].metadata['source']}:\n"
-                response["result"] += f"{similar_docs[0].page_content[:300]}..."
-            else:
-                response["result"] = "No relevant information found in the documents."
-            
-            return response
-        
-        # Real query with OpenAI
+        
+        # Real query with OpenAI: the stuff chain of the QA chain, fed with our own retrieval
         try:
-            response = self.qa_chain({"query": question})
-            return response
+            with span("generation", timings):
+                result = self.qa_chain.combine_documents_chain.run(input_documents=context_docs, question=question)
+            if cache_key:
+                self.answer_cache.put(question, cache_key[0], result, docs, cache_key[1])
         except Exception as e:
-            return {
-                "query": question,
-                "result": f"Error: {str(e)}",
-                "source_documents": []
-            }
+            result, docs = f"Error: {str(e)}", []
+        return {
+            "query": question,
+            "result": result,
+            "source_documents": docs,
+            "timings": timings,
+            "context": context_stats,
+            "cached": False
+        }
+    
+    def _mock_answer(self, question: str, docs: List[Document]) -> str:
+        """Answer built from the best chunk when no LLM is configured"""
+        if not docs:
+            return "No relevant information found in the documents."
+        
+        answer = f"[Mock Response] Based on the documents, here's what I found about '{question}':\n\n"
+        answer += f"From {docs[0].metadata['source']}:\n"
+        answer += f"{docs[0].page_content[:300]}..."
+        return answer
+    
+    def stream_query(self, question: str, filter: Optional[MetadataFilter] = None) -> Iterator[Tuple[str, Any]]:
+        """
+        Query the RAG system, yielding events as soon as they are available
+        
+        Yields:
+            ("sources", List[Document]) once retrieval finishes, then
+            ("token", str) for each generated token, ("error", str) if
+            generation fails, and finally ("done", {"timings": ..., "context": ..., "cached": ...})
+        """
+        timings = {}
+        cached, cache_key = self._lookup_answer(question, timings, filter)
+        if cached:
+            yield "sources", cached["source_documents"]
+            yield "token", cached["answer"]
+            yield "done", {"timings": timings, "context": None, "cached": True}
+            return
+        
+        # Same retrieval, reranking and context compression as query()
+        docs, retrieval_timings = self.retrieve(question, filter=filter)
+        timings.update(retrieval_timings)
+        yield "sources", docs
+        context_docs, context_stats = self.build_context(question, docs, timings)
+        start = time.perf_counter()
+        
+        if not self.llm:
+            # Mock mode streams the canned answer word by word
+            for token in re.findall(r"\S+\s*", self._mock_answer(question, docs)):
+                yield "token", token
+        else:
+            # Same prompt the stuff chain would build
+            context = "\n\n".join(doc.page_content for doc in context_docs)
+            tokens = []
+            try:
+                for chunk in self.llm.stream(PROMPT.format(context=context, question=question)):
+                    if chunk.content:
+                        tokens.append(chunk.content)
+                        yield "token", chunk.content
+                if cache_key:
+                    self.answer_cache.put(question, cache_key[0], "".join(tokens), docs, cache_key[1])
+            except Exception as e:
+                yield "error", str(e)
+        # Not a span: the generator is suspended between tokens, possibly in another thread
+        seconds = time.perf_counter() - start
+        record_stage("generation", seconds)
+        timings["generation_ms"] = seconds * 1000
+        
+        yield "done", {"timings": timings, "context": context_stats, "cached": False}
     
-    def get_relevant_chunks(self, question: str, k: int = 5) -> List[Dict]:
+    def get_relevant_chunks(self, question: str, k: int = 5,
+                            filter: Optional[MetadataFilter] = None) -> List[Dict]:
         """Get relevant chunks with scores"""
-        results = self.vector_store.similarity_search_with_score(question, k=k)
+        results = self.vector_store.similarity_search_with_score(question, k=k, filter=filter)
         
         chunks = []
         for doc, score in results:
@@ -152,7 +304,9 @@ Answer:"""
                 "content": doc.page_content,
                 "source": doc.metadata.get("source", "Unknown"),
                 "score": float(score),
-                "chunk_index": doc.metadata.get("chunk_index", -1)
+                "chunk_index": doc.metadata.get("chunk_index", -1),
+                "page_start": doc.metadata.get("page_start"),
+                "page_end": doc.metadata.get("page_end")
             })
         
         return chunks
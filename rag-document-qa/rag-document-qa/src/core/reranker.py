@@ -0,0 +1,97 @@
+"""
+Cross-encoder reranking of retrieved chunks with cached pair scores
+"""
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from src.core.cache import LRUCache
+
+
+class CrossEncoderReranker:
+    """Scores (question, chunk) pairs with a local cross-encoder and keeps the best
+
+    Bi-encoder retrieval compares independently computed vectors; a
+    cross-encoder reads the question and chunk together and ranks far more
+    precisely, at the price of one model pass per pair. Only a bounded
+    candidate pool is scored, in batches, and every score is cached by
+    (question, chunk id) so repeated questions cost nothing.
+    """
+
+    def __init__(self,
+                 model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+                 batch_size: int = 32,
+                 max_candidates: int = 100,
+                 cache_size: int = 8192,
+                 device: str = "cpu"):
+        """
+        Initialize reranker
+
+        Args:
+            model_name: HuggingFace cross-encoder model
+            batch_size: Pairs scored per model call
+            max_candidates: Upper bound on chunks scored per question
+            cache_size: (question, chunk id) scores kept in memory
+            device: Torch device for the model
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_candidates = max_candidates
+        self.device = device
+        self.score_cache = LRUCache(maxsize=cache_size)
+        self.pairs_scored = 0
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """The cross-encoder, loaded on first use"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    print(f"Loading reranker model: {self.model_name}")
+                    self._model = CrossEncoder(self.model_name, device=self.device)
+        return self._model
+
+    @staticmethod
+    def _chunk_key(doc: Document) -> str:
+        return doc.metadata.get("chunk_id") or hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+    def score(self, question: str, docs: List[Document]) -> List[float]:
+        """Relevance score per document (higher is better), scoring only uncached pairs"""
+        scores: List[Optional[float]] = []
+        pending = []
+        for i, doc in enumerate(docs):
+            cached = self.score_cache.get((question, self._chunk_key(doc)))
+            scores.append(None if cached is LRUCache.MISSING else cached)
+            if cached is LRUCache.MISSING:
+                pending.append(i)
+
+        if pending:
+            predicted = self.model.predict(
+                [(question, docs[i].page_content) for i in pending],
+                batch_size=self.batch_size,
+                show_progress_bar=False
+            )
+            self.pairs_scored += len(pending)
+            for i, value in zip(pending, predicted):
+                scores[i] = float(value)
+                self.score_cache.put((question, self._chunk_key(docs[i])), scores[i])
+        return scores
+
+    def rerank(self, question: str, docs: List[Document], top_n: int = 5) -> List[Tuple[Document, float]]:
+        """The top_n documents by cross-encoder score, best first"""
+        docs = docs[:self.max_candidates]
+        scored = sorted(zip(docs, self.score(question, docs)), key=lambda pair: pair[1], reverse=True)
+        return scored[:top_n]
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters and model usage"""
+        return {
+            "model": self.model_name,
+            "pairs_scored": self.pairs_scored,
+            "score_cache": self.score_cache.stats()
+        }
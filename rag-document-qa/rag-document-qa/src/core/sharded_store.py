@@ -0,0 +1,464 @@
+"""
+Vector store partitioned by source into shards that are searched in parallel
+"""
+import hashlib
+import heapq
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+from langchain.schema.vectorstore import VectorStore as LangchainVectorStore
+
+from src.core.metadata_filter import MetadataFilter
+
+
+SHARDS_FILENAME = "shards.json"
+SHARD_WORKERS = ("threads", "processes")
+
+
+def shard_of(source: Optional[str], shards: int) -> int:
+    """Shard holding a source's chunks (stable across processes and restarts)"""
+    # A real hash rather than CRC32, which maps similar names (doc_001.pdf, doc_002.pdf ...) unevenly
+    digest = hashlib.blake2b((source or "").encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+def check_layout(persist_directory: str, shards: int, has_data: bool):
+    """
+    Record the shard count of a store, refusing to reopen it with another one
+
+    Args:
+        persist_directory: Store directory
+        shards: Requested shard count
+        has_data: Whether the store already holds chunks (an empty store can be re-laid out)
+
+    Chunks are placed by source hash modulo the shard count, so changing it
+    would leave them on the wrong shards; stores without a layout file are
+    unsharded.
+    """
+    path = os.path.join(persist_directory, SHARDS_FILENAME)
+    current = 1
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            current = json.load(f)["shards"]
+    if current == shards:
+        return
+    if has_data:
+        raise ValueError(f"Store in {persist_directory} has {current} shard(s), not {shards}; "
+                         "re-ingest into a new directory to change the shard count")
+    if shards == 1:
+        os.remove(path)
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "shards": shards}, f)
+    os.replace(tmp_path, path)
+
+
+class ChromaShard:
+    """One Chroma collection behind the same methods as NumpyVectorStore
+
+    Shards are always given precomputed embeddings, so the collection is
+    opened without an embedding function (and without langchain's wrapper).
+    """
+
+    def __init__(self, directory: str, collection_name: str = "rag_documents",
+                 collection_metadata: Optional[Dict[str, Any]] = None):
+        """
+        Initialize shard
+
+        Args:
+            directory: Directory of the shard's Chroma database
+            collection_name: Collection to open or create
+            collection_metadata: HNSW settings applied when the collection is created
+        """
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=directory)
+        self.collection = self.client.get_or_create_collection(
+            collection_name, metadata=collection_metadata or None, embedding_function=None
+        )
+
+    def __len__(self) -> int:
+        return self.collection.count()
+
+    def persist(self):
+        """Chroma writes through; nothing to flush"""
+
+    def add_embeddings(self, texts: List[str], embeddings: List[List[float]],
+                       metadatas: Optional[List[Dict]] = None,
+                       ids: Optional[List[str]] = None) -> List[str]:
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any):
+        # Deletes are broadcast to every shard; only ask Chroma to drop the ids this one has
+        existing = self.collection.get(ids=ids, include=[])["ids"] if ids else []
+        if existing:
+            self.collection.delete(ids=existing)
+
+    def delete_where(self, **where: Any):
+        clauses = [{field: value} for field, value in where.items()]
+        self.collection.delete(where=clauses[0] if len(clauses) == 1 else {"$and": clauses})
+
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict]):
+        if ids:
+            self.collection.update(ids=ids, metadatas=metadatas)
+
+    def get_by_ids(self, ids: List[str], content_chars: Optional[int] = None) -> List[Document]:
+        response = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        found = {
+            chunk_id: Document(page_content=text[:content_chars] if content_chars is not None else text,
+                               metadata=metadata or {})
+            for chunk_id, text, metadata in zip(response["ids"], response["documents"], response["metadatas"])
+        }
+        return [found[chunk_id] for chunk_id in ids if chunk_id in found]
+
+    def iter_records(self, batch_size: int = 1000):
+        for offset in range(0, len(self), batch_size):
+            batch = self.collection.get(limit=batch_size, offset=offset, include=["documents", "metadatas"])
+            yield batch["ids"], batch["documents"], batch["metadatas"]
+
+    def search_by_vectors(self, embeddings: List[List[float]], k: int = 4,
+                          content_chars: Optional[int] = None,
+                          filter: Optional[MetadataFilter] = None) -> List[List[Tuple[Document, float]]]:
+        """Top-k (document, squared L2 distance) per query vector; texts are cut to content_chars"""
+        if not len(self):
+            return [[] for _ in embeddings]
+        response = self.collection.query(
+            query_embeddings=embeddings,
+            n_results=k,
+            where=filter.to_chroma_where() if filter else None,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [
+                (Document(page_content=text[:content_chars] if content_chars is not None else text,
+                          metadata=metadata or {}), distance)
+                for text, metadata, distance in zip(texts, metadatas, distances)
+            ]
+            for texts, metadatas, distances in zip(
+                response["documents"], response["metadatas"], response["distances"]
+            )
+        ]
+
+
+def open_shard(backend: str, directory: str, collection_name: str = "rag_documents", **kwargs: Any):
+    """Open one shard of the given backend; kwargs are NumpyVectorStore's index settings or ChromaShard's"""
+    if backend == "numpy":
+        from src.core.numpy_store import NumpyVectorStore
+
+        return NumpyVectorStore(directory, embedding_function=None, collection_name=collection_name, **kwargs)
+    return ChromaShard(directory, collection_name=collection_name, **kwargs)
+
+
+def _serve_shard(connection, backend: str, directory: str, collection_name: str, kwargs: Dict[str, Any]):
+    """Worker process loop: open a shard and answer (method, args, kwargs) calls until told to stop"""
+    try:
+        shard = open_shard(backend, directory, collection_name, **kwargs)
+        connection.send((True, None))
+    except Exception as e:
+        connection.send((False, f"{type(e).__name__}: {e}"))
+        return
+    cursors: Dict[int, Iterable] = {}
+    next_cursor = 0
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        method, args, call_kwargs = message
+        try:
+            if method == "__len__":
+                result = len(shard)
+            elif method == "iter_records":
+                # Batches are pulled one call at a time rather than pickled in one piece
+                next_cursor += 1
+                cursors[next_cursor] = shard.iter_records(*args, **call_kwargs)
+                result = next_cursor
+            elif method == "next_records":
+                result = next(cursors[args[0]], None)
+                if result is None:
+                    del cursors[args[0]]
+            else:
+                result = getattr(shard, method)(*args, **call_kwargs)
+            connection.send((True, result))
+        except Exception as e:
+            connection.send((False, f"{type(e).__name__}: {e}"))
+
+
+class ShardProcess:
+    """A shard running in its own local worker process, called through a pipe
+
+    Any shard method can be called on the proxy. Each worker handles one call
+    at a time; different shards' workers run concurrently.
+    """
+
+    def __init__(self, backend: str, directory: str, collection_name: str = "rag_documents", **kwargs: Any):
+        # Spawned rather than forked: the parent has threads (and possibly a loaded model)
+        context = multiprocessing.get_context("spawn")
+        self._connection, child = context.Pipe()
+        self._process = context.Process(
+            target=_serve_shard, args=(child, backend, directory, collection_name, kwargs),
+            name=f"shard:{os.path.basename(directory)}", daemon=True
+        )
+        self._process.start()
+        child.close()
+        self._lock = threading.Lock()
+        try:
+            ok, error = self._connection.recv()
+        except EOFError:
+            ok, error = False, f"exited with code {self._process.exitcode}"
+        if not ok:
+            self._process.join()
+            raise RuntimeError(f"Shard worker for {directory} failed to start: {error}")
+
+    def _call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            try:
+                self._connection.send((method, args, kwargs))
+                ok, result = self._connection.recv()
+            except (EOFError, BrokenPipeError) as e:
+                raise RuntimeError(f"Shard worker {self._process.name} is gone ({type(e).__name__})") from e
+        if not ok:
+            raise RuntimeError(f"Shard worker {self._process.name} failed in {method}: {result}")
+        return result
+
+    def __getattr__(self, method: str) -> Callable:
+        if method.startswith("_"):
+            raise AttributeError(method)
+        return partial(self._call, method)
+
+    def __len__(self) -> int:
+        return self._call("__len__")
+
+    def iter_records(self, batch_size: int = 1000):
+        cursor = self._call("iter_records", batch_size)
+        while True:
+            batch = self._call("next_records", cursor)
+            if batch is None:
+                return
+            yield batch
+
+    def close(self):
+        """Stop the worker process"""
+        with self._lock:
+            if self._process.is_alive():
+                try:
+                    self._connection.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+            self._process.join(timeout=10)
+            self._connection.close()
+
+
+class ShardedVectorStore(LangchainVectorStore):
+    """Chunks spread over N shards by source hash, searched with parallel scatter-gather
+
+    Each shard is a complete NumpyVectorStore or Chroma collection in its own
+    directory (``shards/shard-00`` ...). Writes are grouped by shard and
+    applied to all shards concurrently; a search sends the query vectors to
+    every shard at once and merges the per-shard top-k lists, each already
+    sorted by distance, with a heap. Per-shard work shrinks as shards are
+    added, so search latency tracks the largest shard rather than the corpus.
+
+    Shards run on a thread pool by default (NumPy and Chroma release the GIL
+    for their heavy lifting); with ``workers="processes"`` each shard lives in
+    its own local worker process instead.
+    """
+
+    def __init__(self,
+                 persist_directory: str,
+                 embedding_function: Optional[Embeddings],
+                 shards: int,
+                 backend: str = "numpy",
+                 collection_name: str = "rag_documents",
+                 workers: str = "threads",
+                 max_workers: Optional[int] = None,
+                 **shard_kwargs: Any):
+        """
+        Initialize store
+
+        Args:
+            persist_directory: Directory the shard directories live in
+            embedding_function: Embeddings used by add_texts and similarity_search
+            shards: Number of shards
+            backend: Backend of every shard, "numpy" or "chroma"
+            collection_name: Collection name within each shard
+            workers: "threads" to search shards on a thread pool, "processes" for one worker process per shard
+            max_workers: Pool threads (defaults to 4 per shard, so concurrent searches don't queue behind each other)
+            shard_kwargs: Index settings passed to every shard
+        """
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        if workers not in SHARD_WORKERS:
+            raise ValueError(f"Unknown shard workers '{workers}', expected one of {SHARD_WORKERS}")
+        self.embedding_function = embedding_function
+        self.backend = backend
+        self.workers = workers
+        self.directories = [
+            os.path.join(persist_directory, "shards", f"shard-{shard:02d}") for shard in range(shards)
+        ]
+        for directory in self.directories:
+            os.makedirs(directory, exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or 4 * shards, thread_name_prefix="shard")
+        opener = ShardProcess if workers == "processes" else open_shard
+        # Shards load (and start their workers) in parallel too
+        self.shards = self._map(
+            lambda directory: opener(backend, directory, collection_name, **shard_kwargs), self.directories
+        )
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self.embedding_function
+
+    def _map(self, func: Callable, items: List) -> List:
+        """func over items concurrently, in order; the calling thread takes the first item itself"""
+        if len(items) == 1:
+            return [func(items[0])]
+        futures = [self._pool.submit(func, item) for item in items[1:]]
+        first = func(items[0])
+        return [first] + [future.result() for future in futures]
+
+    def _scatter(self, calls: Dict[int, Callable]) -> Dict[int, Any]:
+        """Run one call per shard index concurrently"""
+        indices = list(calls)
+        return dict(zip(indices, self._map(lambda index: calls[index](self.shards[index]), indices)))
+
+    def _group(self, metadatas: List[Optional[Dict]]) -> Dict[int, List[int]]:
+        """Positions of the given chunks per owning shard"""
+        groups: Dict[int, List[int]] = {}
+        for position, metadata in enumerate(metadatas):
+            groups.setdefault(shard_of((metadata or {}).get("source"), len(self.shards)), []).append(position)
+        return groups
+
+    def __len__(self) -> int:
+        return sum(self._map(len, self.shards))
+
+    def close(self):
+        """Stop worker processes and the thread pool"""
+        if self.workers == "processes":
+            self._map(lambda shard: shard.close(), self.shards)
+        self._pool.shutdown(wait=False)
+
+    def persist(self):
+        """Flush every shard"""
+        self._map(lambda shard: shard.persist(), self.shards)
+
+    def add_embeddings(self, texts: List[str], embeddings: List[List[float]],
+                       metadatas: Optional[List[Dict]] = None,
+                       ids: Optional[List[str]] = None) -> List[str]:
+        """Write precomputed embeddings, each shard's share concurrently; existing ids are replaced"""
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+
+        def write(positions: List[int]) -> Callable:
+            return lambda shard: shard.add_embeddings(
+                [texts[i] for i in positions], [embeddings[i] for i in positions],
+                metadatas=[metadatas[i] for i in positions], ids=[ids[i] for i in positions]
+            )
+
+        self._scatter({index: write(positions) for index, positions in self._group(metadatas).items()})
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[Dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """Embed and add texts"""
+        texts = list(texts)
+        if not texts:
+            return []
+        embeddings = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(texts, embeddings, metadatas=metadatas, ids=ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Delete chunks by id (ids don't name their shard, so every shard is asked)"""
+        if ids:
+            self._map(lambda shard: shard.delete(ids=ids), self.shards)
+        return True
+
+    def delete_where(self, **where: Any):
+        """Delete chunks whose metadata matches every given field; a source lives on one shard"""
+        if "source" in where:
+            self.shards[shard_of(where["source"], len(self.shards))].delete_where(**where)
+        else:
+            self._map(lambda shard: shard.delete_where(**where), self.shards)
+
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict]):
+        """Replace the metadata of existing chunks, on the shard of their source"""
+        def update(positions: List[int]) -> Callable:
+            return lambda shard: shard.update_metadatas([ids[i] for i in positions],
+                                                        [metadatas[i] for i in positions])
+
+        self._scatter({index: update(positions) for index, positions in self._group(metadatas).items()})
+
+    def get_by_ids(self, ids: List[str], content_chars: Optional[int] = None) -> List[Document]:
+        """Documents for the given ids, in order (matched by their chunk_id metadata); unknown ids are skipped"""
+        found: Dict[str, Document] = {}
+        for docs in self._map(lambda shard: shard.get_by_ids(ids, content_chars=content_chars), self.shards):
+            found.update((doc.metadata.get("chunk_id"), doc) for doc in docs)
+        return [found[chunk_id] for chunk_id in ids if chunk_id in found]
+
+    def iter_records(self, batch_size: int = 1000):
+        """Yield (ids, texts, metadatas) batches of every shard in turn"""
+        for shard in self.shards:
+            yield from shard.iter_records(batch_size)
+
+    def search_by_vectors(self, embeddings: List[List[float]], k: int = 4,
+                          **kwargs: Any) -> List[List[Tuple[Document, float]]]:
+        """
+        Top-k for several query vectors across all shards
+
+        Args:
+            embeddings: Query vectors
+            k: Results per query
+            kwargs: Passed to every shard's search (nprobe, exact, content_chars, filter)
+
+        Returns:
+            One list of (document, squared L2 distance) tuples per query
+        """
+        per_shard = self._map(lambda shard: shard.search_by_vectors(embeddings, k=k, **kwargs), self.shards)
+        # Each shard's list is sorted by distance, so a k-way heap merge yields the global top-k
+        return [
+            list(islice(heapq.merge(*lists, key=lambda pair: pair[1]), k))
+            for lists in zip(*per_shard)
+        ]
+
+    def similarity_search_by_vector_with_relevance_scores(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        """Top-k documents with squared L2 distances for a query vector"""
+        return self.search_by_vectors([embedding], k=k, **kwargs)[0]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_relevance_scores(embedding, k=k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_relevance_scores(
+            self.embedding_function.embed_query(query), k=k, **kwargs
+        )
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings,
+                   metadatas: Optional[List[Dict]] = None, persist_directory: str = "./data/chromadb",
+                   shards: int = 2, **kwargs: Any) -> "ShardedVectorStore":
+        store = cls(persist_directory, embedding, shards=shards, **kwargs)
+        store.add_texts(texts, metadatas=metadatas)
+        store.persist()
+        return store
@@ -1,102 +1,764 @@
 """
-Vector store module using ChromaDB for document embeddings and retrieval
+Vector store module using ChromaDB (or an in-process NumPy index) for document embeddings and retrieval
 """
+import json
 import os
-from typing import List, Dict, Optional
+import time
+import uuid
+from collections import Counter
+from itertools import islice
+from typing import Any, Iterable, List, Dict, Optional
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
-from langchain.schema import Document
+from langchain.schema import BaseRetriever, Document
+from langchain.schema.embeddings import Embeddings
+from langchain.schema.vectorstore import VectorStore as LangchainVectorStore
+from langchain.callbacks.manager import CallbackManagerForRetrieverRun
 
 from dotenv import load_dotenv
 import chromadb
 
+from src.core.cache import LRUCache
+from src.core.catalog import CATALOG_FILENAME, DocumentCatalog
+from src.core.embedding_cache import CachedEmbeddings, EmbeddingCache
+from src.core.lexical_index import BM25Index, is_keyword_query
+from src.core.metadata_filter import MetadataFilter
+from src.core.metrics import REGISTRY, span
+from src.core.numpy_store import INDEX_KWARGS, NumpyVectorStore
+from src.core.query_batcher import QueryBatcher
+from src.core.sharded_store import SHARD_WORKERS, ShardedVectorStore, check_layout
+
 load_dotenv()
 
 
+CHUNKS_INDEXED = REGISTRY.counter("rag_chunks_indexed_total", "Chunks embedded and written to the vector store")
+SEARCHES = REGISTRY.counter("rag_searches_total", "Searches served, by mode", ("mode",))
+
+
+class CachedRetriever(BaseRetriever):
+    """Retriever that goes through VectorStore's query and result caches"""
+    
+    store: Any
+    search_kwargs: Dict = {"k": 5}
+    
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return [doc for doc, _ in self.store.search(query, **self.search_kwargs)]
+
+
+BACKENDS = ("chroma", "numpy")
+SEARCH_MODES = ("dense", "hybrid", "lexical")
+# What the score of each search mode measures: squared L2 distance (lower is better),
+# reciprocal-rank fusion value or BM25 relevance (both higher is better)
+SCORE_TYPES = {"dense": "l2_distance", "hybrid": "rrf", "lexical": "bm25"}
+LEXICAL_INDEX_FILENAME = "bm25_index.json"
+DATA_VERSION_FILENAME = "data_version.json"
+
+# Build parameters understood by each backend
+NUMPY_INDEX_PARAMS = tuple(name for name in INDEX_KWARGS if name != "index_type")
+CHROMA_HNSW_PARAMS = ("M", "construction_ef", "search_ef")
+
+
 class VectorStore:
-    """Handles vector storage and retrieval using ChromaDB"""
+    """Handles vector storage and retrieval using ChromaDB or an in-process NumPy index"""
     
     def __init__(self, 
                  persist_directory: str = "./data/chromadb",
-                 embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"):
+                 embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
+                 embedding_cache_dir: Optional[str] = None,
+                 embedding_cache_max_bytes: int = 1 << 30,
+                 query_cache_size: int = 1024,
+                 result_cache_size: int = 1024,
+                 result_cache_ttl: float = 300.0,
+                 query_batch_size: int = 32,
+                 query_batch_wait_ms: float = 0.0,
+                 backend: Optional[str] = None,
+                 index_type: Optional[str] = None,
+                 index_params: Optional[Dict[str, Any]] = None,
+                 search_mode: Optional[str] = None,
+                 embeddings: Optional[Embeddings] = None,
+                 shards: Optional[int] = None,
+                 shard_workers: Optional[str] = None):
         """
         Initialize vector store
         
         Args:
             persist_directory: Directory to persist ChromaDB
             embedding_model: HuggingFace model for embeddings
+            embedding_cache_dir: Directory of the persistent embedding cache
+                (defaults to ``embedding_cache`` next to persist_directory)
+            embedding_cache_max_bytes: Size budget of the embedding cache; 0 disables it
+            query_cache_size: Query embeddings kept in memory; 0 disables the cache
+            result_cache_size: Search results kept in memory; 0 disables the cache
+            result_cache_ttl: Seconds a cached search result stays valid
+            query_batch_size: Maximum concurrent queries embedded in one model call
+            query_batch_wait_ms: Window for coalescing concurrent queries; 0 disables batching
+            backend: "chroma" or "numpy" (defaults to RAG_VECTOR_BACKEND, else "chroma")
+            index_type: NumPy backend index, "flat" or "ivf" (defaults to RAG_INDEX_TYPE, else "flat")
+            index_params: Build parameters - nlist, nprobe and ivf_min_rows for the NumPy
+                IVF index, quantization ("sq8"/"pq", defaults to RAG_QUANTIZATION),
+                pq_subvectors, rerank_factor and quantize_min_rows for its compressed
+                codes; M, construction_ef and search_ef for a new Chroma collection
+            search_mode: Default mode of search() - "dense", "hybrid" or "lexical"
+                (defaults to RAG_SEARCH_MODE, else "dense")
+            embeddings: Preconfigured embedding model used instead of loading embedding_model
+            shards: Collections the chunks are partitioned over by source, each in its own
+                directory and searched in parallel (defaults to RAG_SHARDS, else 1)
+            shard_workers: "threads" or "processes" (one local worker process per shard);
+                defaults to RAG_SHARD_WORKERS, else "threads"
         """
         self.persist_directory = persist_directory
         os.makedirs(persist_directory, exist_ok=True)
         
+        self.backend = backend or os.getenv("RAG_VECTOR_BACKEND", "chroma")
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown vector store backend '{self.backend}', expected one of {BACKENDS}")
+        self.index_type = index_type or os.getenv("RAG_INDEX_TYPE", "flat")
+        self.index_params = dict(index_params or {})
+        if os.getenv("RAG_QUANTIZATION"):
+            self.index_params.setdefault("quantization", os.getenv("RAG_QUANTIZATION"))
+        self.search_mode = search_mode or os.getenv("RAG_SEARCH_MODE", "dense")
+        if self.search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{self.search_mode}', expected one of {SEARCH_MODES}")
+        self.shards = shards or int(os.getenv("RAG_SHARDS", "1"))
+        if self.shards < 1:
+            raise ValueError("shards must be at least 1")
+        self.shard_workers = shard_workers or os.getenv("RAG_SHARD_WORKERS", "threads")
+        if self.shard_workers not in SHARD_WORKERS:
+            raise ValueError(f"Unknown shard workers '{self.shard_workers}', expected one of {SHARD_WORKERS}")
+        
         # Initialize embeddings
-        print(f"Loading embedding model: {embedding_model}")
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=embedding_model,
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
+        normalize_embeddings = True
+        if embeddings is None:
+            print(f"Loading embedding model: {embedding_model}")
+            self.base_embeddings = HuggingFaceEmbeddings(
+                model_name=embedding_model,
+                model_kwargs={'device': 'cpu'},
+                encode_kwargs={'normalize_embeddings': normalize_embeddings}
+            )
+        else:
+            self.base_embeddings = embeddings
+            # Keep cached vectors of different models apart
+            embedding_model = getattr(embeddings, "model_name", type(embeddings).__name__)
+        self.embeddings = self.base_embeddings
+        
+        # Serve previously encoded chunk texts from disk instead of re-encoding them
+        if embedding_cache_max_bytes > 0:
+            cache_dir = embedding_cache_dir or os.path.join(
+                os.path.dirname(os.path.abspath(persist_directory)), "embedding_cache"
+            )
+            self.embeddings = CachedEmbeddings(
+                self.base_embeddings,
+                EmbeddingCache(cache_dir, max_bytes=embedding_cache_max_bytes),
+                namespace=f"{embedding_model}|normalize={normalize_embeddings}"
+            )
+        
+        # In-process caches for repeated questions; results are keyed on the index version
+        self.query_cache = LRUCache(maxsize=query_cache_size)
+        self.result_cache = LRUCache(maxsize=result_cache_size, ttl=result_cache_ttl)
+        self.index_version = 0
+        
+        # Survives restarts, unlike index_version; bumped on every write to the collection
+        self._data_version_path = os.path.join(persist_directory, DATA_VERSION_FILENAME)
+        self.data_version = 0
+        if os.path.exists(self._data_version_path):
+            with open(self._data_version_path, "r", encoding="utf-8") as f:
+                self.data_version = json.load(f)["version"]
+        
+        # Coalesce concurrent query embeddings into batched model calls
+        self.query_batcher = None
+        if query_batch_wait_ms > 0:
+            self.query_batcher = QueryBatcher(
+                self.base_embeddings,
+                max_batch_size=query_batch_size,
+                max_wait_ms=query_batch_wait_ms
+            )
+        
+        # BM25 over the same chunks, kept in step with every write to the store
+        self.lexical_index = BM25Index(
+            os.path.join(persist_directory, LEXICAL_INDEX_FILENAME),
+            backend=self.backend
         )
+        # Chunks sit on the shard their source hashes to, so the count is fixed once data exists
+        check_layout(persist_directory, self.shards, has_data=len(self.lexical_index) > 0)
+        
+        # Per-source chunk counts and file details, so listings and totals never query the collection
+        self.catalog = DocumentCatalog(os.path.join(persist_directory, CATALOG_FILENAME), backend=self.backend)
         
         # Initialize or load vector store
         self.vector_store = None
+    
+    def _ensure_store(self) -> LangchainVectorStore:
+        """Open the collection on first write"""
+        if self.vector_store is None:
+            self.vector_store = self._open_collection()
+        return self.vector_store
+    
+    @property
+    def _numpy_api(self) -> bool:
+        """Whether the collection has NumpyVectorStore's methods (the numpy backend, or any sharded store)"""
+        return self.backend == "numpy" or self.shards > 1
+    
+    def _mark_index_changed(self, data_changed: bool = True):
+        """Bump the index version so cached search results are never served stale"""
+        self.index_version += 1
+        self.result_cache.clear()
+        if data_changed:
+            self.data_version += 1
+            tmp_path = f"{self._data_version_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": self.data_version}, f)
+            os.replace(tmp_path, self._data_version_path)
+    
+    def _open_collection(self) -> LangchainVectorStore:
+        """Open (or create) the persisted collection"""
+        if isinstance(self.vector_store, ShardedVectorStore):
+            # Reopening replaces the shards; don't leave their worker processes behind
+            self.vector_store.close()
+        numpy_params = {name: value for name, value in self.index_params.items() if name in NUMPY_INDEX_PARAMS}
+        # Chroma fixes its HNSW graph parameters when the collection is created
+        collection_metadata = {
+            f"hnsw:{name}": value for name, value in self.index_params.items() if name in CHROMA_HNSW_PARAMS
+        }
+        if self.shards > 1:
+            shard_kwargs = (
+                dict(index_type=self.index_type, **numpy_params) if self.backend == "numpy"
+                else {"collection_metadata": collection_metadata or None}
+            )
+            return ShardedVectorStore(
+                persist_directory=self.persist_directory,
+                embedding_function=self.embeddings,
+                shards=self.shards,
+                backend=self.backend,
+                collection_name="rag_documents",
+                workers=self.shard_workers,
+                **shard_kwargs
+            )
+        if self.backend == "numpy":
+            return NumpyVectorStore(
+                persist_directory=self.persist_directory,
+                embedding_function=self.embeddings,
+                collection_name="rag_documents",
+                index_type=self.index_type,
+                **numpy_params
+            )
+        return Chroma(
+            persist_directory=self.persist_directory,
+            embedding_function=self.embeddings,
+            collection_name="rag_documents",
+            collection_metadata=collection_metadata or None
+        )
+    
+    def add_documents_stream(self, documents: Iterable[Document], batch_size: int = 256,
+                             persist: bool = True) -> int:
+        """
+        Embed and write documents to the store in fixed-size batches
         
-    def create_vector_store(self, documents: List[Document]) -> Chroma:
+        Args:
+            documents: Any iterable of documents, typically a generator
+            batch_size: Chunks embedded and written per store call
+            persist: Flush to disk afterwards (callers making many small writes persist once at the end)
+        
+        Returns:
+            Number of documents written
+        
+        Only one batch is materialized at a time, so peak memory does not
+        depend on how many documents the iterable produces.
+        """
+        self._ensure_store()
+        
+        documents = iter(documents)
+        written = 0
+        while True:
+            batch = list(islice(documents, batch_size))
+            if not batch:
+                break
+            ids = [doc.metadata.get("chunk_id") for doc in batch]
+            texts = [doc.page_content for doc in batch]
+            # Stamped on the stored copy, so searches can be filtered by ingest time
+            ingested_at = int(time.time())
+            metadatas = [dict(doc.metadata, ingested_at=ingested_at) for doc in batch]
+            with span("embed_documents"):
+                embeddings = self.embeddings.embed_documents(texts)
+            with span("index_write"):
+                # Content-hash ids make re-ingesting the same chunk an upsert, not a duplicate
+                sources = [doc.metadata.get("source") for doc in batch]
+                # Chunks already stored under these ids are overwritten, not added
+                replaced = self.lexical_index.source_counts(ids) if all(ids) else {}
+                ids = self._add_embeddings(texts, embeddings, metadatas, ids if all(ids) else None)
+                self.lexical_index.add(ids, texts, metadatas)
+                self.catalog.apply(Counter(sources), replaced)
+            written += len(batch)
+            CHUNKS_INDEXED.inc(len(batch))
+        
+        if written:
+            if persist:
+                self.persist()
+            self._mark_index_changed()
+        return written
+    
+    def _add_embeddings(self, texts: List[str], embeddings: List[List[float]],
+                        metadatas: List[Dict], ids: Optional[List[str]]) -> List[str]:
+        """Write already embedded chunks, so embedding and writing can be timed apart"""
+        if self._numpy_api:
+            return self.vector_store.add_embeddings(texts, embeddings, metadatas=metadatas, ids=ids)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        self.vector_store._collection.upsert(ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas)
+        return ids
+    
+    def delete_documents(self, ids: List[str]):
+        """Delete chunks by id"""
+        self._ensure_store()
+        if ids:
+            self.vector_store.delete(ids=ids)
+            self.catalog.apply({}, self.lexical_index.source_counts(ids))
+            self.lexical_index.remove(ids)
+            self._mark_index_changed()
+    
+    def delete_source(self, source: str):
+        """Delete every chunk that came from the given source file"""
+        self._ensure_store()
+        if self._numpy_api:
+            self.vector_store.delete_where(source=source)
+        else:
+            self.vector_store._collection.delete(where={"source": source})
+        self.lexical_index.remove_source(source)
+        self.catalog.remove_source(source)
+        self._mark_index_changed()
+    
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict]):
+        """Rewrite chunk metadata in place without re-embedding"""
+        self._ensure_store()
+        if ids:
+            # Moving a chunk doesn't re-ingest it: keep its original ingest time
+            stored = {
+                doc.metadata.get("chunk_id"): doc.metadata.get("ingested_at")
+                for doc in self.get_documents(ids, content_chars=0)
+            }
+            metadatas = [
+                metadata if "ingested_at" in metadata or stored.get(chunk_id) is None
+                else dict(metadata, ingested_at=stored[chunk_id])
+                for chunk_id, metadata in zip(ids, metadatas)
+            ]
+            self.lexical_index.update_metadatas(ids, metadatas)
+            if self._numpy_api:
+                self.vector_store.update_metadatas(ids, metadatas)
+            else:
+                self.vector_store._collection.update(ids=ids, metadatas=metadatas)
+            self._mark_index_changed()
+    
+    def persist(self):
+        """Flush pending writes to disk"""
+        if self.vector_store is not None:
+            self.vector_store.persist()
+            self.lexical_index.save()
+            self.catalog.save()
+    
+    def close(self):
+        """Release the collection (stops shard worker processes and the query batching thread)"""
+        if isinstance(self.vector_store, ShardedVectorStore):
+            self.vector_store.close()
+        self.vector_store = None
+        if self.query_batcher:
+            # Later queries, if any, embed on the caller's thread
+            self.query_batcher.close()
+            self.query_batcher = None
+    
+    def create_vector_store(self, documents: Iterable[Document], batch_size: int = 256) -> LangchainVectorStore:
         """Create vector store from documents"""
-        print(f"Creating vector store with {len(documents)} documents...")
+        print("Creating vector store...")
         
-        # Create ChromaDB instance
-        self.vector_store = Chroma.from_documents(
-            documents=documents,
-            embedding=self.embeddings,
-            persist_directory=self.persist_directory,
-            collection_name="rag_documents"
-        )
+        # Create ChromaDB instance and stream the documents into it
+        self.vector_store = self._open_collection()
+        self._mark_index_changed(data_changed=False)
+        written = self.add_documents_stream(documents, batch_size=batch_size)
         
-        # Persist the database
-        self.vector_store.persist()
-        print(f"Vector store created and persisted to {self.persist_directory}")
+        print(f"Vector store created with {written} documents and persisted to {self.persist_directory}")
         
         return self.vector_store
     
-    def load_vector_store(self) -> Optional[Chroma]:
+    def load_vector_store(self) -> Optional[LangchainVectorStore]:
         """Load existing vector store"""
         try:
-            self.vector_store = Chroma(
-                persist_directory=self.persist_directory,
-                embedding_function=self.embeddings,
-                collection_name="rag_documents"
-            )
+            self.vector_store = self._open_collection()
+            self._mark_index_changed(data_changed=False)
+            if len(self.lexical_index) != self.document_count():
+                self._rebuild_lexical_index()
+            if not self.catalog.loaded or self.catalog.total_chunks != len(self.lexical_index):
+                # Stores created before the catalog existed: recount from the BM25 index, which has every source
+                self.catalog.rebuild(self.lexical_index.source_counts())
+                self.catalog.save()
             print(f"Loaded vector store from {self.persist_directory}")
             return self.vector_store
         except Exception as e:
             print(f"No existing vector store found: {str(e)}")
             return None
     
-    def similarity_search(self, query: str, k: int = 5) -> List[Document]:
-        """Search for similar documents"""
+    def document_count(self) -> int:
+        """Number of chunks in the collection"""
+        if self.vector_store is None:
+            return 0
+        if self._numpy_api:
+            return len(self.vector_store)
+        return self.vector_store._collection.count()
+    
+    def _iter_records(self, batch_size: int = 1000):
+        """Yield (ids, texts, metadatas) batches of every stored chunk"""
+        if self._numpy_api:
+            yield from self.vector_store.iter_records(batch_size)
+            return
+        for offset in range(0, self.document_count(), batch_size):
+            batch = self.vector_store._collection.get(
+                limit=batch_size, offset=offset, include=["documents", "metadatas"]
+            )
+            yield batch["ids"], batch["documents"], batch["metadatas"]
+    
+    def _rebuild_lexical_index(self):
+        """Re-index every stored chunk, e.g. for a store created before the BM25 index existed"""
+        print("Building BM25 index from the vector store...")
+        self.lexical_index.clear()
+        for ids, texts, metadatas in self._iter_records():
+            self.lexical_index.add(ids, texts, metadatas)
+        self.lexical_index.save()
+    
+    def get_documents(self, ids: List[str], content_chars: Optional[int] = None) -> List[Document]:
+        """Fetch chunks by id, in the given order; unknown ids are skipped"""
+        if self.vector_store is None or not ids:
+            return []
+        if self._numpy_api:
+            return self.vector_store.get_by_ids(ids, content_chars=content_chars)
+        response = self.vector_store._collection.get(ids=ids, include=["documents", "metadatas"])
+        found = {
+            chunk_id: Document(page_content=text, metadata=metadata or {})
+            for chunk_id, text, metadata in zip(response["ids"], response["documents"], response["metadatas"])
+        }
+        return [found[chunk_id] for chunk_id in ids if chunk_id in found]
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query, reusing the vector of a previously seen identical query"""
+        embedding = self.query_cache.get(query)
+        if embedding is LRUCache.MISSING:
+            with span("embed_query"):
+                if self.query_batcher:
+                    embedding = self.query_batcher.embed(query)
+                else:
+                    embedding = self.embeddings.embed_query(query)
+            self.query_cache.put(query, embedding)
+        return embedding
+    
+    def _search_kwargs(self, search_params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Validate per-query search parameters (nprobe, exact) for the backend"""
+        if not search_params:
+            return {}
+        if self.backend != "numpy":
+            raise ValueError("Per-query search parameters need the numpy backend; "
+                             "Chroma's HNSW settings are fixed by index_params at creation")
+        unknown = set(search_params) - {"nprobe", "exact"}
+        if unknown:
+            raise ValueError(f"Unknown search parameters: {sorted(unknown)}")
+        return dict(search_params)
+    
+    def _read_kwargs(self, search_kwargs: Dict[str, Any], content_chars: Optional[int],
+                     filter: Optional[MetadataFilter] = None) -> Dict[str, Any]:
+        """
+        Backend search arguments
+        
+        Only the numpy backend can skip reading whole texts. Filters go to the
+        numpy store's field index, or to Chroma as a where clause it applies
+        before its nearest-neighbour search; a sharded store hands both to
+        each shard.
+        """
+        kwargs = dict(search_kwargs)
+        if self._numpy_api:
+            if content_chars is not None:
+                kwargs["content_chars"] = content_chars
+            if filter:
+                kwargs["filter"] = filter
+        elif filter:
+            kwargs["filter"] = filter.to_chroma_where()
+        return kwargs
+    
+    @staticmethod
+    def _filter_key(filter: Optional[MetadataFilter]) -> Optional[tuple]:
+        return filter.key() if filter else None
+    
+    def _result_key(self, kind: str, query: str, k: int, search_kwargs: Optional[Dict[str, Any]] = None,
+                    content_chars: Optional[int] = None, filter: Optional[MetadataFilter] = None,
+                    *extra: Any) -> tuple:
+        """Result cache key; every search path builds its keys here so equal searches share entries"""
+        return (kind, query, k, *extra, tuple(sorted((search_kwargs or {}).items())), content_chars,
+                self._filter_key(filter), self.index_version)
+    
+    def similarity_search(self, query: str, k: int = 5,
+                          search_params: Optional[Dict[str, Any]] = None,
+                          filter: Optional[MetadataFilter] = None) -> List[Document]:
+        """Search for similar documents (search_params: nprobe/exact for the IVF index; filter: metadata conditions)"""
         if not self.vector_store:
             print("Vector store not initialized!")
             return []
         
-        results = self.vector_store.similarity_search(query, k=k)
-        return results
+        search_kwargs = self._search_kwargs(search_params)
+        key = self._result_key("docs", query, k, search_kwargs, None, filter)
+        results = self.result_cache.get(key)
+        if results is LRUCache.MISSING:
+            embedding = self.embed_query(query)
+            with span("vector_search"):
+                results = self.vector_store.similarity_search_by_vector(
+                    embedding, k=k, **self._read_kwargs(search_kwargs, None, filter)
+                )
+            self.result_cache.put(key, results)
+        return list(results)
     
-    def similarity_search_with_score(self, query: str, k: int = 5) -> List[tuple]:
-        """Search with relevance scores"""
+    def similarity_search_with_score(self, query: str, k: int = 5,
+                                     search_params: Optional[Dict[str, Any]] = None,
+                                     content_chars: Optional[int] = None,
+                                     filter: Optional[MetadataFilter] = None) -> List[tuple]:
+        """
+        Search with relevance scores
+        
+        Args:
+            query: Question to search for
+            k: Results to return
+            search_params: nprobe/exact for the IVF index
+            content_chars: Texts may be cut to this many characters (snippets); None reads them whole
+            filter: Only return chunks whose metadata matches, applied before ranking
+        """
         if not self.vector_store:
             print("Vector store not initialized!")
             return []
         
-        results = self.vector_store.similarity_search_with_score(query, k=k)
+        search_kwargs = self._search_kwargs(search_params)
+        key = self._result_key("scored", query, k, search_kwargs, content_chars, filter)
+        results = self.result_cache.get(key)
+        if results is LRUCache.MISSING:
+            embedding = self.embed_query(query)
+            with span("vector_search"):
+                results = self.vector_store.similarity_search_by_vector_with_relevance_scores(
+                    embedding, k=k, **self._read_kwargs(search_kwargs, content_chars, filter)
+                )
+            self.result_cache.put(key, results)
+        return list(results)
+    
+    def _search_by_vectors(self, embeddings: List[List[float]], k: int,
+                           search_kwargs: Optional[Dict[str, Any]] = None,
+                           content_chars: Optional[int] = None,
+                           filter: Optional[MetadataFilter] = None) -> List[List[tuple]]:
+        """One backend lookup for several query vectors"""
+        if self._numpy_api:
+            return self.vector_store.search_by_vectors(
+                embeddings, k=k, **self._read_kwargs(search_kwargs or {}, content_chars, filter)
+            )
+        
+        response = self.vector_store._collection.query(
+            query_embeddings=embeddings,
+            n_results=k,
+            where=filter.to_chroma_where() if filter else None,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [
+                (Document(page_content=text, metadata=metadata or {}), distance)
+                for text, metadata, distance in zip(texts, metadatas, distances)
+            ]
+            for texts, metadatas, distances in zip(
+                response["documents"], response["metadatas"], response["distances"]
+            )
+        ]
+    
+    def batch_similarity_search(self, queries: List[str], k: int = 5, chunk_size: int = 256,
+                                search_params: Optional[Dict[str, Any]] = None,
+                                content_chars: Optional[int] = None,
+                                filter: Optional[MetadataFilter] = None) -> List[List[tuple]]:
+        """
+        Search with relevance scores for many queries at once
+        
+        Args:
+            queries: Questions to search for
+            k: Results per query
+            chunk_size: Queries sent to the collection per lookup
+            search_params: nprobe/exact for the IVF index, applied to every query
+            content_chars: Texts may be cut to this many characters (snippets)
+            filter: Metadata conditions applied to every query
+        
+        Returns:
+            One list of (document, score) tuples per query, in input order
+        
+        Uncached queries are embedded in a single model call and looked up
+        together, instead of paying one encode and one lookup per query.
+        """
+        if not self.vector_store:
+            print("Vector store not initialized!")
+            return [[] for _ in queries]
+        
+        search_kwargs = self._search_kwargs(search_params)
+        # Keys are taken up front, so results of a batch that overlaps a write are filed under the old version
+        keys = {
+            query: self._result_key("scored", query, k, search_kwargs, content_chars, filter) for query in queries
+        }
+        results: List[Optional[List[tuple]]] = [None] * len(queries)
+        pending: Dict[str, List[int]] = {}
+        for i, query in enumerate(queries):
+            cached = self.result_cache.get(keys[query])
+            if cached is LRUCache.MISSING:
+                pending.setdefault(query, []).append(i)
+            else:
+                results[i] = list(cached)
+        
+        if pending:
+            # One vectorized encode for every query not already embedded
+            embeddings = {}
+            for query in pending:
+                embedding = self.query_cache.get(query)
+                if embedding is not LRUCache.MISSING:
+                    embeddings[query] = embedding
+            to_embed = [query for query in pending if query not in embeddings]
+            if to_embed:
+                with span("embed_query"):
+                    vectors = self.base_embeddings.embed_documents(to_embed)
+                for query, embedding in zip(to_embed, vectors):
+                    self.query_cache.put(query, embedding)
+                    embeddings[query] = embedding
+            
+            unique_queries = list(pending)
+            for start in range(0, len(unique_queries), chunk_size):
+                batch = unique_queries[start:start + chunk_size]
+                with span("vector_search"):
+                    batch_results = self._search_by_vectors(
+                        [embeddings[query] for query in batch], k, search_kwargs, content_chars, filter
+                    )
+                for query, scored in zip(batch, batch_results):
+                    self.result_cache.put(keys[query], scored)
+                    for i in pending[query]:
+                        results[i] = list(scored)
+        
         return results
     
-    def get_retriever(self, search_kwargs: Optional[Dict] = None):
-        """Get retriever for chain"""
+    def lexical_search(self, query: str, k: int = 5, content_chars: Optional[int] = None,
+                       filter: Optional[MetadataFilter] = None) -> List[tuple]:
+        """BM25 search; never touches the embedding model. Scores are BM25 (higher is better)"""
+        if not self.vector_store:
+            print("Vector store not initialized!")
+            return []
+        
+        key = self._result_key("lexical", query, k, None, content_chars, filter)
+        results = self.result_cache.get(key)
+        if results is LRUCache.MISSING:
+            with span("lexical_search"):
+                hits = self.lexical_index.search(query, k=k, filter=filter)
+            scores = dict(hits)
+            results = [
+                (doc, scores.get(doc.metadata.get("chunk_id"), 0.0))
+                for doc in self.get_documents([chunk_id for chunk_id, _ in hits], content_chars)
+            ]
+            self.result_cache.put(key, results)
+        return list(results)
+    
+    def hybrid_search(self, query: str, k: int = 5, candidates: int = 50, rrf_k: int = 60,
+                      search_params: Optional[Dict[str, Any]] = None,
+                      lexical_fast_path: bool = True,
+                      content_chars: Optional[int] = None,
+                      filter: Optional[MetadataFilter] = None) -> List[tuple]:
+        """
+        Fuse BM25 and dense rankings with reciprocal-rank fusion
+        
+        Args:
+            query: Question or keywords
+            k: Results to return
+            candidates: Results taken from each ranking before fusion
+            rrf_k: RRF damping constant; each list contributes 1 / (rrf_k + rank)
+            search_params: Per-query ANN parameters for the dense side
+            lexical_fast_path: Answer keyword-shaped queries from the BM25 ranking alone when it finds enough
+            content_chars: Texts may be cut to this many characters (snippets)
+            filter: Metadata conditions applied to both rankings
+        
+        Returns:
+            (document, fused score) tuples, best first (higher is better); the
+            fast path scores its BM25 ranking with the same RRF formula
+        """
+        if not self.vector_store:
+            print("Vector store not initialized!")
+            return []
+        
+        if lexical_fast_path and is_keyword_query(query):
+            lexical = self.lexical_search(query, k=k, content_chars=content_chars, filter=filter)
+            if len(lexical) == k:
+                # Same scale as a fused result that only the lexical ranking contributed to
+                return [(doc, 1.0 / (rrf_k + rank + 1)) for rank, (doc, _) in enumerate(lexical)]
+        
+        key = self._result_key("hybrid", query, k, search_params, content_chars, filter, candidates, rrf_k)
+        results = self.result_cache.get(key)
+        if results is LRUCache.MISSING:
+            fused: Dict[str, float] = {}
+            docs: Dict[str, Document] = {}
+            dense = self.similarity_search_with_score(
+                query, k=candidates, search_params=search_params, content_chars=content_chars, filter=filter
+            )
+            for rank, (doc, _) in enumerate(dense):
+                chunk_id = doc.metadata.get("chunk_id", doc.page_content)
+                docs[chunk_id] = doc
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+            with span("lexical_search"):
+                lexical_hits = self.lexical_index.search(query, k=candidates, filter=filter)
+            for rank, (chunk_id, _) in enumerate(lexical_hits):
+                fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+            
+            best = sorted(fused, key=fused.get, reverse=True)[:k]
+            # Chunks found only by BM25 still need their text and metadata
+            for doc in self.get_documents([chunk_id for chunk_id in best if chunk_id not in docs], content_chars):
+                docs[doc.metadata.get("chunk_id")] = doc
+            results = [(docs[chunk_id], fused[chunk_id]) for chunk_id in best if chunk_id in docs]
+            self.result_cache.put(key, results)
+        return list(results)
+    
+    def search(self, query: str, k: int = 5, mode: Optional[str] = None,
+               search_params: Optional[Dict[str, Any]] = None,
+               content_chars: Optional[int] = None,
+               filter: Optional[MetadataFilter] = None) -> List[tuple]:
+        """
+        Search with the given (or the store's default) mode
+        
+        Pass content_chars when only a snippet of each chunk is needed: the
+        numpy backend then decodes just that prefix of the stored text. A
+        filter restricts every mode to chunks with matching source, pages or
+        ingest time before ranking, so it never costs a larger k.
+        
+        Returns:
+            (document, score) tuples, best first. The score is what SCORE_TYPES
+            names for the mode: squared L2 distance for dense (lower is better),
+            RRF for hybrid and BM25 for lexical (higher is better).
+        """
+        mode = mode or self.search_mode
+        if mode in SEARCH_MODES:
+            SEARCHES.inc(mode=mode)
+        if mode == "dense":
+            return self.similarity_search_with_score(query, k=k, search_params=search_params,
+                                                     content_chars=content_chars, filter=filter)
+        if mode == "hybrid":
+            return self.hybrid_search(query, k=k, search_params=search_params, content_chars=content_chars,
+                                      filter=filter)
+        if mode == "lexical":
+            return self.lexical_search(query, k=k, content_chars=content_chars, filter=filter)
+        raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the query caches and query batching statistics"""
+        return {
+            "index_version": self.index_version,
+            "data_version": self.data_version,
+            "query_embeddings": self.query_cache.stats(),
+            "results": self.result_cache.stats(),
+            "query_batcher": self.query_batcher.stats() if self.query_batcher else None
+        }
+    
+    def get_retriever(self, search_kwargs: Optional[Dict] = None, filter: Optional[MetadataFilter] = None):
+        """Get retriever for chain, optionally restricted to chunks matching a metadata filter"""
         if not self.vector_store:
             raise ValueError("Vector store not initialized!")
         
-        search_kwargs = search_kwargs or {"k": 5}
-        return self.vector_store.as_retriever(search_kwargs=search_kwargs)
+        search_kwargs = dict(search_kwargs or {"k": 5})
+        if filter:
+            search_kwargs["filter"] = filter
+        return CachedRetriever(store=self, search_kwargs=search_kwargs)
 
 
 # Test function
@@ -105,14 +767,10 @@ if __name__ == "__main__":
     
     # Process documents
     processor = DocumentProcessor()
-    documents = processor.process_documents("../../data/raw")
-
+    vector_store = VectorStore()
+    written = vector_store.add_documents_stream(processor.iter_documents("../../data/raw"))
     
-    if documents:
-        # Create vector store
-        vector_store = VectorStore()
-        vector_store.create_vector_store(documents)
-        
+    if written:
         # Test search
         test_query = "What is the transformer architecture?"
         print(f"\nTesting search with query: '{test_query}'")
@@ -9,6 +9,13 @@ from typing import List, Dict
 # API configuration
 API_URL = "http://localhost:8000"
 
+# Score scales the API reports per search mode
+SCORE_LABELS = {"l2_distance": "Distance (lower is better)", "rrf": "RRF Score", "bm25": "BM25 Score"}
+
+def score_label(source: Dict) -> str:
+    """Label for a source's score; older APIs returned L2 distances without a score_type"""
+    return SCORE_LABELS.get(source.get("score_type", "l2_distance"), "Score")
+
 # Page config
 st.set_page_config(
     page_title="RAG Document Q&A",
@@ -117,8 +124,9 @@ if st.button("🔍 Search", type="primary", use_container_width=True):
                     if data.get("sources"):
                         st.header("📚 Sources")
                         for i, source in enumerate(data["sources"]):
-                            with st.expander(f"📄 {source['source']} (Score: {float(source['score']):.3f})"):
-                                st.markdown(f"**Relevance Score:** {float(source['score']):.3f}")
+                            label = score_label(source)
+                            with st.expander(f"📄 {source['source']} ({label}: {float(source['score']):.3f})"):
+                                st.markdown(f"**{label}:** {float(source['score']):.3f}")
                                 st.markdown("**Content:**")
                                 st.text(source["content"])
                     
@@ -128,7 +136,8 @@ if st.button("🔍 Search", type="primary", use_container_width=True):
                         st.metric("Sources Found", len(data.get("sources", [])))
                     with col2:
                         best_score = float(data["sources"][0]["score"]) if data.get("sources") else 0
-                        st.metric("Best Match Score", f"{best_score:.3f}")
+                        best_label = score_label(data["sources"][0]) if data.get("sources") else "Score"
+                        st.metric(f"Best Match {best_label}", f"{best_score:.3f}")
                     with col3:
                         st.metric("Response Time", "< 1s")
                         
@@ -0,0 +1,184 @@
+"""
+Recall-vs-latency-vs-memory report for the NumPy vector store's IVF index and quantization
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.core.chunk_store import generation_path
+from src.core.numpy_store import NumpyVectorStore
+
+
+def synthetic_vectors(rows: int, dim: int = 384, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """Unit-norm vectors drawn around random centres, roughly like sentence embeddings"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, size=rows)]
+    vectors += 0.5 * rng.standard_normal((rows, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def sample_queries(store: NumpyVectorStore, count: int, noise: float = 0.05, seed: int = 1) -> np.ndarray:
+    """Perturbed copies of stored vectors, so queries land where the data is"""
+    rng = np.random.default_rng(seed)
+    rows = np.flatnonzero(store.alive)
+    picked = np.sort(rng.choice(rows, size=min(count, len(rows)), replace=False))
+    queries = np.asarray(store.vectors[picked], dtype=np.float32)
+    queries += noise * rng.standard_normal(queries.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def _timed_search(store: NumpyVectorStore, queries: np.ndarray, k: int, **search_kwargs) -> tuple:
+    """Search one query at a time, as the API does; returns (ids per query, latencies in ms)"""
+    ids, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results = store.search_by_vectors([query], k=k, **search_kwargs)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append([doc.metadata["chunk_id"] for doc, _ in results])
+    return ids, np.asarray(latencies)
+
+
+def _row(label: str, ids: List[List[str]], exact_ids: List[List[str]], latency: np.ndarray,
+         exact_latency: np.ndarray, memory_bytes: int, rows: int) -> Dict:
+    hits = sum(len(set(found) & set(expected)) for found, expected in zip(ids, exact_ids))
+    total = sum(len(expected) for expected in exact_ids)
+    return {
+        "setting": label,
+        "recall": hits / total if total else 1.0,
+        "mean_ms": float(latency.mean()),
+        "p50_ms": float(np.percentile(latency, 50)),
+        "p95_ms": float(np.percentile(latency, 95)),
+        "speedup": float(exact_latency.mean() / latency.mean()),
+        "mb_per_million": memory_bytes / max(rows, 1) * 1e6 / (1 << 20)
+    }
+
+
+def recall_report(store: NumpyVectorStore, queries: np.ndarray, k: int = 10,
+                  nprobes: Optional[List[int]] = None, label: str = "") -> List[Dict]:
+    """
+    Measure recall@k against exact search, per-query latency and search memory
+
+    Args:
+        store: Store to measure; exact float32 search is the baseline
+        queries: Query vectors
+        k: Results per query
+        nprobes: nprobe values to try when the store has a built IVF index
+        label: Prefix for the setting names (e.g. the quantization mode)
+
+    Returns:
+        One row per setting with recall, mean/p50/p95 latency, the speed-up over
+        exact search and the in-RAM search state in MB per million chunks
+    """
+    rows = len(store)
+    exact_ids, exact_latency = _timed_search(store, queries, k, exact=True)
+    float_bytes = store.norms.nbytes + store.alive.nbytes + store.vectors.nbytes
+    report = [_row("exact", exact_ids, exact_ids, exact_latency, exact_latency, float_bytes, rows)]
+
+    memory_bytes = store.memory_usage()["total"]
+    if store.ivf and store.ivf.is_built:
+        for nprobe in nprobes or [1, 2, 4, 8, 16, 32, 64]:
+            ids, latency = _timed_search(store, queries, k, nprobe=nprobe)
+            report.append(_row(f"{label}ivf nprobe={nprobe}", ids, exact_ids, latency,
+                               exact_latency, memory_bytes, rows))
+    elif store.quantizer is not None:
+        ids, latency = _timed_search(store, queries, k)
+        report.append(_row(f"{label}scan", ids, exact_ids, latency, exact_latency, memory_bytes, rows))
+    return report
+
+
+def read_store_vectors(persist_directory: str, collection_name: str = "rag_documents") -> np.ndarray:
+    """Live vectors of an existing store, read from its files without opening it (which may truncate or migrate them)"""
+    directory = os.path.join(persist_directory, f"{collection_name}.numpy")
+    with open(os.path.join(directory, "records.json"), "r", encoding="utf-8") as f:
+        records = json.load(f)
+    rows = len(records["ids"])
+    if not rows:
+        return np.zeros((0, records["dim"] or 0), dtype=np.float32)
+    # Rows appended after the last persist lie past `rows` and are left out
+    vectors_path = generation_path(directory, "vectors.f32", records.get("generation", 0))
+    vectors = np.memmap(vectors_path, dtype=np.float32, mode="r",
+                        shape=(rows, records["dim"]))
+    alive = np.ones(rows, dtype=bool)
+    alive[records["deleted"]] = False
+    return np.asarray(vectors[alive], dtype=np.float32)
+
+
+def build_synthetic_store(directory: str, vectors: np.ndarray, index_type: str = "ivf",
+                          nlist: Optional[int] = None, quantization: Optional[str] = None,
+                          rerank_factor: int = 4) -> NumpyVectorStore:
+    """Fill a fresh store with the given vectors; the index and quantizer are built on persist"""
+    store = NumpyVectorStore(directory, embedding_function=None, index_type=index_type, nlist=nlist,
+                             ivf_min_rows=0, quantization=quantization, rerank_factor=rerank_factor,
+                             quantize_min_rows=0)
+    for start in range(0, len(vectors), 50_000):
+        batch = vectors[start:start + 50_000]
+        ids = [f"row-{start + i}" for i in range(len(batch))]
+        store.add_embeddings(["" for _ in ids], batch, metadatas=[{"chunk_id": i} for i in ids], ids=ids)
+    store.persist()
+    return store
+
+
+def main():
+    """Print a recall/latency/memory table for an existing store or a synthetic corpus"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--persist-directory", help="Existing NumPy store; omitted means a synthetic corpus")
+    parser.add_argument("--rows", type=int, default=200_000, help="Synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384, help="Synthetic vector dimensions")
+    parser.add_argument("--index-type", choices=["flat", "ivf"], default="ivf")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF centroids (default 4 * sqrt(rows))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--quantization", nargs="+", default=["none"], choices=["none", "sq8", "pq"],
+                        help="Compression modes to compare")
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--json", dest="json_path", help="Also write the rows to this JSON file")
+    args = parser.parse_args()
+
+    if args.persist_directory:
+        # Measure a copy so building an index or quantizer never touches the live store
+        vectors = read_store_vectors(args.persist_directory)
+    else:
+        print(f"Generating {args.rows} x {args.dim} synthetic vectors...")
+        vectors = synthetic_vectors(args.rows, args.dim)
+
+    report = []
+    for mode in args.quantization:
+        directory = tempfile.mkdtemp(prefix="ann_report_")
+        try:
+            quantization = None if mode == "none" else mode
+            store = build_synthetic_store(directory, vectors, index_type=args.index_type, nlist=args.nlist,
+                                          quantization=quantization, rerank_factor=args.rerank_factor)
+            nlist = store.ivf.lists if store.ivf else "-"
+            print(f"\n{len(store)} rows, quantization={mode}, lists={nlist}, k={args.k}, {args.queries} queries")
+            rows = recall_report(store, sample_queries(store, args.queries), k=args.k,
+                                 nprobes=args.nprobe, label="" if mode == "none" else f"{mode} ")
+            report.extend(rows)
+
+            print(f"{'setting':<24} {'recall@k':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} "
+                  f"{'speedup':>8} {'MB/1M':>8}")
+            for row in rows:
+                print(f"{row['setting']:<24} {row['recall']:>9.3f} {row['mean_ms']:>9.3f} "
+                      f"{row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f} {row['speedup']:>7.1f}x "
+                      f"{row['mb_per_million']:>8.0f}")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"rows": len(vectors), "k": args.k, "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+"""
+End-to-end benchmark: ingestion, embedding, indexing, search, /search and RAGChain.query on a synthetic corpus
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from langchain.schema.embeddings import Embeddings
+
+from src.core.document_processor import DocumentProcessor
+from src.core.lexical_index import STOPWORDS, tokenize
+from src.core.rag_chain import RAGChain
+from src.core.vector_store import BACKENDS, SEARCH_MODES, VectorStore
+
+try:
+    import resource
+except ImportError:  # No getrusage on Windows; RSS figures are reported as null
+    resource = None
+
+
+SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "ta", "vo", "shi", "ben", "dor", "fen", "gal", "hul", "jas",
+             "kor", "lin", "mar", "nox", "pel", "quin", "ros", "sul", "tor", "ux", "vel", "wen", "yar", "zed")
+FILLER_WORDS = ("the", "of", "and", "to", "in", "is", "that", "for", "with", "as", "on", "by", "this", "are")
+FAKE_ANSWER = "Based on the retrieved context, the documents describe this topic in detail [Source: benchmark]."
+
+
+class HashedEmbeddings(Embeddings):
+    """Deterministic bag-of-words embeddings: every term hashed to one dimension, then normalized
+
+    No model download and no randomness, so runs are comparable across
+    machines and commits; terms shared by query and chunk still make them close.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.model_name = f"hashed-bow-{dim}"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for term in tokenize(text):
+            digest = hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest()
+            vector[int.from_bytes(digest, "little") % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def write_pdf(path: str, pages: List[List[str]]):
+    """Minimal uncompressed PDF with one line of Helvetica text per entry"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        escaped = (line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines)
+        content = ("BT /F1 10 Tf 50 780 Td 12 TL " + " ".join(f"({line}) '" for line in escaped) + " ET").encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 3 0 R >> >> >>" % (len(objects)))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def synthetic_corpus(directory: str, documents: int, pages_per_document: int = 3, lines_per_page: int = 40,
+                     words_per_line: int = 12, topics: int = 50, words_per_topic: int = 120,
+                     seed: int = 0) -> int:
+    """
+    Write PDFs of pseudo-words, each document drawn mostly from one topic's vocabulary
+
+    Returns:
+        Number of pages written
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = set()
+    while len(vocabulary) < topics * words_per_topic:
+        vocabulary.add("".join(rng.choice(SYLLABLES, size=rng.integers(2, 4))))
+    vocabulary = sorted(vocabulary)
+    rng.shuffle(vocabulary)
+    topic_words = [vocabulary[i * words_per_topic:(i + 1) * words_per_topic] for i in range(topics)]
+
+    os.makedirs(directory, exist_ok=True)
+    for number in range(documents):
+        words = topic_words[number % topics]
+        pages = []
+        for _ in range(pages_per_document):
+            lines = []
+            for _ in range(lines_per_page):
+                line = [
+                    rng.choice(FILLER_WORDS) if rng.random() < 0.3 else words[rng.integers(len(words))]
+                    for _ in range(words_per_line)
+                ]
+                lines.append(" ".join(line).capitalize() + ".")
+            pages.append(lines)
+        write_pdf(os.path.join(directory, f"doc_{number:05d}.pdf"), pages)
+    return documents * pages_per_document
+
+
+def sample_queries(chunks: List, count: int, terms: int = 6, seed: int = 1) -> List[Tuple[str, str]]:
+    """(query, chunk_id) pairs: a few distinct content words of a random chunk, which is the expected hit"""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for index in rng.choice(len(chunks), size=min(count, len(chunks)), replace=False):
+        chunk = chunks[index]
+        words = sorted({term for term in tokenize(chunk.page_content) if term not in STOPWORDS})
+        picked = rng.choice(words, size=min(terms, len(words)), replace=False)
+        queries.append((" ".join(picked), chunk.metadata["chunk_id"]))
+    return queries
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def rss_increase_mb(peak_before: Optional[float]) -> Optional[float]:
+    """How far the peak RSS rose since `peak_before`
+
+    The peak only ever grows, so a stage is charged just the memory it
+    needed beyond every earlier stage; one that fits in what earlier
+    stages already used reports 0.
+    """
+    peak = peak_rss_mb()
+    return None if peak is None or peak_before is None else peak - peak_before
+
+
+def latency_stats(latencies_ms: List[float], elapsed: float) -> Dict[str, float]:
+    """Throughput and latency percentiles of a sequential run"""
+    latency = np.asarray(latencies_ms)
+    return {
+        "count": len(latency),
+        "throughput_per_sec": len(latency) / elapsed if elapsed else 0.0,
+        "mean_ms": float(latency.mean()),
+        "p50_ms": float(np.percentile(latency, 50)),
+        "p95_ms": float(np.percentile(latency, 95)),
+        "p99_ms": float(np.percentile(latency, 99))
+    }
+
+
+def timed_queries(queries: List[Tuple[str, str]], run: Callable[[str], List[str]],
+                  k: Optional[int] = None) -> Dict[str, float]:
+    """Run one call per query; run returns the chunk ids it found (for recall@k) or None"""
+    latencies, hits = [], 0
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    for query, expected in queries:
+        call_start = time.perf_counter()
+        found = run(query)
+        latencies.append((time.perf_counter() - call_start) * 1000)
+        hits += found is not None and expected in found
+    stats = latency_stats(latencies, time.perf_counter() - start)
+    stats["rss_increase_mb"] = rss_increase_mb(rss_before)
+    if k is not None:
+        stats[f"recall@{k}"] = hits / len(queries) if queries else 0.0
+    return stats
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(args: argparse.Namespace, workdir: str) -> Dict:
+    """Run every stage against a fresh corpus and store under workdir"""
+    stages: Dict[str, Dict] = {}
+    corpus_dir = os.path.join(workdir, "pdfs")
+    print(f"Writing {args.documents} synthetic PDFs...")
+    pages = synthetic_corpus(corpus_dir, args.documents, pages_per_document=args.pages, seed=args.seed)
+
+    processor = DocumentProcessor(num_workers=args.workers, pdf_engines=args.pdf_engines)
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    chunks = processor.process_documents(corpus_dir)
+    elapsed = time.perf_counter() - start
+    stages["ingestion"] = {
+        "seconds": elapsed, "files": args.documents, "pages": pages, "chunks": len(chunks),
+        "pages_per_sec": pages / elapsed, "chunks_per_sec": len(chunks) / elapsed,
+        "rss_increase_mb": rss_increase_mb(rss_before)
+    }
+
+    embeddings = HashedEmbeddings() if args.embeddings == "hashed" else None
+    # Caches off, so every query pays for embedding and search
+    vector_store = VectorStore(
+        persist_directory=os.path.join(workdir, "store"),
+        embedding_model=args.embedding_model,
+        embedding_cache_max_bytes=0,
+        query_cache_size=0,
+        result_cache_size=0,
+        backend=args.backend,
+        index_type=args.index_type,
+        shards=args.shards,
+        shard_workers=args.shard_workers,
+        embeddings=embeddings
+    )
+
+    texts = [chunk.page_content for chunk in chunks]
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    for batch_start in range(0, len(texts), 256):
+        vector_store.base_embeddings.embed_documents(texts[batch_start:batch_start + 256])
+    elapsed = time.perf_counter() - start
+    stages["embedding"] = {"seconds": elapsed, "chunks_per_sec": len(texts) / elapsed,
+                           "rss_increase_mb": rss_increase_mb(rss_before)}
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    vector_store.create_vector_store(chunks)
+    elapsed = time.perf_counter() - start
+    stages["indexing"] = {"seconds": elapsed, "chunks_per_sec": len(chunks) / elapsed,
+                          "rss_increase_mb": rss_increase_mb(rss_before)}
+
+    queries = sample_queries(chunks, args.queries, seed=args.seed + 1)
+    for mode in args.modes:
+        stages[f"search[{mode}]"] = timed_queries(queries, lambda query: [
+            doc.metadata.get("chunk_id") for doc, _ in vector_store.search(query, k=args.k, mode=mode)
+        ], k=args.k)
+
+    from langchain_community.chat_models.fake import FakeListChatModel
+    chain = RAGChain(
+        vector_store=vector_store,
+        llm=FakeListChatModel(responses=[FAKE_ANSWER]),
+        context_tokens=args.context_tokens
+    )
+
+    try:
+        from fastapi.testclient import TestClient
+        from src.api import main as api
+    except ImportError as e:
+        print(f"Skipping /search: {str(e)}")
+    else:
+        api.rag_chain = chain
+        client = TestClient(api.app)  # Not entered as a context manager, so no background loader
+
+        def search_endpoint(query: str):
+            response = client.post("/search", json={"question": query, "num_results": args.k})
+            response.raise_for_status()
+            return None
+
+        stages["api /search"] = timed_queries(queries, search_endpoint)
+
+    stage_totals: Dict[str, float] = {}
+
+    def rag_query(query: str) -> List[str]:
+        response = chain.query(query)
+        for stage, milliseconds in response["timings"].items():
+            stage_totals[stage] = stage_totals.get(stage, 0.0) + milliseconds
+        return [doc.metadata.get("chunk_id") for doc in response["source_documents"]]
+
+    # With an LLM configured the chain retrieves 5 chunks per question
+    stats = timed_queries(queries, rag_query, k=5)
+    stats["mean_stage_ms"] = {stage: total / len(queries) for stage, total in stage_totals.items()}
+    stages["RAGChain.query"] = stats
+    vector_store.close()
+    return stages
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regressions against a baseline run: slower p95, lower throughput or lower recall"""
+    regressions = []
+    for stage, stats in results["stages"].items():
+        before = baseline.get("stages", {}).get(stage)
+        if not before:
+            continue
+        for field, value in stats.items():
+            old = before.get(field)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            if field.endswith("p95_ms") and value > old * (1 + tolerance):
+                regressions.append(f"{stage} {field}: {old:.3f} -> {value:.3f}")
+            elif field.endswith("per_sec") and value < old * (1 - tolerance):
+                regressions.append(f"{stage} {field}: {old:.1f} -> {value:.1f}")
+            elif field.startswith("recall@") and value < old - 0.01:
+                regressions.append(f"{stage} {field}: {old:.3f} -> {value:.3f}")
+    return regressions
+
+
+def print_report(stages: Dict[str, Dict]):
+    for stage in ("ingestion", "embedding", "indexing"):
+        stats = stages[stage]
+        rates = ", ".join(f"{stats[field]:.1f} {field.replace('_per_sec', '')}/sec"
+                          for field in ("pages_per_sec", "chunks_per_sec") if field in stats)
+        rss = stats["rss_increase_mb"]
+        print(f"{stage:<18} {stats['seconds']:8.2f}s  {rates}" + ("" if rss is None else f", +{rss:.0f} MB RSS"))
+
+    print(f"\n{'stage':<18} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'recall':>7} {'+RSS MB':>8}")
+    for stage, stats in stages.items():
+        if "p50_ms" not in stats:
+            continue
+        recall = next((value for field, value in stats.items() if field.startswith("recall@")), None)
+        rss = stats["rss_increase_mb"]
+        print(f"{stage:<18} {stats['throughput_per_sec']:>8.1f} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} "
+              f"{stats['p99_ms']:>9.3f} {'-' if recall is None else f'{recall:.3f}':>7} "
+              f"{'-' if rss is None else f'{rss:.0f}':>8}")
+    if "mean_stage_ms" in stages.get("RAGChain.query", {}):
+        print("\nRAGChain.query mean per stage: " + ", ".join(
+            f"{stage} {ms:.2f}" for stage, ms in stages["RAGChain.query"]["mean_stage_ms"].items()
+        ))
+
+
+def main():
+    """Run the benchmark, print a summary and optionally save or compare JSON results"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("--documents", type=int, default=200, help="Synthetic PDFs to generate")
+    parser.add_argument("--pages", type=int, default=3, help="Pages per PDF")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--modes", nargs="+", default=["dense", "hybrid", "lexical"], choices=SEARCH_MODES)
+    parser.add_argument("--backend", choices=BACKENDS, default="numpy")
+    parser.add_argument("--index-type", choices=["flat", "ivf"], default="flat")
+    parser.add_argument("--shards", type=int, default=1, help="Vector store shards, searched in parallel")
+    parser.add_argument("--shard-workers", choices=["threads", "processes"], default="threads")
+    parser.add_argument("--embeddings", choices=["hashed", "model"], default="hashed",
+                        help="Deterministic hashed embeddings, or the real embedding model")
+    parser.add_argument("--embedding-model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--workers", type=int, default=1, help="Ingestion worker processes (0 = one per CPU)")
+    parser.add_argument("--pdf-engines", nargs="+", default=None, help="PDF engines in order (default: installed)")
+    parser.add_argument("--context-tokens", type=int, default=1500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Keep the corpus and store here instead of a temporary directory")
+    parser.add_argument("--json", dest="json_path", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative p95/throughput change before it counts as a regression")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rag_benchmark_")
+    try:
+        stages = run_benchmark(args, workdir)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {key: value for key, value in vars(args).items()
+                       if key not in ("json_path", "compare", "workdir")}
+        },
+        "stages": stages,
+        # Whole-run figure, outside the stages so --compare doesn't check it
+        "peak_rss_mb": peak_rss_mb()
+    }
+    print()
+    print_report(stages)
+    if results["peak_rss_mb"] is not None:
+        print(f"\nPeak RSS over the run: {results['peak_rss_mb']:.0f} MB")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json_path}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.compare}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+"""
+Shared pytest setup: make the project's src package importable
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
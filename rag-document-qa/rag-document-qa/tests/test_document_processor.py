@@ -0,0 +1,38 @@
+"""
+Tests for page tracking and extraction failures in the document processor
+"""
+import pytest
+
+from src.core.document_processor import DocumentProcessor
+from src.utils.benchmark import write_pdf
+
+
+def test_blank_pages_are_skipped_in_page_numbers(tmp_path):
+    pdf_path = str(tmp_path / "doc.pdf")
+    pages = [[f"Line {line} of page {page}." for line in range(30)] for page in range(2)]
+    write_pdf(pdf_path, [[]] + pages[:1] + [[]] + pages[1:])
+    documents = DocumentProcessor(chunk_size=300, chunk_overlap=0).process_pdf(pdf_path)
+
+    assert documents[0].metadata["page_start"] == 2
+    assert documents[-1].metadata["page_end"] == 4
+    assert {doc.metadata["page_start"] for doc in documents} == {2, 4}
+    for doc in documents:
+        page = doc.metadata["page_start"] // 2 - 1
+        assert f"of page {page}." in doc.page_content
+
+
+def test_extraction_error_is_not_an_empty_file(tmp_path, monkeypatch):
+    pdf_path = str(tmp_path / "doc.pdf")
+    write_pdf(pdf_path, [["Some text."]])
+    processor = DocumentProcessor()
+
+    def failing_iter_pages(path):
+        raise RuntimeError("No PDF engine could open the file")
+        yield
+
+    monkeypatch.setattr(processor, "iter_pages", failing_iter_pages)
+    assert processor.process_pdf(pdf_path) == []
+    with pytest.raises(RuntimeError):
+        processor.process_pdf(pdf_path, strict=True)
+    assert list(processor.iter_file_documents([pdf_path], num_workers=1)) == [[]]
+    assert list(processor.iter_file_documents([pdf_path], num_workers=1, strict=True)) == [None]
@@ -0,0 +1,200 @@
+"""
+Tests for the incremental indexer: the store must always match a full rebuild of the directory
+"""
+import json
+import os
+import shutil
+
+import pytest
+
+from src.core.document_processor import DocumentProcessor
+from src.core.indexer import MANIFEST_FILENAME, IncrementalIndexer
+from src.core.vector_store import VectorStore
+from src.utils.benchmark import HashedEmbeddings, synthetic_corpus, write_pdf
+
+# Metadata a full rebuild produces for every chunk
+FIELDS = ("source", "chunk_index", "total_chunks", "page_start", "page_end")
+
+
+def open_store(directory: str, backend: str) -> VectorStore:
+    """Store over `directory` with hashed embeddings, loaded the way process_documents.py does"""
+    vector_store = VectorStore(persist_directory=directory, backend=backend, embedding_cache_max_bytes=0,
+                               result_cache_size=0, embeddings=HashedEmbeddings())
+    vector_store.load_vector_store()
+    return vector_store
+
+
+def stored_chunks(vector_store: VectorStore) -> list:
+    """(chunk id, FIELDS..., text) of every stored chunk, sorted"""
+    chunks = []
+    for ids, texts, metadatas in vector_store._iter_records():
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            chunks.append((chunk_id, *(metadata[field] for field in FIELDS), text))
+    return sorted(chunks)
+
+
+def expected_chunks(pdf_directory: str) -> list:
+    """What a full rebuild of the directory would store"""
+    return sorted(
+        (doc.metadata["chunk_id"], *(doc.metadata[field] for field in FIELDS), doc.page_content)
+        for doc in DocumentProcessor().process_documents(pdf_directory)
+    )
+
+
+def assert_in_sync(vector_store: VectorStore, pdf_directory: str):
+    chunks = stored_chunks(vector_store)
+    assert len({chunk[0] for chunk in chunks}) == len(chunks), "duplicate chunk ids"
+    assert chunks == expected_chunks(pdf_directory)
+    assert vector_store.document_count() == len(chunks)
+    assert len(vector_store.lexical_index) == len(chunks)
+    assert vector_store.catalog.total_chunks == len(chunks)
+
+
+@pytest.fixture(params=["numpy", "chroma"])
+def backend(request):
+    if request.param == "chroma":
+        pytest.importorskip("chromadb")
+    return request.param
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """Three synthetic PDFs plus a spare one with different content"""
+    pdf_directory = str(tmp_path / "pdfs")
+    synthetic_corpus(pdf_directory, documents=3, pages_per_document=2, lines_per_page=20)
+    synthetic_corpus(str(tmp_path / "spare"), documents=1, pages_per_document=2, lines_per_page=20, seed=7)
+    return pdf_directory, str(tmp_path / "spare" / "doc_00000.pdf"), str(tmp_path / "store")
+
+
+def test_add_modify_delete_rename(corpus, backend):
+    pdf_directory, spare_pdf, store_directory = corpus
+    vector_store = open_store(store_directory, backend)
+    indexer = IncrementalIndexer(vector_store)
+
+    stats = indexer.sync(pdf_directory)
+    assert stats["added_files"] == 3 and stats["chunks_deleted"] == 0
+    assert_in_sync(vector_store, pdf_directory)
+
+    stats = indexer.sync(pdf_directory)
+    assert stats["unchanged_files"] == 3 and stats["chunks_added"] == 0 and stats["chunks_deleted"] == 0
+
+    # Modify: the file's old chunks go, its new ones come in
+    shutil.copyfile(spare_pdf, os.path.join(pdf_directory, "doc_00001.pdf"))
+    stats = indexer.sync(pdf_directory)
+    assert stats["updated_files"] == 1 and stats["unchanged_files"] == 2 and stats["chunks_deleted"] > 0
+    assert_in_sync(vector_store, pdf_directory)
+
+    # Delete
+    os.remove(os.path.join(pdf_directory, "doc_00002.pdf"))
+    stats = indexer.sync(pdf_directory)
+    assert stats["removed_files"] == 1 and stats["chunks_added"] == 0
+    assert_in_sync(vector_store, pdf_directory)
+    assert vector_store.catalog.get("doc_00002.pdf") is None
+
+    # Rename: chunk ids include the source, so the chunks move to the new name
+    os.rename(os.path.join(pdf_directory, "doc_00000.pdf"), os.path.join(pdf_directory, "renamed.pdf"))
+    stats = indexer.sync(pdf_directory)
+    assert stats["removed_files"] == 1 and stats["added_files"] == 1
+    assert_in_sync(vector_store, pdf_directory)
+
+    # A fresh process sees the same store
+    vector_store.close()
+    assert_in_sync(open_store(store_directory, backend), pdf_directory)
+
+
+def test_blank_page_shifts_page_numbers(corpus, backend):
+    pdf_directory, _, store_directory = corpus
+    pages = [[f"Line {line} of page {page} about topic {page}." for line in range(30)] for page in range(3)]
+    pdf_path = os.path.join(pdf_directory, "pages.pdf")
+    write_pdf(pdf_path, pages)
+    vector_store = open_store(store_directory, backend)
+    indexer = IncrementalIndexer(vector_store)
+    indexer.sync(pdf_directory)
+    before = {chunk[0]: chunk for chunk in stored_chunks(vector_store) if chunk[1] == "pages.pdf"}
+    assert min(chunk[4] for chunk in before.values()) == 1
+
+    # Blank pages yield no text, so every chunk keeps its id and position but moves one page on
+    write_pdf(pdf_path, [[]] + pages)
+    stats = indexer.sync(pdf_directory)
+    assert stats["updated_files"] == 1 and stats["chunks_added"] == 0 and stats["chunks_deleted"] == 0
+    after = {chunk[0]: chunk for chunk in stored_chunks(vector_store) if chunk[1] == "pages.pdf"}
+    assert after.keys() == before.keys()
+    assert all(after[chunk_id][4] == before[chunk_id][4] + 1 for chunk_id in before)
+    assert_in_sync(vector_store, pdf_directory)
+
+
+def test_unreadable_file_keeps_its_chunks(corpus, backend, monkeypatch):
+    pdf_directory, spare_pdf, store_directory = corpus
+    vector_store = open_store(store_directory, backend)
+    indexer = IncrementalIndexer(vector_store)
+    indexer.sync(pdf_directory)
+    before = stored_chunks(vector_store)
+    entry_before = dict(indexer.manifest.files["doc_00001.pdf"])
+
+    # The file changes, but reading it fails (e.g. it is still being written)
+    shutil.copyfile(spare_pdf, os.path.join(pdf_directory, "doc_00001.pdf"))
+    iter_pages = indexer.document_processor.iter_pages
+
+    def failing_iter_pages(pdf_path):
+        if os.path.basename(pdf_path) == "doc_00001.pdf":
+            raise RuntimeError("No PDF engine could open the file")
+        return iter_pages(pdf_path)
+
+    monkeypatch.setattr(indexer.document_processor, "iter_pages", failing_iter_pages)
+    stats = indexer.sync(pdf_directory)
+    assert stats["failed_files"] == 1 and stats["chunks_deleted"] == 0
+    assert stored_chunks(vector_store) == before
+    assert indexer.manifest.files["doc_00001.pdf"] == entry_before
+    with open(os.path.join(store_directory, MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+        assert json.load(f)["files"]["doc_00001.pdf"] == entry_before
+
+    # Once it can be read again, the next sync picks the change up
+    monkeypatch.undo()
+    stats = indexer.sync(pdf_directory)
+    assert stats["updated_files"] == 1 and stats["failed_files"] == 0
+    assert_in_sync(vector_store, pdf_directory)
+
+
+def test_interrupted_sync_converges(corpus, backend, tmp_path, monkeypatch):
+    pdf_directory, spare_pdf, store_directory = corpus
+    vector_store = open_store(store_directory, backend)
+    IncrementalIndexer(vector_store).sync(pdf_directory)
+    manifest_path = os.path.join(store_directory, MANIFEST_FILENAME)
+    with open(manifest_path, "rb") as f:
+        manifest_before = f.read()
+
+    # Change every file, then fail part-way: the first file is written to the store
+    for number in range(3):
+        version_directory = str(tmp_path / f"v2_{number}")
+        synthetic_corpus(version_directory, documents=1, pages_per_document=2, lines_per_page=20, seed=100 + number)
+        shutil.copyfile(os.path.join(version_directory, "doc_00000.pdf"),
+                        os.path.join(pdf_directory, f"doc_{number:05d}.pdf"))
+    shutil.copyfile(spare_pdf, os.path.join(pdf_directory, "new.pdf"))
+    indexer = IncrementalIndexer(vector_store)
+    sync_file = indexer._sync_file
+    calls = []
+
+    def failing_sync_file(source, documents):
+        calls.append(source)
+        if len(calls) == 2:
+            raise RuntimeError("interrupted")
+        return sync_file(source, documents)
+
+    monkeypatch.setattr(indexer, "_sync_file", failing_sync_file)
+    with pytest.raises(RuntimeError, match="interrupted"):
+        indexer.sync(pdf_directory)
+
+    # The manifest is only written once a sync finishes
+    with open(manifest_path, "rb") as f:
+        assert f.read() == manifest_before
+
+    # Whatever the interrupted run flushed is on disk; a new run must reconcile it
+    vector_store.persist()
+    vector_store.close()
+    vector_store = open_store(store_directory, backend)
+    stats = IncrementalIndexer(vector_store).sync(pdf_directory)
+    assert stats["added_files"] == 1 and stats["updated_files"] == 3
+    assert_in_sync(vector_store, pdf_directory)
+
+    stats = IncrementalIndexer(vector_store).sync(pdf_directory)
+    assert stats["unchanged_files"] == 4 and stats["chunks_added"] == 0 and stats["chunks_deleted"] == 0